@@ -1,19 +1,53 @@
-from Baseline.data_processor import process_json_data, process_queries, merge_documents
-from Baseline.boolean_retrieval import main_boolean_retrieval, retrieve_single_query
-import json   
+import os
+import threading
 
-def boolean_pipeline(query, wikipedia_data_path="Datasets/mini_wiki_collection.json", top_n=100):
-    # Load the JSON files
-    with open(wikipedia_data_path, "r") as file1:  
-        wikipedia_data = json.load(file1)
+from Baseline.boolean_retrieval import create_inverted_index, load_inverted_index, save_inverted_index, search_inverted_index
+from Baseline.corpus_store import CorpusStore, compile_corpus_file
+from Retrieval.registry import registry
 
-    # Process the JSON files
-    wikipedia_dict = process_json_data(wikipedia_data)
-    # Print the processed data
 
-    top_results = retrieve_single_query(query, wikipedia_dict, top_n)
+def _load_index_dir(meta_path):
+    # Registered by its meta.json, which is written last, so a rebuilt index is picked up once complete
+    return load_inverted_index(os.path.dirname(meta_path))
 
-    return top_results
+def _open_store(meta_path):
+    return CorpusStore(os.path.dirname(meta_path))
+
+registry.register(
+    "boolean",
+    index=("Baseline/inverted_index/meta.json", _load_index_dir),
+    store=("Datasets/mini_wiki_collection_store/meta.json", _open_store),
+)
+
+_build_lock = threading.Lock()
+
+
+def load_boolean_index(wikipedia_data_path="Datasets/mini_wiki_collection.json", corpus_store_path="Datasets/mini_wiki_collection_store", inverted_index_path="Baseline/inverted_index"):
+    """
+    Returns the inverted index of the corpus store, kept loaded in the shared registry.
+    The store is compiled from the collection and the index built from the store the
+    first time; the index is rebuilt whenever the store was extended after it was built
+    (CorpusStore.extend only appends, so the document counts tell them apart).
+    """
+    paths = {"index": os.path.join(inverted_index_path, "meta.json"), "store": os.path.join(corpus_store_path, "meta.json")}
+    with _build_lock:
+        # The collection is parsed and sanitized once, into a compiled corpus store
+        if not os.path.exists(paths["store"]):
+            compile_corpus_file(wikipedia_data_path, corpus_store_path)
+        if os.path.exists(paths["index"]):
+            artifacts = registry.get("boolean", **paths)
+            if artifacts["index"].num_docs == len(artifacts["store"]):
+                return artifacts["index"]
+        print("Inverted index not found or older than the corpus store. Creating one...")
+        save_inverted_index(create_inverted_index(CorpusStore(corpus_store_path)), inverted_index_path)
+        return registry.get("boolean", **paths)["index"]
+
+# Warming the retriever up compiles the store and the index if they are missing
+registry.register_builder("boolean", load_boolean_index)
+
+def boolean_pipeline(query, wikipedia_data_path="Datasets/mini_wiki_collection.json", top_n=100, corpus_store_path="Datasets/mini_wiki_collection_store", inverted_index_path="Baseline/inverted_index"):
+    inverted_index = load_boolean_index(wikipedia_data_path, corpus_store_path, inverted_index_path)
+    return search_inverted_index(query, inverted_index, top_n)
 
 # def main():
 #     # Load the JSON files
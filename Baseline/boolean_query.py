@@ -0,0 +1,297 @@
+import re
+import numpy as np
+
+from Baseline.boolean_retrieval import preprocess_text, score_documents, top_documents
+
+# Operators are only recognised in upper case so "not" or "or" in a query stay ordinary words
+TOKEN_PATTERN = re.compile(r'\s*(?:(\()|(\))|"([^"]*)"|(NEAR/\d+)\b|(AND|OR|NOT)\b|([^\s()"]+))')
+
+# Above this size ratio the larger posting list is probed with binary search instead of merged
+GALLOP_RATIO = 8
+
+
+def tokenize_query(query):
+    """
+    Splits a Boolean query into ("(" | ")" | "phrase" | "near" | "op" | "term", value) tokens.
+    """
+    tokens = []
+    position = 0
+    query = query.rstrip()
+    while position < len(query):
+        match = TOKEN_PATTERN.match(query, position)
+        if match is None:
+            raise ValueError(f"Cannot parse query at position {position}: {query[position:]!r}")
+        position = match.end()
+        open_paren, close_paren, phrase, near, operator, word = match.groups()
+        if open_paren:
+            tokens.append(("(", open_paren))
+        elif close_paren:
+            tokens.append((")", close_paren))
+        elif phrase is not None:
+            tokens.append(("phrase", preprocess_text(phrase)))
+        elif near:
+            tokens.append(("near", int(near.split("/")[1])))
+        elif operator:
+            tokens.append(("op", operator))
+        else:
+            terms = preprocess_text(word)
+            if terms:
+                # "U.S." tokenizes to two words and is matched as a phrase
+                tokens.append(("term", terms[0]) if len(terms) == 1 else ("phrase", terms))
+    return tokens
+
+class QueryParser:
+    """
+    Recursive-descent parser for Boolean queries:
+
+        query   := or_expr
+        or_expr := and_expr (OR and_expr)*
+        and_expr:= not_expr ([AND] not_expr)*      adjacent operands are ANDed
+        not_expr:= NOT not_expr | near_expr
+        near_expr := primary (NEAR/k primary)*
+        primary := term | "phrase" | ( query )
+
+    Returns nested tuples: ("term", t), ("phrase", [t...]), ("near", k, [t...]),
+    ("and", [...]), ("or", [...]), ("not", node).
+    """
+
+    def __init__(self, query):
+        self.tokens = tokenize_query(query)
+        self.position = 0
+
+    def peek(self):
+        return self.tokens[self.position] if self.position < len(self.tokens) else (None, None)
+
+    def next(self):
+        token = self.peek()
+        self.position += 1
+        return token
+
+    def parse(self):
+        if not self.tokens:
+            raise ValueError("Empty query.")
+        node = self.parse_or()
+        if self.position < len(self.tokens):
+            raise ValueError(f"Unexpected token {self.peek()[1]!r} in query.")
+        return node
+
+    def parse_or(self):
+        operands = [self.parse_and()]
+        while self.peek() == ("op", "OR"):
+            self.next()
+            operands.append(self.parse_and())
+        return operands[0] if len(operands) == 1 else ("or", operands)
+
+    def parse_and(self):
+        operands = [self.parse_not()]
+        while True:
+            kind, value = self.peek()
+            if kind == "op" and value == "AND":
+                self.next()
+            elif kind is None or kind == ")" or (kind == "op" and value == "OR"):
+                break
+            operands.append(self.parse_not())
+        return operands[0] if len(operands) == 1 else ("and", operands)
+
+    def parse_not(self):
+        if self.peek() == ("op", "NOT"):
+            self.next()
+            return ("not", self.parse_not())
+        return self.parse_near()
+
+    def parse_near(self):
+        node = self.parse_primary()
+        if self.peek()[0] != "near":
+            return node
+        if node[0] != "term":
+            raise ValueError("NEAR/k can only join single terms.")
+        terms, distance = [node[1]], None
+        while self.peek()[0] == "near":
+            _, k = self.next()
+            if distance is not None and k != distance:
+                raise ValueError("All NEAR operators in a chain must use the same distance.")
+            distance = k
+            operand = self.parse_primary()
+            if operand[0] != "term":
+                raise ValueError("NEAR/k can only join single terms.")
+            terms.append(operand[1])
+        return ("near", distance, terms)
+
+    def parse_primary(self):
+        kind, value = self.next()
+        if kind == "(":
+            node = self.parse_or()
+            if self.next()[0] != ")":
+                raise ValueError("Missing closing parenthesis.")
+            return node
+        if kind == "term":
+            return ("term", value)
+        if kind == "phrase":
+            if not value:
+                raise ValueError("Empty phrase.")
+            return ("term", value[0]) if len(value) == 1 else ("phrase", value)
+        if kind is None:
+            raise ValueError("Query ends unexpectedly.")
+        raise ValueError(f"Unexpected token {value!r} in query.")
+
+def parse_query(query):
+    return QueryParser(query).parse()
+
+def query_terms(node):
+    """
+    The positive terms of a parsed query, used to rank the matching documents.
+    """
+    kind = node[0]
+    if kind == "term":
+        return [node[1]]
+    if kind == "phrase":
+        return list(node[1])
+    if kind == "near":
+        return list(node[2])
+    if kind == "not":
+        return []
+    return [term for operand in node[1] for term in query_terms(operand)]
+
+def intersect_sorted(a, b):
+    """
+    Intersection of two sorted arrays of unique document numbers.
+    When one list is much shorter, each of its entries is located in the longer one
+    by binary search inside the range the shorter list spans (a vectorized galloping
+    intersection); otherwise the two lists are merged.
+    """
+    if len(a) > len(b):
+        a, b = b, a
+    if len(a) == 0:
+        return a
+    # Skip the parts of the longer list outside the shorter one's range
+    lo, hi = np.searchsorted(b, [a[0], a[-1]], side="left")
+    b = b[lo:hi + 1]
+    if len(b) > GALLOP_RATIO * len(a):
+        found = np.searchsorted(b, a)
+        found = np.minimum(found, len(b) - 1)
+        return a[b[found] == a]
+    return np.intersect1d(a, b, assume_unique=True)
+
+def intersect_all(postings_lists):
+    """
+    Intersects posting lists rarest first, so every step works on the smallest candidate set.
+    """
+    postings_lists = sorted(postings_lists, key=len)
+    result = postings_lists[0]
+    for postings in postings_lists[1:]:
+        if len(result) == 0:
+            break
+        result = intersect_sorted(result, postings)
+    return result
+
+class BooleanQueryEvaluator:
+    """
+    Evaluates parsed queries against an InvertedIndex. Phrase and NEAR/k operators
+    need an index created with create_inverted_index(..., store_positions=True).
+    """
+
+    def __init__(self, inverted_index):
+        self.index = inverted_index
+        self.num_docs = len(inverted_index.doc_ids)
+        self.empty = np.empty(0, dtype=np.int32)
+
+    def docs(self, term):
+        postings = self.index.get_postings(term)
+        return self.empty if postings is None else postings[0]
+
+    def positions(self, term, doc_nums):
+        """
+        Token positions of a term in each of the given documents (which must contain it).
+        """
+        term_positions = self.index.get_positions(term)
+        if term_positions is None:
+            raise ValueError("Phrase and NEAR queries need an index built with store_positions=True.")
+        offsets, positions = term_positions
+        postings_index = np.searchsorted(self.docs(term), doc_nums)
+        return [positions[offsets[j]:offsets[j + 1]] for j in postings_index]
+
+    def evaluate(self, node):
+        """
+        Returns:
+            np.ndarray: Sorted document numbers matching the query node.
+        """
+        kind = node[0]
+        if kind == "term":
+            return self.docs(node[1])
+        if kind == "phrase":
+            return self.match_positions(node[1], self.phrase_matches)
+        if kind == "near":
+            return self.match_positions(node[2], lambda positions: self.near_matches(positions, node[1]))
+        if kind == "or":
+            operands = [self.evaluate(operand) for operand in node[1]]
+            return np.unique(np.concatenate(operands)).astype(np.int32)
+        if kind == "not":
+            return np.setdiff1d(np.arange(self.num_docs, dtype=np.int32), self.evaluate(node[1]), assume_unique=True)
+        # AND: intersect the positive operands, then subtract the negated ones
+        positive = [self.evaluate(operand) for operand in node[1] if operand[0] != "not"]
+        negative = [self.evaluate(operand[1]) for operand in node[1] if operand[0] == "not"]
+        result = intersect_all(positive) if positive else np.arange(self.num_docs, dtype=np.int32)
+        for excluded in negative:
+            if len(result) == 0:
+                break
+            result = np.setdiff1d(result, excluded, assume_unique=True)
+        return result
+
+    def match_positions(self, terms, matches):
+        candidates = intersect_all([self.docs(term) for term in terms])
+        if len(candidates) == 0:
+            return candidates
+        term_positions = [self.positions(term, candidates) for term in terms]
+        keep = [matches([positions[i] for positions in term_positions]) for i in range(len(candidates))]
+        return candidates[np.array(keep, dtype=bool)]
+
+    @staticmethod
+    def phrase_matches(positions):
+        starts = positions[0]
+        for offset, term_positions in enumerate(positions[1:], 1):
+            starts = starts[np.isin(starts + offset, term_positions, assume_unique=True)]
+            if len(starts) == 0:
+                return False
+        return True
+
+    @staticmethod
+    def near_matches(positions, distance):
+        # Each consecutive pair of terms must occur within distance tokens of each other
+        for first, second in zip(positions, positions[1:]):
+            nearest = np.searchsorted(second, first)
+            after = np.abs(second[np.minimum(nearest, len(second) - 1)] - first)
+            before = np.abs(first - second[np.maximum(nearest - 1, 0)])
+            if np.minimum(after, before).min() > distance:
+                return False
+        return True
+
+def boolean_filter(query, inverted_index):
+    """
+    Document numbers matching a Boolean query, e.g. as a first-stage filter in front of
+    the heavier retrievers.
+    """
+    return BooleanQueryEvaluator(inverted_index).evaluate(parse_query(query))
+
+def boolean_query_retrieval(query, inverted_index, top_n=100):
+    """
+    Retrieve the documents matching a Boolean query such as
+    'einstein AND (relativity OR "photoelectric effect") NOT quantum' or 'nobel NEAR/5 prize'.
+    Matching documents are ranked by the frequency of the positive query terms.
+    Args:
+        query (str): Boolean query.
+        inverted_index (InvertedIndex): Index from create_inverted_index or load_inverted_index.
+        top_n (int): The number of top documents to return.
+    Returns:
+        list: Document IDs of the top matching documents.
+    """
+    node = parse_query(query)
+    matches = BooleanQueryEvaluator(inverted_index).evaluate(node)
+    scores = score_documents(query_terms(node), inverted_index)
+    # Every match is kept, even if it contains none of the positive terms (e.g. 'NOT x')
+    filtered = np.zeros_like(scores)
+    filtered[matches] = scores[matches] + 1
+    return top_documents(filtered, inverted_index.doc_ids, top_n)
+
+# Example usage:
+# inverted_index = create_inverted_index(wikipedia_dict, store_positions=True)
+# boolean_query_retrieval('"theory of relativity" AND einstein NOT quantum', inverted_index, top_n=10)
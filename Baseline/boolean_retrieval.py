@@ -1,42 +1,138 @@
-from collections import defaultdict
-import re
+from collections import Counter, defaultdict
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
 import heapq
 import joblib
+import numpy as np
 import os
 
+from Retrieval.analyzer import analyze_query, word_tokens
+from Retrieval.compressed_index import CompressedInvertedIndex, write_compressed_index
+
 def preprocess_text(text):
     """
     Preprocess the text for tokenization.
     Removes special characters, lowercases, and splits into words.
     """
-    return re.findall(r'\w+', text.lower())
+    return word_tokens(text)
+
+@dataclass
+class InvertedIndex:
+    """Inverted index with per-document term frequencies stored in compact arrays"""
+    doc_ids: List[str]
+    # term -> (sorted document numbers, term frequency in each of those documents)
+    postings: Dict[str, Tuple[np.ndarray, np.ndarray]]
+    # term -> (offsets into the positions array, one per posting plus one, token positions)
+    positions: Optional[Dict[str, Tuple[np.ndarray, np.ndarray]]] = None
+
+    def __contains__(self, term):
+        return term in self.postings
+
+    def get_postings(self, term):
+        return self.postings.get(term)
 
-def create_inverted_index(wikipedia_dict):
+    def get_positions(self, term):
+        return None if self.positions is None else self.positions.get(term)
+
+def create_inverted_index(wikipedia_dict, store_positions=False):
     """
     Create an inverted index from the document dictionary.
     Args:
-        wikipedia_dict (dict): A dictionary with document IDs as keys and text as values.
+        wikipedia_dict (dict): A dictionary with document IDs as keys and text as values, or a CorpusStore.
+        store_positions (bool): Also keep the token positions of every occurrence.
 
     Returns:
-        dict: An inverted index where each term maps to a list of document IDs containing it.
+        InvertedIndex: Postings of document numbers and term frequencies for every term.
+    """
+    doc_ids = []
+    postings_docs = defaultdict(list)
+    postings_freqs = defaultdict(list)
+    postings_positions = defaultdict(list)
+    if hasattr(wikipedia_dict, "iter_tokens"):
+        # A compiled CorpusStore already holds the token streams
+        documents = wikipedia_dict.iter_tokens()
+    else:
+        documents = ((doc_id, preprocess_text(text)) for doc_id, text in wikipedia_dict.items())
+    for doc_num, (doc_id, tokens) in enumerate(documents):
+        doc_ids.append(doc_id)
+        if store_positions:
+            token_positions = defaultdict(list)
+            for position, token in enumerate(tokens):
+                token_positions[token].append(position)
+            for token, token_position_list in token_positions.items():
+                postings_docs[token].append(doc_num)
+                postings_freqs[token].append(len(token_position_list))
+                postings_positions[token].append(token_position_list)
+        else:
+            for token, freq in Counter(tokens).items():
+                postings_docs[token].append(doc_num)
+                postings_freqs[token].append(freq)
+
+    postings = {}
+    positions = {} if store_positions else None
+    for token, docs in postings_docs.items():
+        postings[token] = (np.array(docs, dtype=np.int32), np.array(postings_freqs[token], dtype=np.int32))
+        if store_positions:
+            position_lists = postings_positions[token]
+            offsets = np.zeros(len(position_lists) + 1, dtype=np.int64)
+            offsets[1:] = np.cumsum([len(p) for p in position_lists])
+            positions[token] = (offsets, np.fromiter((p for ps in position_lists for p in ps), dtype=np.int32, count=offsets[-1]))
+    return InvertedIndex(doc_ids, postings, positions)
+
+def score_documents(query_tokens, inverted_index):
+    """
+    Term frequency score of every document: the sum over query tokens of their count
+    in the document, computed from the postings without re-tokenizing any document.
     """
-    inverted_index = defaultdict(set)
-    for doc_id, text in wikipedia_dict.items():
-        tokens = set(preprocess_text(text))  # Unique tokens for each document
-        for token in tokens:
-            inverted_index[token].add(doc_id)
-    return inverted_index
+    scores = np.zeros(len(inverted_index.doc_ids), dtype=np.int64)
+    for token, count in Counter(query_tokens).items():
+        postings = inverted_index.get_postings(token)
+        if postings is not None:
+            docs, freqs = postings
+            scores[docs] += count * freqs
+    return scores
 
-def save_inverted_index(inverted_index, filepath="Baseline/inverted_index.pkl"):
+def top_documents(scores, doc_ids, top_n=100):
     """
-    Save the inverted index to a file using joblib.
+    Returns the ids of the top_n documents with a non-zero score.
+    Ties are broken by document id exactly like heapq.nlargest over (score, doc_id).
     """
-    joblib.dump(inverted_index, filepath)
+    candidates = np.flatnonzero(scores)
+    if len(candidates) > top_n:
+        # Only documents scoring at least the top_n-th best score can make the cut
+        kth = np.partition(scores[candidates], len(candidates) - top_n)[len(candidates) - top_n]
+        candidates = candidates[scores[candidates] >= kth]
+    top_docs = heapq.nlargest(top_n, ((int(scores[c]), doc_ids[c]) for c in candidates))
+    return [doc_id for _, doc_id in top_docs]
 
-def load_inverted_index(filepath="Baseline/inverted_index.pkl"):
+def save_inverted_index(inverted_index, filepath="Baseline/inverted_index"):
+    """
+    Save the inverted index as a compressed, memory-mappable index directory
+    (see Retrieval/compressed_index.py).
     """
-    Load the inverted index from a file using joblib.
+    terms = list(inverted_index.postings)
+    term_offsets = np.zeros(len(terms) + 1, dtype=np.int64)
+    term_offsets[1:] = np.cumsum([len(inverted_index.postings[term][0]) for term in terms])
+    doc_nums = np.concatenate([inverted_index.postings[term][0] for term in terms]) if terms else np.zeros(0, dtype=np.int32)
+    term_freqs = np.concatenate([inverted_index.postings[term][1] for term in terms]) if terms else np.zeros(0, dtype=np.int32)
+    # Every token of a document is counted in exactly one posting
+    doc_lengths = np.bincount(doc_nums, weights=term_freqs, minlength=len(inverted_index.doc_ids)).astype(np.int32)
+
+    position_offsets, positions = None, None
+    if inverted_index.positions is not None:
+        position_offsets = np.zeros(len(doc_nums) + 1, dtype=np.int64)
+        position_offsets[1:] = np.cumsum(term_freqs)
+        positions = np.concatenate([inverted_index.positions[term][1] for term in terms]) if terms else np.zeros(0, dtype=np.int32)
+
+    write_compressed_index(filepath, terms, term_offsets, doc_nums, term_freqs, doc_lengths, inverted_index.doc_ids, position_offsets, positions)
+
+def load_inverted_index(filepath="Baseline/inverted_index"):
     """
+    Open a saved inverted index. Directories are memory-mapped, so loading is near-instant
+    and only the postings of queried terms are read; older pickled indexes are loaded with joblib.
+    """
+    if os.path.isdir(filepath):
+        return CompressedInvertedIndex(filepath)
     if os.path.exists(filepath):
         return joblib.load(filepath)
     return None
@@ -46,8 +142,8 @@ def boolean_retrieval(queries_dict, inverted_index, wikipedia_dict, top_n=100):
     Perform boolean retrieval for each query.
     Args:
         queries_dict (dict): A dictionary with query IDs as keys and query text as values.
-        inverted_index (dict): The inverted index created from the document collection.
-        wikipedia_dict (dict): The original document dictionary (for scoring if needed).
+        inverted_index (InvertedIndex): The inverted index created from the document collection.
+        wikipedia_dict (dict): The original document dictionary (no longer needed for scoring).
         top_n (int): The number of top documents to retrieve for each query.
 
     Returns:
@@ -56,27 +152,24 @@ def boolean_retrieval(queries_dict, inverted_index, wikipedia_dict, top_n=100):
     query_results = {}
     
     for query_id, query_text in queries_dict.items():
-        query_tokens = preprocess_text(query_text)
-        
-        # Collect all document IDs that contain any of the query terms
-        relevant_docs = set()
-        for token in query_tokens:
-            if token in inverted_index:
-                relevant_docs.update(inverted_index[token])
-        
-        # If more than `top_n` documents, sort by some criteria (e.g., frequency of terms in the doc)
-        doc_scores = []
-        for doc_id in relevant_docs:
-            doc_text = preprocess_text(wikipedia_dict[doc_id])
-            score = sum(doc_text.count(token) for token in query_tokens)  # Term frequency score
-            doc_scores.append((score, doc_id))
-        
-        # Get the top `top_n` documents based on the score
-        top_docs = heapq.nlargest(top_n, doc_scores)
-        query_results[query_id] = [doc_id for _, doc_id in top_docs]
+        query_results[query_id] = search_inverted_index(query_text, inverted_index, top_n)
 
     return query_results
 
+def search_inverted_index(query, inverted_index, top_n=100):
+    """
+    Ranks the documents of an inverted index (InvertedIndex or CompressedInvertedIndex) for a query.
+    Returns:
+        list: The ids of the top_n documents by term frequency score.
+    """
+    query_tokens = analyze_query(query).word_tokens
+
+    # Sum term frequencies over the postings of the query terms
+    scores = score_documents(query_tokens, inverted_index)
+
+    # Get the top `top_n` documents based on the score
+    return top_documents(scores, inverted_index.doc_ids, top_n)
+
 # Main flow
 def main_boolean_retrieval(wikipedia_dict, queries_dict):
     # Step 1: Create inverted index
@@ -87,46 +180,29 @@ def main_boolean_retrieval(wikipedia_dict, queries_dict):
     
     return top_docs
 
-def retrieve_single_query(query, wikipedia_dict, top_n=100, inverted_index_path="Baseline/inverted_index.pkl"):
+def retrieve_single_query(query, wikipedia_dict, top_n=100, inverted_index_path="Baseline/inverted_index"):
     """
     Retrieve documents for a single query using the inverted index.
     If the inverted index is not found, it will be created and saved.
 
     Args:
         query (str): The query text.
-        wikipedia_dict (dict): The original document dictionary.
+        wikipedia_dict (dict): The original document dictionary or a CorpusStore; only read if the index has to be built.
         top_n (int): The number of top documents to retrieve.
-        inverted_index_path (str): Path to the saved inverted index file.
+        inverted_index_path (str): Path to the saved inverted index directory.
 
     Returns:
         list: A list of top document IDs matching the query.
     """
     # Load or create the inverted index
     inverted_index = load_inverted_index(inverted_index_path)
-    if inverted_index is None:
+    if not isinstance(inverted_index, (InvertedIndex, CompressedInvertedIndex)):
+        # Also rebuilds indexes pickled in the old set-of-doc-ids format
         print("Inverted index not found. Creating one...")
-        inverted_index = create_inverted_index(wikipedia_dict)
-        save_inverted_index(inverted_index, inverted_index_path)
+        save_inverted_index(create_inverted_index(wikipedia_dict), inverted_index_path)
+        inverted_index = load_inverted_index(inverted_index_path)
 
-    # Preprocess the query
-    query_tokens = preprocess_text(query)
-    
-    # Collect relevant documents
-    relevant_docs = set()
-    for token in query_tokens:
-        if token in inverted_index:
-            relevant_docs.update(inverted_index[token])
-    
-    # Rank documents by frequency of terms
-    doc_scores = []
-    for doc_id in relevant_docs:
-        doc_text = preprocess_text(wikipedia_dict[doc_id])
-        score = sum(doc_text.count(token) for token in query_tokens)
-        doc_scores.append((score, doc_id))
-    
-    # Get the top `top_n` documents based on the score
-    top_docs = heapq.nlargest(top_n, doc_scores)
-    return [doc_id for _, doc_id in top_docs]
+    return search_inverted_index(query, inverted_index, top_n)
 
 # Example usage:
 # Assuming `wikipedia_dict` and `queries_dict` are already prepared
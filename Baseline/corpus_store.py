@@ -0,0 +1,203 @@
+import json
+import os
+from collections.abc import Mapping
+import numpy as np
+
+from Retrieval.analyzer import sanitize_text
+from Baseline.boolean_retrieval import preprocess_text
+from Retrieval.compressed_index import StringTable, open_bytes, open_string_table, replace_file, sorted_order, write_string_table
+
+
+class CorpusStoreWriter:
+    """
+    Compiles documents into a corpus store directory, one document at a time:
+
+        doc_ids.bin, doc_ids_offsets.npy, doc_ids_order.npy   document ids and their sorted order
+        texts.bin, texts_offsets.npy                           sanitized text of every document
+        tokens.bin, tokens_offsets.npy                         int32 token ids (preprocess_text tokens)
+        vocab.bin, vocab_offsets.npy                           token strings by token id
+        meta.json
+
+    Opening an existing store continues it, so new documents can be appended later.
+    Documents whose id is already in the store are skipped.
+    """
+
+    def __init__(self, store_path):
+        os.makedirs(store_path, exist_ok=True)
+        self.store_path = store_path
+        self.doc_ids, self.vocab = [], []
+        self.text_offsets, self.token_offsets, self.id_offsets = [0], [0], [0]
+        if os.path.exists(os.path.join(store_path, "meta.json")):
+            store = CorpusStore(store_path)
+            self.doc_ids = list(store.doc_ids)
+            self.vocab = list(store.vocab)
+            self.text_offsets = np.asarray(store.texts.offsets).tolist()
+            self.token_offsets = np.asarray(store.token_offsets).tolist()
+            self.id_offsets = np.asarray(store.doc_ids.offsets).tolist()
+        self.known_ids = set(self.doc_ids)
+        self.vocab_index = {term: term_id for term_id, term in enumerate(self.vocab)}
+        # Drop anything a crashed run appended after the last completed compile
+        self.files = {}
+        for name, offsets, item_size in (("texts", self.text_offsets, 1), ("tokens", self.token_offsets, 4), ("doc_ids", self.id_offsets, 1)):
+            f = open(os.path.join(store_path, f"{name}.bin"), "ab")
+            f.truncate(offsets[-1] * item_size)
+            self.files[name] = f
+
+    def add(self, doc_id, text, tokens=None):
+        """
+        Adds one sanitized document. Returns False if the id is already in the store.
+        tokens, if given, must be preprocess_text(text), e.g. computed by an ingestion worker.
+        """
+        doc_id = str(doc_id)
+        if doc_id in self.known_ids:
+            return False
+        encoded_text = text.encode("utf-8")
+        encoded_id = doc_id.encode("utf-8")
+        token_ids = []
+        for token in (preprocess_text(text) if tokens is None else tokens):
+            token_id = self.vocab_index.get(token)
+            if token_id is None:
+                token_id = self.vocab_index[token] = len(self.vocab)
+                self.vocab.append(token)
+            token_ids.append(token_id)
+        token_ids = np.array(token_ids, dtype=np.int32)
+        self.files["texts"].write(encoded_text)
+        self.files["tokens"].write(token_ids.tobytes())
+        self.files["doc_ids"].write(encoded_id)
+        self.text_offsets.append(self.text_offsets[-1] + len(encoded_text))
+        self.token_offsets.append(self.token_offsets[-1] + len(token_ids))
+        self.id_offsets.append(self.id_offsets[-1] + len(encoded_id))
+        self.doc_ids.append(doc_id)
+        self.known_ids.add(doc_id)
+        return True
+
+    def close(self):
+        for f in self.files.values():
+            f.close()
+        path = self.store_path
+        meta_path = os.path.join(path, "meta.json")
+        # meta.json is removed before the offset and vocab files are rewritten and written
+        # again last: a store without it is incomplete and gets recompiled, never read half-updated
+        if os.path.exists(meta_path):
+            os.remove(meta_path)
+        arrays = {
+            "texts_offsets.npy": np.array(self.text_offsets, dtype=np.int64),
+            "tokens_offsets.npy": np.array(self.token_offsets, dtype=np.int64),
+            "doc_ids_offsets.npy": np.array(self.id_offsets, dtype=np.int64),
+            "doc_ids_order.npy": sorted_order(self.doc_ids),
+        }
+        for name, array in arrays.items():
+            replace_file(os.path.join(path, name), lambda f, array=array: np.save(f, array))
+        write_string_table(path, "vocab", self.vocab)
+        meta = {"num_docs": len(self.doc_ids), "num_tokens": self.token_offsets[-1], "vocab_size": len(self.vocab)}
+        replace_file(meta_path, lambda f: f.write(json.dumps(meta, indent=2).encode("utf-8")))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def compile_corpus(json_data, store_path="Datasets/mini_wiki_collection_store"):
+    """
+    One-time compilation of a document collection into a corpus store.
+    Documents are joined and sanitized exactly like process_json_data; unlike a dict,
+    a repeated wikipedia_id keeps its first text.
+    Args:
+        json_data (iterable): Documents with "wikipedia_id" and "text" (list of paragraphs), e.g. a loaded collection.
+        store_path (str): Store directory; an existing store is extended.
+    Returns:
+        CorpusStore: The compiled store.
+    """
+    with CorpusStoreWriter(store_path) as writer:
+        for doc in json_data:
+            writer.add(doc.get("wikipedia_id"), sanitize_text(" ".join(doc.get("text", []))))
+    return CorpusStore(store_path)
+
+def compile_corpus_file(wikipedia_data_path="Datasets/mini_wiki_collection.json", store_path="Datasets/mini_wiki_collection_store"):
+    # The collection is streamed, so it never has to fit in memory as a whole
+    from Baseline.ingestion import iter_json_records
+    return compile_corpus(iter_json_records(wikipedia_data_path), store_path)
+
+
+class CorpusStore(Mapping):
+    """
+    Read-only, memory-mapped view of a compiled corpus: a mapping from document id
+    to sanitized text, like the dict process_json_data returns. Nothing is read until
+    a document is accessed, and an id is found by binary search, so opening the store
+    and looking up documents does not depend on the corpus size.
+    """
+
+    def __init__(self, store_path="Datasets/mini_wiki_collection_store"):
+        with open(os.path.join(store_path, "meta.json"), "r") as f:
+            self.meta = json.load(f)
+        self.store_path = store_path
+        self.doc_ids = StringTable(
+            open_bytes(os.path.join(store_path, "doc_ids.bin")),
+            np.load(os.path.join(store_path, "doc_ids_offsets.npy"), mmap_mode="r"),
+            np.load(os.path.join(store_path, "doc_ids_order.npy"), mmap_mode="r"),
+        )
+        self.texts = open_string_table(store_path, "texts")
+        self.vocab = open_string_table(store_path, "vocab")
+        self.token_data = np.memmap(os.path.join(store_path, "tokens.bin"), dtype=np.int32, mode="r") if self.meta["num_tokens"] else np.zeros(0, dtype=np.int32)
+        self.token_offsets = np.load(os.path.join(store_path, "tokens_offsets.npy"), mmap_mode="r")
+        self._vocab_list = None
+
+    def __len__(self):
+        return self.meta["num_docs"]
+
+    def __iter__(self):
+        return iter(self.doc_ids)
+
+    def __contains__(self, doc_id):
+        return isinstance(doc_id, str) and self.doc_ids.index(doc_id) >= 0
+
+    def __getitem__(self, doc_id):
+        doc_num = self.doc_ids.index(doc_id) if isinstance(doc_id, str) else -1
+        if doc_num < 0:
+            raise KeyError(doc_id)
+        return self.texts[doc_num]
+
+    def doc_num(self, doc_id):
+        return self.doc_ids.index(doc_id)
+
+    def text(self, doc_num):
+        return self.texts[doc_num]
+
+    def token_ids(self, doc_num):
+        return self.token_data[self.token_offsets[doc_num]:self.token_offsets[doc_num + 1]]
+
+    def tokens(self, doc_num):
+        """
+        preprocess_text tokens of a document, read from the stored token stream.
+        """
+        if self._vocab_list is None:
+            self._vocab_list = list(self.vocab)
+        return [self._vocab_list[token_id] for token_id in self.token_ids(doc_num)]
+
+    def iter_tokens(self):
+        """
+        Yields (doc_id, tokens) for every document in store order, without re-tokenizing.
+        """
+        for doc_num, doc_id in enumerate(self.doc_ids):
+            yield doc_id, self.tokens(doc_num)
+
+    def extend(self, additional_json, limit=1000):
+        """
+        Appends up to limit new documents, like merge_documents does for a dict.
+        Returns:
+            tuple: (updated store, number of documents added).
+        """
+        count = 0
+        with CorpusStoreWriter(self.store_path) as writer:
+            for doc in additional_json:
+                if count >= limit:
+                    break
+                if writer.add(doc.get("wikipedia_id"), sanitize_text(" ".join(doc.get("text", [])))):
+                    count += 1
+        return CorpusStore(self.store_path), count
+
+# Example usage
+# compile_corpus_file("Datasets/mini_wiki_collection.json")
+# wikipedia_dict = CorpusStore("Datasets/mini_wiki_collection_store")
@@ -1,21 +1,33 @@
-# Assuming sanitize_text is a function you've defined elsewhere
+from Retrieval.analyzer import sanitize_text
 
-import re
-
-def merge_documents(main_dict, additional_json, limit=1000):
+def merge_documents(main_dict, additional_json, limit=1000, index=None):
     """
     Adds a subset of documents from an additional JSON file to the main dictionary.
 
     Args:
-        main_dict (dict): The main dictionary where processed documents are stored.
-        additional_json (list): The additional JSON data containing documents.
+        main_dict (dict): The main dictionary where processed documents are stored, or a
+            CorpusStore, which is extended on disk instead.
+        additional_json (iterable): The additional JSON data containing documents; a stream
+            from Baseline.ingestion.iter_json_records avoids loading the whole file.
         limit (int): The maximum number of documents to add to the main dictionary.
+        index: Optional incremental index, or list of them (Retrieval.segments.SegmentedIndex,
+            SegmentedEmbeddings), that receives the added documents as a new delta segment
+            instead of being rebuilt.
 
     Returns:
-        dict: The updated main dictionary with additional documents added.
+        dict: The updated main dictionary (or CorpusStore) with additional documents added.
     """
+    if hasattr(main_dict, "extend"):
+        main_dict, count = main_dict.extend(additional_json, limit)
+        print(f"{count} documents added to the corpus store.")
+        # Appended documents are the last ones in the store
+        added_ids = [main_dict.doc_ids[i] for i in range(len(main_dict) - count, len(main_dict))]
+        add_to_indexes(index, added_ids, [main_dict.text(i) for i in range(len(main_dict) - count, len(main_dict))])
+        return main_dict
+
     # Counter to track how many documents have been added
     count = 0
+    added_ids, added_texts = [], []
 
     for doc in additional_json:
         if count >= limit:
@@ -33,28 +45,25 @@ def merge_documents(main_dict, additional_json, limit=1000):
             
             # Add to the main dictionary
             main_dict[wikipedia_id] = sanitized_text
+            added_ids.append(wikipedia_id)
+            added_texts.append(sanitized_text)
             count += 1
     
     print(f"{count} documents added to the main dictionary.")
+    add_to_indexes(index, added_ids, added_texts)
     return main_dict
 
-def sanitize_text(text):
+def add_to_indexes(index, doc_ids, texts):
     """
-    Cleans and standardizes text by keeping only alphanumeric characters and spaces.
-    Args:
-        text (str): Text to sanitize.
-    Returns:
-        str: Sanitized text.
+    Passes newly added documents to one or more incremental indexes.
     """
-    if isinstance(text, str):
-        # Use regex to keep only alphanumeric characters and spaces
-        text = re.sub(r'[^a-zA-Z0-9\s]', '', text)
-        # Optionally, collapse multiple spaces into a single space
-        text = re.sub(r'\s+', ' ', text).strip()
-    return text
-
+    if index is None or not doc_ids:
+        return
+    for single_index in (index if isinstance(index, (list, tuple)) else [index]):
+        single_index.add_documents(doc_ids, texts)
 
 def process_json_data(json_data):
+    # json_data can be a list or a stream such as Baseline.ingestion.iter_json_records(path)
     result_dict = {}
     
     for doc in json_data:
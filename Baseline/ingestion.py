@@ -0,0 +1,202 @@
+import json
+import os
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+from itertools import islice
+
+from Retrieval.analyzer import analyze, index_tokens, sanitize_text, word_tokens
+
+_decoder = json.JSONDecoder()
+JSON_WHITESPACE = " \t\r\n"
+VALUE_TERMINATORS = JSON_WHITESPACE + ",]"
+
+
+def iter_json_array(file_path, chunk_size=1 << 20):
+    """
+    Yields the elements of a top-level JSON array one at a time, reading the file in
+    chunks, so a dump larger than memory can be processed.
+    Args:
+        file_path (str): Path to a file such as Datasets/mini_wiki_collection.json.
+        chunk_size (int): Number of characters read at a time.
+    """
+    with open(file_path, "r") as f:
+        buffer = ""
+        position = 0
+        # What comes next: "start" ("["), "first" (a value or "]"), "separator" ("," or "]") or "value"
+        expected = "start"
+        eof = False
+        while True:
+            while position < len(buffer) and buffer[position] in JSON_WHITESPACE:
+                position += 1
+            if position < len(buffer):
+                char = buffer[position]
+                if expected == "start":
+                    if char != "[":
+                        raise ValueError(f"{file_path} does not contain a JSON array.")
+                    expected = "first"
+                    position += 1
+                    continue
+                if expected in ("first", "separator") and char == "]":
+                    return
+                if expected == "separator":
+                    if char != ",":
+                        raise ValueError(f"Expected ',' or ']' between array elements in {file_path}.")
+                    expected = "value"
+                    position += 1
+                    continue
+                if char in ",]":
+                    raise ValueError(f"Missing array element in {file_path}.")
+                try:
+                    item, end = _decoder.raw_decode(buffer, position)
+                except json.JSONDecodeError:
+                    if eof:
+                        raise
+                else:
+                    # A value is only complete once the character after it is known:
+                    # "1." at the end of a chunk may continue as 1.5e10 in the next one
+                    if eof or (end < len(buffer) and buffer[end] in VALUE_TERMINATORS):
+                        yield item
+                        position = end
+                        expected = "separator"
+                        continue
+            if eof:
+                if expected != "start":
+                    raise ValueError(f"Unexpected end of file in {file_path}.")
+                return
+            # Drop what has been consumed and read the next chunk
+            chunk = f.read(chunk_size)
+            eof = not chunk
+            buffer = buffer[position:] + chunk
+            position = 0
+
+def iter_jsonl(file_path):
+    """
+    Yields one parsed JSON object per non-empty line, e.g. for the KILT knowledge
+    source or hotpotqa-dev-kilt.jsonl.
+    """
+    with open(file_path, "r") as f:
+        for line in f:
+            line = line.strip()
+            if line:
+                yield json.loads(line)
+
+def iter_json_records(file_path):
+    """
+    Streams records from a JSON array file or a JSONL file, whichever file_path is.
+    """
+    if file_path.endswith(".jsonl"):
+        return iter_jsonl(file_path)
+    with open(file_path, "r") as f:
+        first = f.read(4096).lstrip()[:1]
+    return iter_json_array(file_path) if first == "[" else iter_jsonl(file_path)
+
+def iter_kilt_queries(file_path="Datasets/Original-DevFiles/hotpotqa-dev-kilt.jsonl"):
+    """
+    Yields (query_id, query_text, provenance wikipedia_ids) from a KILT task file.
+    """
+    for record in iter_jsonl(file_path):
+        wikipedia_ids = []
+        for output in record.get("output", []):
+            for provenance in output.get("provenance", []):
+                if provenance.get("wikipedia_id") not in wikipedia_ids:
+                    wikipedia_ids.append(provenance.get("wikipedia_id"))
+        yield record["id"], record["input"], wikipedia_ids
+
+
+def _analyze_documents(documents, index_tokenizer):
+    """
+    Runs in a worker process: joins and sanitizes documents like process_json_data and tokenizes them.
+    """
+    analyzed = []
+    for wikipedia_id, text in documents:
+        sanitized_text = sanitize_text(" ".join(text))
+        if index_tokenizer is index_tokens:
+            # Both token streams from a single analysis pass
+            words, tokens = analyze(sanitized_text)
+        else:
+            words = word_tokens(sanitized_text)
+            tokens = index_tokenizer(sanitized_text) if index_tokenizer is not None else None
+        analyzed.append((wikipedia_id, sanitized_text, words, tokens))
+    return analyzed
+
+def analyze_records(records, num_workers=4, chunk_size=256, max_pending=8, index_tokenizer=index_tokens):
+    """
+    Sanitizes and tokenizes a stream of KILT-style documents in a process pool.
+    At most max_pending chunks of chunk_size documents are in flight, so memory
+    stays bounded however large the input is, and results keep the input order.
+    Args:
+        records (iterable): Documents with "wikipedia_id" and "text" (list of paragraphs), e.g. iter_json_records(path).
+        num_workers (int): Worker processes; 0 analyzes in the calling process.
+        index_tokenizer (callable): Tokenizer of the BM25/TF-IDF indexes (a picklable
+            top-level function), or None to skip those tokens.
+    Yields:
+        tuple: (wikipedia_id, sanitized text, word tokens, index_tokenizer tokens).
+    """
+    documents = ((record.get("wikipedia_id"), record.get("text", [])) for record in records)
+    analyze_chunk = partial(_analyze_documents, index_tokenizer=index_tokenizer)
+    if num_workers == 0:
+        while True:
+            chunk = list(islice(documents, chunk_size))
+            if not chunk:
+                return
+            yield from analyze_chunk(chunk)
+    with ProcessPoolExecutor(num_workers) as pool:
+        pending = deque()
+        while True:
+            chunk = list(islice(documents, chunk_size))
+            if chunk:
+                pending.append(pool.submit(analyze_chunk, chunk))
+            if pending and (len(pending) >= max_pending or not chunk):
+                yield from pending.popleft().result()
+            elif not chunk:
+                return
+
+def ingest(file_path, store_path=None, indexes=(), num_workers=4, batch_size=1024, index_tokenizer=index_tokens):
+    """
+    Streams a JSON or JSONL document dump into the index builders in one pass:
+    the compiled corpus store (for the boolean baseline and later rebuilds) and any
+    incremental indexes (Retrieval.segments.SegmentedIndex), which receive a delta
+    segment every batch_size documents. Documents already in the store are skipped.
+    Args:
+        file_path (str): Document dump, e.g. a KILT knowledge source .jsonl file.
+        store_path (str): Corpus store directory to create or extend, or None.
+        indexes (iterable): Objects with add_tokenized_documents(doc_ids, documents_tokenized).
+        num_workers (int): Analysis worker processes.
+        batch_size (int): Documents per index segment.
+    Returns:
+        int: Number of documents ingested.
+    """
+    from Baseline.corpus_store import CorpusStoreWriter
+
+    writer = CorpusStoreWriter(store_path) if store_path is not None else None
+    batch_ids, batch_tokens = [], []
+    count = 0
+
+    def flush():
+        for index in indexes:
+            index.add_tokenized_documents(batch_ids, batch_tokens)
+        batch_ids.clear()
+        batch_tokens.clear()
+
+    try:
+        for wikipedia_id, text, words, tokens in analyze_records(iter_json_records(file_path), num_workers, index_tokenizer=index_tokenizer):
+            if writer is not None and not writer.add(wikipedia_id, text, words):
+                continue
+            count += 1
+            if indexes:
+                batch_ids.append(wikipedia_id)
+                batch_tokens.append(tokens)
+                if len(batch_ids) >= batch_size:
+                    flush()
+        if batch_ids:
+            flush()
+    finally:
+        if writer is not None:
+            writer.close()
+    print(f"{count} documents ingested from {os.path.basename(file_path)}.")
+    return count
+
+# Example usage
+# ingest("../kilt_knowledgesource.json", store_path="Datasets/kilt_store", num_workers=8)
+# for query_id, query, wikipedia_ids in iter_kilt_queries(): ...
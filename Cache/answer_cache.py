@@ -0,0 +1,147 @@
+import os
+import pickle
+import sqlite3
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+
+# Stages of QAPipeline whose outputs are cached, cheapest to recompute first
+CACHE_STAGES = ("modified_query", "rankings", "answer_candidates", "result")
+
+
+def normalize_query(query):
+    """
+    Cache key of a query: NFKC-normalized, case-folded and whitespace collapsed, so
+    "Who is  Harry Potter?" and "who is harry potter?" share their entries while
+    "C++" and "C", or queries in non-Latin scripts, keep entries of their own.
+    A query of only whitespace has the empty key and is never cached.
+    """
+    return " ".join(unicodedata.normalize("NFKC", query).casefold().split())
+
+
+class AnswerCache:
+    """
+    Caches QAPipeline stage outputs per normalized query.
+
+    The memory tier is an LRU of at most max_entries entries; an optional SQLite file
+    keeps entries across restarts and is consulted when the memory tier misses.
+    Entries expire ttl seconds after they were written in both tiers. Values are
+    stored pickled, so a caller modifying what get returned does not change the cache.
+    The cache has a version (see set_version); entries written under another version,
+    e.g. before an index was rebuilt, are dropped from both tiers.
+    """
+
+    def __init__(self, max_entries=1024, ttl=24 * 3600, db_path=None, version=None):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.version = None
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = {stage: {"hits": 0, "disk_hits": 0, "misses": 0} for stage in CACHE_STAGES}
+        self._db = None
+        if db_path:
+            os.makedirs(os.path.dirname(db_path) or ".", exist_ok=True)
+            # The pipeline reads and writes from many threads; every access holds self._lock
+            self._db = sqlite3.connect(db_path, check_same_thread=False)
+            self._db.execute("CREATE TABLE IF NOT EXISTS answer_cache (key TEXT PRIMARY KEY, value BLOB, expires REAL)")
+            self._db.execute("CREATE TABLE IF NOT EXISTS answer_cache_meta (name TEXT PRIMARY KEY, value TEXT)")
+            self._db.execute("DELETE FROM answer_cache WHERE expires <= ?", (time.time(),))
+            self._db.commit()
+        self._set_version(version)
+
+    def set_version(self, version):
+        """
+        Sets the version of the cached outputs, e.g. a hash of the pipeline config and
+        the index files. When it differs from the version the entries were written
+        under, both tiers are cleared.
+        """
+        if (None if version is None else str(version)) != self.version:
+            self._set_version(version)
+
+    def _set_version(self, version):
+        version = None if version is None else str(version)
+        with self._lock:
+            if version != self.version:
+                self._entries.clear()
+            if self._db is not None:
+                row = self._db.execute("SELECT value FROM answer_cache_meta WHERE name = 'version'").fetchone()
+                if (row[0] if row else None) != version:
+                    self._db.execute("DELETE FROM answer_cache")
+                    self._db.execute("INSERT OR REPLACE INTO answer_cache_meta VALUES ('version', ?)", (version,))
+                    self._db.commit()
+            self.version = version
+
+    def key(self, stage, query):
+        return f"{stage}:{normalize_query(query)}"
+
+    def get(self, stage, query):
+        """
+        Returns the cached output of a stage for a query, or None.
+        """
+        if not normalize_query(query):
+            return None
+        key = self.key(stage, query)
+        now = time.time()
+        with self._lock:
+            stats = self._stats.setdefault(stage, {"hits": 0, "disk_hits": 0, "misses": 0})
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] > now:
+                self._entries.move_to_end(key)
+                stats["hits"] += 1
+                return pickle.loads(entry[1])
+            if entry is not None:
+                del self._entries[key]
+            if self._db is not None:
+                row = self._db.execute("SELECT value, expires FROM answer_cache WHERE key = ?", (key,)).fetchone()
+                if row is not None and row[1] > now:
+                    self._remember(key, row[1], row[0])
+                    stats["disk_hits"] += 1
+                    return pickle.loads(row[0])
+            stats["misses"] += 1
+            return None
+
+    def put(self, stage, query, value):
+        """
+        Stores the output of a stage for a query in both tiers.
+        """
+        if not normalize_query(query):
+            return
+        key = self.key(stage, query)
+        expires = time.time() + self.ttl
+        data = pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+        with self._lock:
+            self._remember(key, expires, data)
+            if self._db is not None:
+                self._db.execute("INSERT OR REPLACE INTO answer_cache VALUES (?, ?, ?)", (key, data, expires))
+                self._db.commit()
+
+    def _remember(self, key, expires, data):
+        self._entries[key] = (expires, data)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            if self._db is not None:
+                self._db.execute("DELETE FROM answer_cache")
+                self._db.commit()
+
+    def get_stats(self):
+        """
+        Hit and miss counts per stage; disk_hits are memory misses served from SQLite.
+        """
+        with self._lock:
+            stats = {"entries": len(self._entries)}
+            for stage, counts in self._stats.items():
+                lookups = counts["hits"] + counts["disk_hits"] + counts["misses"]
+                stats[stage] = dict(counts, hit_rate=(counts["hits"] + counts["disk_hits"]) / lookups if lookups else 0.0)
+            return stats
+
+# Example usage
+# cache = AnswerCache(max_entries=1024, ttl=3600, db_path="Cache/answer_cache.sqlite", version="v1")
+# cache.put("modified_query", "Who is Harry Potter?", "Harry Potter fictional wizard")
+# print(cache.get("modified_query", "who is  harry potter?"))
+# print(cache.get_stats())
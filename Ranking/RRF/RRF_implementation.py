@@ -2,6 +2,9 @@ import json
 import os
 from collections import defaultdict
 
+from Ranking.RRF.fusion import fuse_lists
+from Ranking.run_format import load_runs
+
 def load_and_merge_json_files(directory_path):
     """
     Load and merge JSON files from a directory into a single structure, keeping each list from different files separate for each query.
@@ -14,23 +17,14 @@ def load_and_merge_json_files(directory_path):
     """
     merged_queries = defaultdict(list)
     
-    # Iterate through all files in the directory
-    for filename in os.listdir(directory_path):
-        if filename.endswith('.json'):
-            file_path = os.path.join(directory_path, filename)
-            try:
-                with open(file_path, 'r') as f:
-                    json_data = json.load(f)
-                    
-                    # For each file, add the lists to the corresponding query
-                    for query_data in json_data:
-                        for query, rank_list in query_data.items():
-                            if isinstance(rank_list, list):  # Ensure rank_list is a list
-                                merged_queries[query].append(rank_list)
-                            else:
-                                print(f"Warning: Expected a list for query '{query}' but got {type(rank_list)}")
-            except Exception as e:
-                print(f"Error reading {filename}: {e}")
+    # Runs are read in parallel, from their binary .run copy when it is up to date
+    paths = [os.path.join(directory_path, filename) for filename in os.listdir(directory_path) if filename.endswith('.json')]
+    for run in load_runs(paths, skip_errors=True):
+        if run is None:
+            continue
+        # For each file, add the lists to the corresponding query
+        for query, rank_list in run.items():
+            merged_queries[query].append(rank_list)
     
     # Convert defaultdict to a list of dictionaries
     return [{query: lists} for query, lists in merged_queries.items()]
@@ -47,26 +41,16 @@ def reciprocal_rank_fusion(json_input, K=60, top_n=100):
     Returns:
     list: A list of dictionaries with each query and its respective fused document rankings.
     """
-    query_fusion_results = []
-
-    # Iterate over each query in the JSON input
+    query_ids = []
+    queries = []
     for query_data in json_input:
         for query, list_of_ranked_docs in query_data.items():
-            rrf_map = defaultdict(float)
-
-            # Fuse rankings for the query using RRF
-            for rank_list in list_of_ranked_docs:
-                for rank, doc in enumerate(rank_list, 1):
-                    rrf_map[doc] += 1 / (rank + K)
+            query_ids.append(query)
+            queries.append(list_of_ranked_docs)
 
-            # Sort the documents based on RRF scores in descending order
-            sorted_docs = sorted(rrf_map.items(), key=lambda x: x[1], reverse=True)
-            fused_rankings = [doc for doc, score in sorted_docs[:top_n]]  # Keep only top N results
-
-            # Store the results for the current query
-            query_fusion_results.append({query: fused_rankings})
-
-    return query_fusion_results
+    # All queries are fused together by the vectorized engine in fusion.py
+    fused = fuse_lists(queries, K=K, top_n=top_n)
+    return [{query: fused_rankings} for query, fused_rankings in zip(query_ids, fused)]
 
 def save_to_json(output_data, output_file_path):
     """
@@ -110,21 +94,7 @@ def reciprocal_rank_fusion_two(rank_list1, rank_list2, K=60, top_n=100):
     Returns:
     list: Combined list of rankings after applying RRF.
     """
-    rrf_map = defaultdict(float)
-
-    # Process the first ranking list
-    for rank, doc in enumerate(rank_list1, 1):  # Start ranks from 1
-        rrf_map[doc] += 1 / (rank + K)
-    
-    # Process the second ranking list
-    for rank, doc in enumerate(rank_list2, 1):  # Start ranks from 1
-        rrf_map[doc] += 1 / (rank + K)
-
-    # Sort the documents based on RRF scores in descending order
-    sorted_docs = sorted(rrf_map.items(), key=lambda x: x[1], reverse=True)
-
-    # Return only the top N results
-    return [doc for doc, score in sorted_docs[:top_n]]
+    return fuse_lists([[rank_list1, rank_list2]], K=K, top_n=top_n)[0]
 
 
 def reciprocal_rank_fusion_three(rank_list1, rank_list2, rank_list3, K=60, top_n=100):
@@ -141,25 +111,7 @@ def reciprocal_rank_fusion_three(rank_list1, rank_list2, rank_list3, K=60, top_n
     Returns:
     list: Combined list of rankings after applying RRF.
     """
-    rrf_map = defaultdict(float)
-
-    # Process the first ranking list
-    for rank, doc in enumerate(rank_list1, 1):  # Start ranks from 1
-        rrf_map[doc] += 1 / (rank + K)
-    
-    # Process the second ranking list
-    for rank, doc in enumerate(rank_list2, 1):  # Start ranks from 1
-        rrf_map[doc] += 1 / (rank + K)
-    
-    # Process the third ranking list
-    for rank, doc in enumerate(rank_list3, 1):  # Start ranks from 1
-        rrf_map[doc] += 1 / (rank + K)
-
-    # Sort the documents based on RRF scores in descending order
-    sorted_docs = sorted(rrf_map.items(), key=lambda x: x[1], reverse=True)
-
-    # Return only the top N results
-    return [doc for doc, score in sorted_docs[:top_n]]
+    return fuse_lists([[rank_list1, rank_list2, rank_list3]], K=K, top_n=top_n)[0]
 
 
 def reciprocal_rank_fusion_six(rank_list1, rank_list2, rank_list3, rank_list4, rank_list5, rank_list6, K=60, top_n=100):
@@ -179,27 +131,8 @@ def reciprocal_rank_fusion_six(rank_list1, rank_list2, rank_list3, rank_list4, r
     Returns:
     list: Combined list of rankings after applying RRF.
     """
-    rrf_map = defaultdict(float)
-
-    # Process each ranking list
-    for rank, doc in enumerate(rank_list1, 1):
-        rrf_map[doc] += 1 / (rank + K)
-    for rank, doc in enumerate(rank_list2, 1):
-        rrf_map[doc] += 1 / (rank + K)
-    for rank, doc in enumerate(rank_list3, 1):
-        rrf_map[doc] += 1 / (rank + K)
-    for rank, doc in enumerate(rank_list4, 1):
-        rrf_map[doc] += 1 / (rank + K)
-    for rank, doc in enumerate(rank_list5, 1):
-        rrf_map[doc] += 1 / (rank + K)
-    for rank, doc in enumerate(rank_list6, 1):
-        rrf_map[doc] += 1 / (rank + K)
-
-    # Sort the documents based on RRF scores in descending order
-    sorted_docs = sorted(rrf_map.items(), key=lambda x: x[1], reverse=True)
-
-    # Return only the top N results
-    return [doc for doc, score in sorted_docs[:top_n]]
+    rank_lists = [rank_list1, rank_list2, rank_list3, rank_list4, rank_list5, rank_list6]
+    return fuse_lists([rank_lists], K=K, top_n=top_n)[0]
 
 
 def reciprocal_rank_fusion_multiple_lists(ranking_lists, K=60, top_n=100):
@@ -214,26 +147,12 @@ def reciprocal_rank_fusion_multiple_lists(ranking_lists, K=60, top_n=100):
     Returns:
     dict: A dictionary with query IDs as keys and their combined rankings as values.
     """
-    combined_results = defaultdict(list)
-
     # Flatten all ranking lists into a single dictionary per query
     merged_rankings = defaultdict(list)
     for ranking_list in ranking_lists:
         for ranking_dict in ranking_list:
             for query_id, doc_list in ranking_dict.items():
-                merged_rankings[query_id].append(doc_list)
-
-    # Apply RRF for each query
-    for query_id, ranked_lists in merged_rankings.items():
-        rrf_map = defaultdict(float)
-
-        # Process rankings for each system
-        for rank_list in ranked_lists:
-            for rank, doc in enumerate(rank_list, 1):  # Start rank from 1
-                rrf_map[str(doc)] += 1 / (rank + K)
-
-        # Sort documents based on their RRF scores in descending order
-        sorted_docs = sorted(rrf_map.items(), key=lambda x: x[1], reverse=True)
-        combined_results[query_id] = [doc for doc, score in sorted_docs[:top_n]]
+                merged_rankings[query_id].append([str(doc) for doc in doc_list])
 
-    return dict(combined_results)
\ No newline at end of file
+    fused = fuse_lists(list(merged_rankings.values()), K=K, top_n=top_n)
+    return dict(zip(merged_rankings.keys(), fused))
@@ -0,0 +1,214 @@
+import numpy as np
+
+FUSION_METHODS = ("rrf", "combsum", "combmnz")
+NORMALIZATIONS = (None, "minmax", "zscore")
+
+
+class DocIdMap:
+    """
+    Maps external document ids (str or int, kept as given) to dense integer ids and back.
+    """
+
+    def __init__(self):
+        self.ids = {}
+        self.docs = []
+
+    def __len__(self):
+        return len(self.docs)
+
+    def encode(self, doc):
+        doc_id = self.ids.get(doc)
+        if doc_id is None:
+            doc_id = self.ids[doc] = len(self.docs)
+            self.docs.append(doc)
+        return doc_id
+
+    def decode(self, doc_ids):
+        return [self.docs[doc_id] for doc_id in doc_ids if doc_id >= 0]
+
+
+def encode_rankings(queries, doc_map=None, scores=None):
+    """
+    Packs ranked lists into dense arrays.
+    Args:
+        queries (list): One entry per query, each a list of ranked document lists (one per system).
+        doc_map (DocIdMap): Mapping to extend; a new one is created if None.
+        scores (list): Optional retrieval scores shaped like queries.
+    Returns:
+        tuple: (doc_ids int64 array of shape (queries, systems, depth) padded with -1,
+        float64 scores of the same shape padded with NaN or None, DocIdMap).
+    """
+    doc_map = doc_map or DocIdMap()
+    num_systems = max((len(lists) for lists in queries), default=0)
+    lengths = np.zeros((len(queries), num_systems), dtype=np.int64)
+    for q, lists in enumerate(queries):
+        lengths[q, :len(lists)] = [len(ranked) for ranked in lists]
+    depth = int(lengths.max()) if lengths.size else 0
+    # Row-major order of the mask matches the order of the flattened lists
+    present = np.arange(depth) < lengths[:, :, None]
+    flat = [doc for lists in queries for ranked in lists for doc in ranked]
+    for doc in dict.fromkeys(flat):
+        doc_map.encode(doc)
+    doc_ids = np.full((len(queries), num_systems, depth), -1, dtype=np.int64)
+    doc_ids[present] = np.fromiter(map(doc_map.ids.__getitem__, flat), dtype=np.int64, count=len(flat))
+    score_matrix = None
+    if scores is not None:
+        score_matrix = np.full(doc_ids.shape, np.nan)
+        score_matrix[present] = [score for lists in scores for ranked in lists for score in ranked]
+    return doc_ids, score_matrix, doc_map
+
+def normalize_scores(scores, present, normalization):
+    """
+    Normalizes every (query, system) list of scores: "minmax" to [0, 1], "zscore" to
+    zero mean and unit variance. Lists whose scores are all equal become 1 (minmax) or 0 (zscore).
+    """
+    if normalization is None:
+        return scores
+    masked = np.where(present, scores, np.nan)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        if normalization == "minmax":
+            low = np.nanmin(np.where(present.any(axis=2, keepdims=True), masked, 0), axis=2, keepdims=True)
+            high = np.nanmax(np.where(present.any(axis=2, keepdims=True), masked, 0), axis=2, keepdims=True)
+            spread = high - low
+            normalized = np.where(spread > 0, (masked - low) / np.where(spread > 0, spread, 1), 1.0)
+        elif normalization == "zscore":
+            counts = np.maximum(present.sum(axis=2, keepdims=True), 1)
+            mean = np.where(present, scores, 0).sum(axis=2, keepdims=True) / counts
+            std = np.sqrt(np.where(present, (scores - mean) ** 2, 0).sum(axis=2, keepdims=True) / counts)
+            normalized = np.where(std > 0, (masked - mean) / np.where(std > 0, std, 1), 0.0)
+        else:
+            raise ValueError(f"Unknown normalization '{normalization}', expected one of {NORMALIZATIONS}.")
+    return np.where(present, normalized, 0.0)
+
+def fuse(doc_ids, scores=None, method="rrf", weights=None, K=60, normalization=None, top_n=100):
+    """
+    Fuses many queries at once, fully vectorized.
+
+    Methods:
+        rrf: sum over systems of weight / (K + rank), ranks starting at 1.
+        combsum: sum of (normalized) scores.
+        combmnz: combsum times the number of systems that retrieved the document.
+    Without scores, the score-based methods use (depth - rank + 1) / depth.
+    Ties are broken by first appearance (system by system, rank by rank), which is
+    the order Python's stable sorted() over a defaultdict gives the legacy functions.
+    Args:
+        doc_ids (np.ndarray): (queries, systems, depth) integer ids, -1 for padding.
+        scores (np.ndarray): Optional scores of the same shape.
+        method (str): "rrf", "combsum" or "combmnz".
+        weights (array-like): One weight per system (default 1).
+        K (int): RRF constant.
+        normalization (str): None, "minmax" or "zscore", for the score-based methods.
+        top_n (int): Number of documents to keep per query.
+    Returns:
+        tuple: (fused ids of shape (queries, top_n) padded with -1, fused scores padded with -inf).
+    """
+    if method not in FUSION_METHODS:
+        raise ValueError(f"Unknown fusion method '{method}', expected one of {FUSION_METHODS}.")
+    num_queries, num_systems, depth = doc_ids.shape
+    present = doc_ids >= 0
+    weights = np.ones(num_systems) if weights is None else np.asarray(weights, dtype=np.float64)
+    ranks = np.arange(1, depth + 1, dtype=np.float64)
+
+    if method == "rrf":
+        contributions = weights[None, :, None] / (ranks + K)[None, None, :]
+    else:
+        if scores is None:
+            scores = np.broadcast_to((depth - ranks + 1) / max(depth, 1), doc_ids.shape)
+        contributions = weights[None, :, None] * normalize_scores(scores, present, normalization)
+    contributions = np.broadcast_to(contributions, doc_ids.shape)
+
+    # Entries of a query in first-appearance order: system by system, rank by rank.
+    # Padding gets the largest id so it sorts last, and contributes 0.
+    padding = np.iinfo(np.int64).max
+    num_entries = num_systems * depth
+    entries = np.where(present, doc_ids, padding).reshape(num_queries, num_entries)
+    values = np.where(present, contributions, 0.0).reshape(num_queries, num_entries)
+    # A stable sort per query groups equal documents and keeps their entries in order
+    order = np.argsort(entries, axis=1, kind="stable")
+    sorted_docs = np.take_along_axis(entries, order, axis=1)
+    group_start = sorted_docs != padding
+    group_start[:, 1:] &= sorted_docs[:, 1:] != sorted_docs[:, :-1]
+    starts = np.flatnonzero(group_start)
+    if len(starts) == 0:
+        return np.full((num_queries, top_n), -1, dtype=np.int64), np.full((num_queries, top_n), -np.inf)
+    # bincount adds each group left to right, in the same order as the legacy loops
+    # (np.add.reduceat would sum groups of 8 or more pairwise and change ties);
+    # padding is counted into the preceding group and adds 0
+    groups = np.maximum(np.cumsum(group_start.ravel()) - 1, 0)
+    fused = np.bincount(groups, np.take_along_axis(values, order, axis=1).ravel(), len(starts))
+    if method == "combmnz":
+        fused = fused * np.bincount(groups, (sorted_docs != padding).ravel(), len(starts))
+    first_seen = order.ravel()[starts]
+    key_queries = starts // num_entries
+    key_docs = sorted_docs.ravel()[starts]
+
+    # Lay the candidates of each query out as one row of a padded matrix
+    candidates_per_query = np.bincount(key_queries, minlength=num_queries)
+    query_starts = np.concatenate([[0], np.cumsum(candidates_per_query)[:-1]])
+    width = max(int(candidates_per_query.max()) if num_queries else 0, 1)
+    columns = np.arange(len(starts)) - query_starts[key_queries]
+    row_scores = np.full((num_queries, width), -np.inf)
+    row_first = np.full((num_queries, width), np.iinfo(np.int64).max)
+    row_docs = np.full((num_queries, width), -1, dtype=np.int64)
+    row_scores[key_queries, columns] = fused
+    row_first[key_queries, columns] = first_seen
+    row_docs[key_queries, columns] = key_docs
+
+    if width > top_n:
+        # argpartition keeps every candidate scoring at least the top_n-th score (ties included)
+        kth = np.partition(row_scores, width - top_n, axis=1)[:, width - top_n]
+        keep = row_scores >= kth[:, None]
+        keep_width = int(keep.sum(axis=1).max())
+        selected = np.argpartition(~keep, keep_width - 1, axis=1)[:, :keep_width]
+        row_scores = np.take_along_axis(row_scores, selected, axis=1)
+        row_first = np.take_along_axis(row_first, selected, axis=1)
+        row_docs = np.take_along_axis(np.where(keep, row_docs, -1), selected, axis=1)
+        row_scores = np.where(row_docs >= 0, row_scores, -np.inf)
+
+    # Highest score first, then earliest first appearance
+    order = np.lexsort((row_first, -row_scores), axis=1)[:, :top_n]
+    fused_docs = np.take_along_axis(row_docs, order, axis=1)
+    fused_scores = np.take_along_axis(row_scores, order, axis=1)
+    fused_docs[~np.isfinite(fused_scores)] = -1
+    if fused_docs.shape[1] < top_n:
+        padding = top_n - fused_docs.shape[1]
+        fused_docs = np.pad(fused_docs, ((0, 0), (0, padding)), constant_values=-1)
+        fused_scores = np.pad(fused_scores, ((0, 0), (0, padding)), constant_values=-np.inf)
+    return fused_docs, fused_scores
+
+def fuse_lists(queries, method="rrf", weights=None, K=60, normalization=None, top_n=100, scores=None):
+    """
+    Fuses ranked lists given with external document ids.
+    Args:
+        queries (list): One entry per query, each a list of ranked document lists.
+    Returns:
+        list: Fused document lists, one per query, with the original ids.
+    """
+    doc_ids, score_matrix, doc_map = encode_rankings(queries, scores=scores)
+    fused_docs, _ = fuse(doc_ids, score_matrix, method, weights, K, normalization, top_n)
+    return [doc_map.decode(row) for row in fused_docs]
+
+def fuse_runs(runs, method="rrf", weights=None, K=60, normalization=None, top_n=100):
+    """
+    Fuses whole runs, e.g. the TF-IDF, BM25, open-source and vision rankings of every query.
+    Adding a retriever only means adding its run to the list.
+    Args:
+        runs (list): One run per system, either {query_id: [docs]} or the
+            [{query_id: [docs]}, ...] format of the Rankings/ files.
+        weights (list): One weight per run.
+    Returns:
+        dict: Query id to fused document list, for every query found in any run.
+    """
+    runs = [_run_to_dict(run) for run in runs]
+    query_ids = list(dict.fromkeys(query_id for run in runs for query_id in run))
+    queries = [[run.get(query_id, []) for run in runs] for query_id in query_ids]
+    fused = fuse_lists(queries, method, weights, K, normalization, top_n)
+    return dict(zip(query_ids, fused))
+
+def _run_to_dict(run):
+    if isinstance(run, dict):
+        return run
+    merged = {}
+    for ranking in run:
+        merged.update(ranking)
+    return merged
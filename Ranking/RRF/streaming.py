@@ -0,0 +1,134 @@
+import numpy as np
+
+from Ranking.RRF.fusion import fuse_lists
+
+_END = object()
+
+
+def deepening_iterator(get_scores, doc_ids=None, initial_k=10, growth=2, max_k=100):
+    """
+    Turns a retriever's document scores into a ranked iterator. The scores of the query
+    are computed once, on the first pull, and the ranking is sorted lazily: first the
+    top initial_k documents, then growth times more once those have all been consumed,
+    so a retriever whose results are not needed deep down never sorts its whole list.
+    Ties are ranked by document number, as a stable sort by descending score would.
+    Args:
+        get_scores (callable): Returns the score of every document for the query,
+            e.g. lambda: index.get_scores(query_tokens). An array is used as is.
+        doc_ids (list): Optional document id of every document number.
+        initial_k (int): Depth of the first slice.
+        growth (int): Factor by which the depth grows on every new slice.
+        max_k (int): Deepest rank yielded.
+    Yields:
+        Documents (ids, or document numbers without doc_ids) in rank order, each once.
+    """
+    scores = np.asarray(get_scores() if callable(get_scores) else get_scores, dtype=np.float64)
+    remaining = np.arange(len(scores))
+    max_k = min(max_k, len(scores))
+    done, k = 0, min(initial_k, max_k)
+    while done < max_k:
+        take = k - done
+        rest = scores[remaining]
+        if take < len(remaining):
+            # The take-th best score; ties at the border go to the lowest document numbers
+            threshold = np.partition(rest, len(rest) - take)[len(rest) - take]
+            above = remaining[rest > threshold]
+            chosen = np.concatenate([above, remaining[rest == threshold][:take - len(above)]])
+        else:
+            chosen = remaining
+        chosen = chosen[np.lexsort((chosen, -scores[chosen]))]
+        remaining = np.setdiff1d(remaining, chosen, assume_unique=True)
+        for doc in chosen.tolist():
+            yield doc if doc_ids is None else doc_ids[doc]
+        done, k = k, min(k * growth, max_k)
+
+def _is_settled(lower_bounds, seen, frontier, top_n, exact_order=True):
+    """
+    Checks whether the top_n documents, and with exact_order their order, can no longer change.
+    Args:
+        lower_bounds (list): Known RRF score of every candidate.
+        seen (list): Per candidate, whether each system has already returned it.
+        frontier (np.ndarray): Largest contribution each system can still give (0 once exhausted).
+        top_n (int): Number of documents wanted.
+    """
+    # An unseen document can at most get the frontier of every system
+    unseen_bound = frontier.sum()
+    if len(lower_bounds) < top_n:
+        return unseen_bound == 0
+    lower = np.asarray(lower_bounds)
+    # A seen document can only still gain from the systems that have not returned it
+    upper = lower + (~np.asarray(seen)) @ frontier
+    order = np.argsort(-lower, kind="stable")
+    top, rest = order[:top_n], order[top_n:]
+    outside_bound = max(upper[rest].max() if len(rest) else 0.0, unseen_bound)
+    if lower[top[-1]] <= outside_bound:
+        return False
+    if not exact_order:
+        return True
+    # The order inside the top is fixed when every document beats the best bound of those below it
+    upper_below = np.maximum.accumulate(upper[top][::-1])[::-1]
+    return bool(np.all(lower[top[:-1]] > upper_below[1:]))
+
+def streaming_rrf(ranked_iterators, K=60, top_n=10, weights=None, max_depth=None, check_every=1, exact_order=True):
+    """
+    Reciprocal Rank Fusion that pulls documents from the retrievers lazily and stops as
+    soon as the top_n fused documents are certain (the no-random-access variant of
+    Fagin's threshold algorithm). The systems are read round robin, one rank at a time;
+    after each round every candidate's score is bounded from below by its known
+    contributions and from above by what the systems that have not returned it could
+    still add at the next rank. The result is the one reciprocal_rank_fusion gives on
+    the complete lists; with max_depth it is the fusion of the first max_depth ranks.
+    Args:
+        ranked_iterators (list): One iterable per system yielding documents in rank
+            order without repeats, e.g. deepening_iterator(...) or a plain list.
+        K (int): A constant used in the RRF formula (default is 60).
+        top_n (int): Number of top results to return (default is 10).
+        weights (list): Optional weight per system.
+        max_depth (int): Deepest rank read from any system, None for no limit.
+        check_every (int): Number of rounds between two stopping checks.
+        exact_order (bool): If False, stop as soon as the top_n documents are certain and
+            order them by their scores so far. With K=60 the set settles much earlier
+            than the order, because close ranks give almost the same contribution.
+    Returns:
+        list: Combined list of rankings after applying RRF.
+    """
+    iterators = [iter(ranked) for ranked in ranked_iterators]
+    weights = np.ones(len(iterators)) if weights is None else np.asarray(weights, dtype=np.float64)
+    active = np.ones(len(iterators), dtype=bool)
+    pulled = [[] for _ in iterators]
+    candidates = {}
+    lower_bounds, seen = [], []
+    depth = 0
+
+    while active.any() and (max_depth is None or depth < max_depth):
+        depth += 1
+        for system, iterator in enumerate(iterators):
+            if not active[system]:
+                continue
+            doc = next(iterator, _END)
+            if doc is _END:
+                active[system] = False
+                continue
+            pulled[system].append(doc)
+            candidate = candidates.get(doc)
+            if candidate is None:
+                candidate = candidates[doc] = len(lower_bounds)
+                lower_bounds.append(0.0)
+                seen.append(np.zeros(len(iterators), dtype=bool))
+            lower_bounds[candidate] += weights[system] / (K + depth)
+            seen[candidate][system] = True
+        if depth % check_every == 0:
+            frontier = np.where(active, weights / (K + depth + 1), 0.0)
+            if _is_settled(lower_bounds, seen, frontier, top_n, exact_order):
+                break
+
+    # The prefixes read so far give the final scores of the top documents, and the
+    # legacy tie-breaking when the lists were read to the end
+    return fuse_lists([pulled], K=K, weights=weights, top_n=top_n)[0]
+
+# Example usage
+# from Retrieval.bm25_index import BM25Index
+# from Retrieval.registry import registry
+# index, ids = BM25Index.load(), registry.load("Retrieval/savedModels/ids.pkl")
+# iterators = [deepening_iterator(lambda: index.get_scores(query_tokens), ids) for query_tokens in (original_tokens, modified_tokens)]
+# top_10 = streaming_rrf(iterators, top_n=10)
@@ -0,0 +1,277 @@
+import glob
+import json
+import os
+import struct
+from collections.abc import Mapping
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+import numpy as np
+
+from Retrieval.registry import registry
+
+MAGIC = b"QARUN\x00\x00\x00"
+FORMAT_VERSION = 1
+ALIGNMENT = 64
+
+# Every run file of the repository that the bulk converter handles
+RUN_PATTERNS = (
+    "Rankings/*/*.json",
+    "Results/Final_ranking_json/*.json",
+    "QnA_Eval/*combined*.json",
+)
+
+
+def parse_json_run(json_data):
+    """
+    Reads the two run layouts used in the repository:
+    [{query_id: [doc ids]}, ...] (Rankings/, QnA_Eval/) and
+    [{"query": query_id, "rank": rank}, ...] (Results/Final_ranking_json/).
+    Returns:
+        tuple: (dict of query id to list, kind "run" or "ranks").
+    """
+    if not isinstance(json_data, list):
+        raise ValueError(f"Expected a list of queries but got {type(json_data)}")
+    rankings = {}
+    kind = "run"
+    for entry in json_data:
+        if set(entry) == {"query", "rank"}:
+            kind = "ranks"
+            rankings[entry["query"]] = [entry["rank"]]
+        else:
+            for query_id, ranking in entry.items():
+                if isinstance(ranking, list):
+                    rankings[query_id] = ranking
+                else:
+                    print(f"Warning: Expected a list for query '{query_id}' but got {type(ranking)}")
+    return rankings, kind
+
+def read_json_run(json_path):
+    with open(json_path, "r") as f:
+        return parse_json_run(json.load(f))[0]
+
+def _id_type(rankings):
+    types = {type(doc) for ranking in rankings.values() for doc in ranking}
+    if types <= {int}:
+        return "int"
+    if types == {str}:
+        return "str"
+    raise ValueError(f"Document ids must be all int or all str, got {sorted(t.__name__ for t in types)}")
+
+def _encode_ids(docs, id_type):
+    ids = np.array([int(doc) for doc in docs], dtype=np.int64)
+    if len(ids) and (ids.min() < np.iinfo(np.int32).min or ids.max() > np.iinfo(np.int32).max):
+        raise ValueError("Document ids do not fit in int32.")
+    if id_type == "str" and any(str(int(doc)) != doc for doc in docs):
+        raise ValueError("Only decimal document ids without leading zeros can be stored.")
+    return ids.astype(np.int32)
+
+def _aligned(position):
+    return -(-position // ALIGNMENT) * ALIGNMENT
+
+def write_run(run_path, rankings, scores=None, kind="run"):
+    """
+    Writes a run to the binary run format:
+
+        magic (8 bytes), header length (uint64), JSON header with the query ids,
+        then, aligned to 64 bytes: int64 offsets (one per query plus one),
+        int32 document ids, and optionally float32 scores (NaN where missing).
+
+    The ranking of the i-th query is ids[offsets[i]:offsets[i + 1]].
+    Args:
+        run_path (str): Output file, e.g. "Rankings/bm25/bm25_1_2_top_100.run".
+        rankings (dict): Query id to ranked document ids (all int or all decimal str).
+        scores (dict): Optional query id to scores, aligned with the rankings.
+        kind (str): "run" for document rankings, "ranks" for Results/Final_ranking_json files.
+    """
+    query_ids = list(rankings)
+    id_type = _id_type(rankings)
+    offsets = np.zeros(len(query_ids) + 1, dtype=np.int64)
+    offsets[1:] = np.cumsum([len(rankings[query_id]) for query_id in query_ids])
+    doc_ids = _encode_ids([doc for query_id in query_ids for doc in rankings[query_id]], id_type)
+    run_scores = None
+    if scores is not None:
+        run_scores = np.full(len(doc_ids), np.nan, dtype=np.float32)
+        for i, query_id in enumerate(query_ids):
+            query_scores = scores.get(query_id, [])[:offsets[i + 1] - offsets[i]]
+            run_scores[offsets[i]:offsets[i] + len(query_scores)] = query_scores
+
+    header = json.dumps({
+        "format_version": FORMAT_VERSION,
+        "kind": kind,
+        "id_type": id_type,
+        "num_queries": len(query_ids),
+        "num_entries": int(offsets[-1]),
+        "has_scores": run_scores is not None,
+        "query_ids": query_ids,
+    }).encode("utf-8")
+    data_start = _aligned(len(MAGIC) + 8 + len(header))
+
+    # Written next to the target and renamed, so readers never see a partial file
+    temp_path = f"{run_path}.tmp"
+    with open(temp_path, "wb") as f:
+        f.write(MAGIC + struct.pack("<Q", len(header)) + header)
+        for array in (offsets, doc_ids, run_scores):
+            if array is not None:
+                f.write(b"\x00" * (data_start - f.tell()))
+                f.write(array.tobytes())
+                data_start = _aligned(f.tell())
+    os.replace(temp_path, run_path)
+
+
+class BinaryRun(Mapping):
+    """
+    Memory-mapped run in the binary run format. Opening reads only the header;
+    the ranking of a query is located through the offset table and decoded on access.
+    Behaves like the {query_id: [doc ids]} dictionary it was written from.
+    """
+
+    def __init__(self, run_path):
+        self.path = run_path
+        with open(run_path, "rb") as f:
+            if f.read(len(MAGIC)) != MAGIC:
+                raise ValueError(f"{run_path} is not a binary run file.")
+            (header_length,) = struct.unpack("<Q", f.read(8))
+            header = json.loads(f.read(header_length).decode("utf-8"))
+        if header["format_version"] != FORMAT_VERSION:
+            raise ValueError(f"Unsupported run format version {header['format_version']} in {run_path}.")
+        self.kind = header["kind"]
+        self.id_type = header["id_type"]
+        self.query_ids = header["query_ids"]
+        self._rows = {query_id: i for i, query_id in enumerate(self.query_ids)}
+
+        num_queries, num_entries = header["num_queries"], header["num_entries"]
+        data = np.memmap(run_path, dtype=np.uint8, mode="r")
+        start = _aligned(len(MAGIC) + 8 + header_length)
+        self.offsets = data[start:start + 8 * (num_queries + 1)].view(np.int64)
+        start = _aligned(start + 8 * (num_queries + 1))
+        self.doc_ids = data[start:start + 4 * num_entries].view(np.int32)
+        start = _aligned(start + 4 * num_entries)
+        self.scores = data[start:start + 4 * num_entries].view(np.float32) if header["has_scores"] else None
+
+    def __len__(self):
+        return len(self.query_ids)
+
+    def __iter__(self):
+        return iter(self.query_ids)
+
+    def __contains__(self, query_id):
+        return query_id in self._rows
+
+    def _range(self, query_id):
+        row = self._rows[query_id]
+        return int(self.offsets[row]), int(self.offsets[row + 1])
+
+    def ranking(self, query_id):
+        """
+        Document ids of a query as an int32 array view.
+        """
+        start, end = self._range(query_id)
+        return self.doc_ids[start:end]
+
+    def query_scores(self, query_id):
+        """
+        Scores of a query as a float32 array view, or None if the run has none.
+        """
+        if self.scores is None:
+            return None
+        start, end = self._range(query_id)
+        return self.scores[start:end]
+
+    def __getitem__(self, query_id):
+        ranking = self.ranking(query_id).tolist()
+        return [str(doc) for doc in ranking] if self.id_type == "str" else ranking
+
+    def to_json(self):
+        """
+        The run in the JSON layout it was converted from.
+        """
+        if self.kind == "ranks":
+            return [{"query": query_id, "rank": self[query_id][0]} for query_id in self.query_ids]
+        return [{query_id: self[query_id]} for query_id in self.query_ids]
+
+
+def run_path_for(json_path):
+    return os.path.splitext(json_path)[0] + ".run"
+
+def convert_json_run(json_path, run_path=None):
+    """
+    Converts one JSON run file to the binary run format.
+    Returns:
+        str: Path of the written run.
+    """
+    run_path = run_path or run_path_for(json_path)
+    with open(json_path, "r") as f:
+        rankings, kind = parse_json_run(json.load(f))
+    write_run(run_path, rankings, kind=kind)
+    return run_path
+
+def _is_up_to_date(json_path, run_path):
+    return os.path.exists(run_path) and os.path.getmtime(run_path) >= os.path.getmtime(json_path)
+
+def convert_runs(patterns=RUN_PATTERNS, num_workers=4, force=False):
+    """
+    Bulk converter: writes a .run file next to every JSON run matched by patterns
+    that has no up-to-date binary copy yet.
+    Args:
+        patterns (iterable): Glob patterns, relative to the repository root.
+        num_workers (int): Processes parsing JSON files in parallel.
+        force (bool): Convert files whose .run copy is up to date as well.
+    Returns:
+        list: Paths of the written runs.
+    """
+    json_paths = sorted({path for pattern in patterns for path in glob.glob(pattern)})
+    pending = [path for path in json_paths if force or not _is_up_to_date(path, run_path_for(path))]
+    converted = []
+    with ProcessPoolExecutor(max(num_workers, 1)) as pool:
+        futures = [(path, pool.submit(convert_json_run, path)) for path in pending]
+        for path, future in futures:
+            try:
+                converted.append(future.result())
+            except Exception as e:
+                print(f"Error converting {path}: {e}")
+    print(f"{len(converted)} runs converted, {len(json_paths) - len(pending)} already up to date.")
+    return converted
+
+def load_run(path):
+    """
+    Loads a run as a {query_id: [doc ids]} mapping. A JSON path is served from its
+    binary .run copy when that is up to date. The result is cached in the retriever
+    registry, so asking again for an unchanged file does not read it again.
+    Args:
+        path (str): A .json or .run file.
+    Returns:
+        Mapping: BinaryRun, or a dict for JSON files without a binary copy.
+    """
+    if path.endswith(".run"):
+        return registry.load(path, BinaryRun)
+    run_path = run_path_for(path)
+    if _is_up_to_date(path, run_path):
+        return registry.load(run_path, BinaryRun)
+    return registry.load(path, read_json_run)
+
+def load_runs(paths, num_workers=8, skip_errors=False):
+    """
+    Loads many runs in parallel threads (see load_run).
+    Args:
+        paths (list): Run files.
+        num_workers (int): Number of threads.
+        skip_errors (bool): Print and return None for unreadable files instead of raising.
+    Returns:
+        list: One mapping per path, in the order of paths.
+    """
+    def load(path):
+        try:
+            return load_run(path)
+        except Exception as e:
+            if not skip_errors:
+                raise
+            print(f"Error reading {path}: {e}")
+            return None
+
+    with ThreadPoolExecutor(max(num_workers, 1)) as pool:
+        return list(pool.map(load, paths))
+
+# Example usage
+# convert_runs()
+# run = load_run("Rankings/bm25/bm25_1_2_top_100.json")
+# print(run["5xvggq"][:10])
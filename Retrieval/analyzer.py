@@ -0,0 +1,135 @@
+import re
+from collections import namedtuple
+from functools import lru_cache
+import numpy as np
+
+# Compiled once and shared by every index and pipeline
+WORD_PATTERN = re.compile(r"\w+")
+# Same as gensim's PAT_ALPHABETIC: runs of word characters that are not digits
+ALPHA_PATTERN = re.compile(r"[^\W\d]+")
+NON_ALPHANUMERIC_PATTERN = re.compile(r"[^a-zA-Z0-9\s]")
+WHITESPACE_PATTERN = re.compile(r"\s+")
+
+MIN_TOKEN_LENGTH = 2
+MAX_TOKEN_LENGTH = 15
+
+Analysis = namedtuple("Analysis", ["word_tokens", "index_tokens"])
+
+
+def sanitize_text(text):
+    """
+    Cleans and standardizes text by keeping only alphanumeric characters and spaces.
+    Args:
+        text (str): Text to sanitize.
+    Returns:
+        str: Sanitized text.
+    """
+    if isinstance(text, str):
+        text = NON_ALPHANUMERIC_PATTERN.sub("", text)
+        text = WHITESPACE_PATTERN.sub(" ", text).strip()
+    return text
+
+def word_tokens(text):
+    """
+    Lowercased \\w+ tokens, the tokenization of the boolean baseline.
+    """
+    return WORD_PATTERN.findall(text.lower())
+
+def index_tokens_from_words(words):
+    """
+    Derives the TF-IDF/BM25 tokens from the word tokens. The result equals
+    gensim.utils.simple_preprocess on the same text: alphabetic runs of 2 to 15
+    characters that do not start with an underscore.
+    """
+    tokens = []
+    for word in words:
+        # Fast path: purely alphabetic words are their own token
+        for token in ((word,) if word.isalpha() else ALPHA_PATTERN.findall(word)):
+            if MIN_TOKEN_LENGTH <= len(token) <= MAX_TOKEN_LENGTH and token[0] != "_":
+                tokens.append(token)
+    return tokens
+
+def index_tokens(text):
+    """
+    Drop-in replacement for gensim.utils.simple_preprocess(text).
+    """
+    return index_tokens_from_words(word_tokens(text))
+
+def analyze(text):
+    """
+    One analysis pass over a document that yields the inputs of every sparse index.
+    Returns:
+        Analysis: (word_tokens for the boolean index, index_tokens for TF-IDF and BM25).
+    """
+    words = word_tokens(text)
+    return Analysis(words, index_tokens_from_words(words))
+
+@lru_cache(maxsize=4096)
+def analyze_query(query):
+    """
+    Cached query analysis, so the retrievers answering the same query do not each
+    tokenize it again. Tokens are returned as tuples because the result is shared.
+    """
+    analysis = analyze(query)
+    return Analysis(tuple(analysis.word_tokens), tuple(analysis.index_tokens))
+
+
+class Vocabulary:
+    """
+    Token to integer id mapping, assigning ids in order of first appearance.
+    """
+
+    def __init__(self, tokens=()):
+        self.token_ids = {}
+        self.tokens = []
+        for token in tokens:
+            self.add(token)
+
+    def __len__(self):
+        return len(self.tokens)
+
+    def __contains__(self, token):
+        return token in self.token_ids
+
+    def add(self, token):
+        token_id = self.token_ids.get(token)
+        if token_id is None:
+            token_id = self.token_ids[token] = len(self.tokens)
+            self.tokens.append(token)
+        return token_id
+
+    def get(self, token, default=None):
+        return self.token_ids.get(token, default)
+
+    def encode(self, tokens, add=True):
+        """
+        Token ids as an int32 array; unknown tokens are added, or dropped if add is False.
+        """
+        if add:
+            return np.array([self.add(token) for token in tokens], dtype=np.int32)
+        return np.array([self.token_ids[token] for token in tokens if token in self.token_ids], dtype=np.int32)
+
+    def decode(self, token_ids):
+        return [self.tokens[token_id] for token_id in token_ids]
+
+
+def analyze_corpus(texts, sanitize=False):
+    """
+    Analyzes every document once and returns the inputs of all sparse indexes together,
+    instead of each index build tokenizing the corpus on its own.
+    Args:
+        texts (iterable): Document texts.
+        sanitize (bool): Apply sanitize_text first, as process_json_data does.
+    Returns:
+        tuple: (word token lists for create_inverted_index, index token lists for
+        BM25Index.build / build_tf_idf_index, Vocabulary of the index tokens,
+        int32 index token id arrays).
+    """
+    words_per_doc, tokens_per_doc, token_ids = [], [], []
+    vocabulary = Vocabulary()
+    for text in texts:
+        analysis = analyze(sanitize_text(text) if sanitize else text)
+        words_per_doc.append(analysis.word_tokens)
+        tokens_per_doc.append(analysis.index_tokens)
+        token_ids.append(vocabulary.encode(analysis.index_tokens))
+    return words_per_doc, tokens_per_doc, vocabulary, token_ids
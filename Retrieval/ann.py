@@ -0,0 +1,156 @@
+import numpy as np
+
+from Retrieval.embedding_store import normalize_embeddings
+from Retrieval.utils import top_k_indices
+
+try:
+    import faiss
+except ImportError:
+    faiss = None
+
+
+def spherical_kmeans(vectors, num_clusters, num_iterations=20, seed=0):
+    """
+    k-means on the unit sphere: points are assigned by inner product and
+    centroids are re-normalized after each update.
+    Args:
+        vectors (np.ndarray): Normalized float32 matrix of shape (n, d).
+        num_clusters (int): Number of centroids.
+        num_iterations (int): Number of assignment/update rounds.
+        seed (int): Seed for the initial centroid sample.
+    Returns:
+        tuple: (centroids of shape (num_clusters, d), assignment of every vector).
+    """
+    rng = np.random.default_rng(seed)
+    num_clusters = min(num_clusters, len(vectors))
+    centroids = vectors[rng.choice(len(vectors), num_clusters, replace=False)].copy()
+    for _ in range(num_iterations):
+        assignment = np.argmax(vectors @ centroids.T, axis=1)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, assignment, vectors)
+        counts = np.bincount(assignment, minlength=num_clusters)
+        # Re-seed empty clusters with random points
+        empty = np.flatnonzero(counts == 0)
+        sums[empty] = vectors[rng.choice(len(vectors), len(empty), replace=False)]
+        centroids = normalize_embeddings(sums)
+    assignment = np.argmax(vectors @ centroids.T, axis=1)
+    return centroids, assignment
+
+
+class IVFIndex:
+    """
+    Inverted-file index over normalized embeddings (cosine similarity).
+
+    Embeddings are clustered into nlist cells; a query is only compared with the
+    vectors of its nprobe closest cells. Larger nprobe gives higher recall at
+    higher latency, nprobe == nlist is exact search.
+    """
+
+    def __init__(self, centroids, list_offsets, list_ids, list_vectors, nprobe=8):
+        self.centroids = centroids
+        self.list_offsets = list_offsets
+        self.list_ids = list_ids
+        self.list_vectors = list_vectors
+        self.nprobe = nprobe
+
+    @property
+    def nlist(self):
+        return len(self.centroids)
+
+    @classmethod
+    def build(cls, embeddings, nlist=None, nprobe=8, num_iterations=20, seed=0):
+        vectors = normalize_embeddings(embeddings)
+        if nlist is None:
+            nlist = max(1, int(4 * np.sqrt(len(vectors))))
+        centroids, assignment = spherical_kmeans(vectors, nlist, num_iterations, seed)
+        # Group the vectors by cell so each inverted list is one contiguous block
+        order = np.argsort(assignment, kind="stable")
+        list_offsets = np.zeros(len(centroids) + 1, dtype=np.int64)
+        list_offsets[1:] = np.cumsum(np.bincount(assignment, minlength=len(centroids)))
+        return cls(centroids, list_offsets, order.astype(np.int64), vectors[order], nprobe)
+
+    def search(self, query_embedding, k=100, nprobe=None):
+        """
+        Returns (document indices, cosine similarities) of the approximate top k.
+        """
+        nprobe = min(nprobe or self.nprobe, self.nlist)
+        query_embedding = normalize_embeddings(np.reshape(query_embedding, (1, -1)))[0]
+        cells = top_k_indices(self.centroids @ query_embedding, nprobe)
+        blocks = [np.arange(self.list_offsets[c], self.list_offsets[c + 1]) for c in cells]
+        positions = np.concatenate(blocks) if blocks else np.empty(0, dtype=np.int64)
+        scores = self.list_vectors[positions] @ query_embedding
+        best = top_k_indices(scores, k)
+        return self.list_ids[positions[best]], scores[best].tolist()
+
+    def save(self, index_path="Retrieval/savedModels/open_source_ivf.npz"):
+        np.savez(
+            index_path,
+            centroids=self.centroids,
+            list_offsets=self.list_offsets,
+            list_ids=self.list_ids,
+            list_vectors=self.list_vectors,
+            nprobe=np.array(self.nprobe),
+        )
+
+    @classmethod
+    def load(cls, index_path="Retrieval/savedModels/open_source_ivf.npz"):
+        with np.load(index_path) as index:
+            return cls(index["centroids"], index["list_offsets"], index["list_ids"], index["list_vectors"], int(index["nprobe"]))
+
+
+class FaissIVFIndex:
+    """
+    CPU faiss IndexIVFFlat with the same build/search/save/load interface as IVFIndex.
+    """
+
+    def __init__(self, index, nprobe=8):
+        self.index = index
+        self.nprobe = nprobe
+
+    @classmethod
+    def build(cls, embeddings, nlist=None, nprobe=8):
+        if faiss is None:
+            raise ImportError("faiss is not installed; use IVFIndex instead.")
+        vectors = normalize_embeddings(embeddings)
+        if nlist is None:
+            nlist = max(1, int(4 * np.sqrt(len(vectors))))
+        quantizer = faiss.IndexFlatIP(vectors.shape[1])
+        index = faiss.IndexIVFFlat(quantizer, vectors.shape[1], nlist, faiss.METRIC_INNER_PRODUCT)
+        index.train(vectors)
+        index.add(vectors)
+        return cls(index, nprobe)
+
+    def search(self, query_embedding, k=100, nprobe=None):
+        self.index.nprobe = nprobe or self.nprobe
+        query_embedding = normalize_embeddings(np.reshape(query_embedding, (1, -1)))
+        scores, indices = self.index.search(query_embedding, k)
+        found = indices[0] >= 0
+        return indices[0][found], scores[0][found].tolist()
+
+    def save(self, index_path="Retrieval/savedModels/open_source_ivf.faiss"):
+        faiss.write_index(self.index, index_path)
+
+    @classmethod
+    def load(cls, index_path="Retrieval/savedModels/open_source_ivf.faiss", nprobe=8):
+        if faiss is None:
+            raise ImportError("faiss is not installed; cannot load a .faiss index.")
+        return cls(faiss.read_index(index_path), nprobe)
+
+
+def build_ann_index(embeddings, backend="ivf", **kwargs):
+    """
+    Builds an ANN index over embeddings with the in-project IVF ("ivf") or faiss ("faiss") backend.
+    """
+    if backend == "faiss":
+        return FaissIVFIndex.build(embeddings, **kwargs)
+    if backend == "ivf":
+        return IVFIndex.build(embeddings, **kwargs)
+    raise ValueError(f"Unknown ANN backend '{backend}'.")
+
+def load_ann_index(index_path):
+    """
+    Loads an ANN index, choosing the backend from the file extension.
+    """
+    if index_path.endswith(".faiss"):
+        return FaissIVFIndex.load(index_path)
+    return IVFIndex.load(index_path)
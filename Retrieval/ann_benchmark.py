@@ -0,0 +1,78 @@
+import json
+import time
+import joblib
+import numpy as np
+
+from Retrieval.ann import build_ann_index
+from Retrieval.embedding_store import load_embedding_store
+
+
+def recall_at_k(retrieved, expected, k=100):
+    expected = set(str(doc_id) for doc_id in expected[:k])
+    if not expected:
+        return 1.0
+    return len(expected & set(str(doc_id) for doc_id in retrieved[:k])) / len(expected)
+
+def load_run_queries(rankings_path, queries_path="Datasets/FinalDataset_WithModifiedQuery.json"):
+    """
+    Loads a saved run and the query texts it was produced from.
+    Files with "modified" in their name were produced with the modified queries.
+    Returns:
+        tuple: (query ids, query texts, ranked document id lists).
+    """
+    with open(rankings_path, "r") as f:
+        rankings = json.load(f)
+    with open(queries_path, "r") as f:
+        queries = json.load(f)
+    field = "modified_query" if "modified" in rankings_path else "input"
+    query_ids, query_texts, expected = [], [], []
+    for ranking in rankings:
+        for query_id, doc_ids in ranking.items():
+            query_ids.append(query_id)
+            query_texts.append(queries[query_id][field])
+            expected.append(doc_ids)
+    return query_ids, query_texts, expected
+
+def benchmark_ann(index, query_embeddings, expected_rankings, ids, nprobe_values=(1, 2, 4, 8, 16, 32), k=100):
+    """
+    Measures recall@k against exact rankings and latency for several nprobe settings.
+    Args:
+        index: Index from Retrieval.ann.build_ann_index.
+        query_embeddings (np.ndarray): One embedding per query.
+        expected_rankings (list): Exact ranked document id lists, one per query.
+        ids (list): Document ids in index order (ids.pkl).
+    Returns:
+        list: One dictionary per nprobe with recall and milliseconds per query.
+    """
+    results = []
+    for nprobe in nprobe_values:
+        recalls = []
+        start = time.perf_counter()
+        retrieved = [index.search(query_embedding, k, nprobe=nprobe)[0] for query_embedding in query_embeddings]
+        elapsed = time.perf_counter() - start
+        for rankings, expected in zip(retrieved, expected_rankings):
+            recalls.append(recall_at_k([ids[r] for r in rankings], expected, k))
+        results.append({
+            "nprobe": nprobe,
+            f"recall@{k}": float(np.mean(recalls)),
+            "ms_per_query": 1000 * elapsed / max(len(query_embeddings), 1),
+        })
+    return results
+
+def main():
+    # The 1:0 runs were produced on the corpus stored in open_source_embeddings.npy
+    from Retrieval.openSource import model
+    run_files = ["Rankings/open-source/open_source_1_0_top_100 (1).json", "Rankings/open-source/open_source_1_0_top_100_modified.json"]
+    embeddings = load_embedding_store("Retrieval/savedModels/open_source_embeddings.npy")
+    ids = joblib.load("Retrieval/savedModels/ids.pkl")
+    index = build_ann_index(embeddings, backend="ivf")
+
+    for run_file in run_files:
+        query_ids, query_texts, expected = load_run_queries(run_file)
+        query_embeddings = model.encode(query_texts, batch_size=64, convert_to_numpy=True)
+        print(f"\n{run_file} ({len(query_ids)} queries, nlist={index.nlist})")
+        for result in benchmark_ann(index, query_embeddings, expected, ids):
+            print(result)
+
+if __name__ == "__main__":
+    main()
@@ -1,14 +1,28 @@
-import numpy as np
 import joblib
-from gensim.utils import simple_preprocess
-from rank_bm25 import BM25Okapi
-
-def bm25_pipeline(query, bm25_path="Retrieval/savedModels/bm25-1_0.pkl", ids_path="Retrieval/savedModels/ids.pkl", k=100):
-    bm25 = joblib.load(bm25_path)
-    ids = joblib.load(ids_path)
-    ranking = bm25.get_scores(simple_preprocess(query))
-    ranking = np.argsort(np.array(ranking))[::-1]
-    ranking = ranking[:k]
-    for j in range(len(ranking)):
-        ranking[j] = ids[ranking[j]]
-    return ranking
\ No newline at end of file
+
+from Retrieval.analyzer import analyze_query
+from Retrieval.bm25_index import BM25Index
+from Retrieval.registry import registry
+
+registry.register(
+    "bm25",
+    index=("Retrieval/savedModels/bm25-1_0.npz", BM25Index.load),
+    ids=("Retrieval/savedModels/ids.pkl", joblib.load),
+)
+
+def bm25_pipeline(query, index_path="Retrieval/savedModels/bm25-1_0.npz", ids_path="Retrieval/savedModels/ids.pkl", k=100):
+    artifacts = registry.get("bm25", index=index_path, ids=ids_path)
+    ids = artifacts["ids"]
+    ranking, scores = artifacts["index"].search(analyze_query(query).index_tokens, k)
+    return [ids[doc_num] for doc_num in ranking]
+
+def bm25_pipeline_batch(queries, index_path="Retrieval/savedModels/bm25-1_0.npz", ids_path="Retrieval/savedModels/ids.pkl", k=100):
+    """
+    bm25_pipeline for many queries at once.
+    Returns:
+        list: Ranked document ids per query.
+    """
+    artifacts = registry.get("bm25", index=index_path, ids=ids_path)
+    ids = artifacts["ids"]
+    results = artifacts["index"].search_batch([analyze_query(query).index_tokens for query in queries], k)
+    return [[ids[doc_num] for doc_num in ranking] for ranking, scores in results]
@@ -0,0 +1,346 @@
+import json
+import math
+import numpy as np
+from scipy import sparse
+from tqdm import tqdm
+
+from Retrieval.utils import top_k_indices
+
+
+def build_postings(documents_tokenized):
+    """
+    Builds array-backed postings lists from tokenized documents.
+    Args:
+        documents_tokenized (list): One token list per document.
+    Returns:
+        tuple: (terms, term_offsets, doc_nums, term_freqs, doc_lengths) where the postings
+        of term t are doc_nums[term_offsets[t]:term_offsets[t + 1]], sorted by document.
+    """
+    vocab = {}
+    postings_docs = []
+    postings_freqs = []
+    doc_lengths = np.zeros(len(documents_tokenized), dtype=np.int32)
+    for doc_num, tokens in enumerate(tqdm(documents_tokenized)):
+        doc_lengths[doc_num] = len(tokens)
+        frequencies = {}
+        for token in tokens:
+            frequencies[token] = frequencies.get(token, 0) + 1
+        for token, freq in frequencies.items():
+            term_id = vocab.setdefault(token, len(vocab))
+            if term_id == len(postings_docs):
+                postings_docs.append([])
+                postings_freqs.append([])
+            postings_docs[term_id].append(doc_num)
+            postings_freqs[term_id].append(freq)
+    return _pack_postings(list(vocab), postings_docs, postings_freqs, doc_lengths)
+
+def _pack_postings(terms, postings_docs, postings_freqs, doc_lengths):
+    term_offsets = np.zeros(len(terms) + 1, dtype=np.int64)
+    term_offsets[1:] = np.cumsum([len(docs) for docs in postings_docs])
+    doc_nums = np.fromiter((d for docs in postings_docs for d in docs), dtype=np.int32, count=term_offsets[-1])
+    term_freqs = np.fromiter((f for freqs in postings_freqs for f in freqs), dtype=np.int32, count=term_offsets[-1])
+    return terms, term_offsets, doc_nums, term_freqs, np.asarray(doc_lengths, dtype=np.int32)
+
+def okapi_idf(document_frequencies, corpus_size, epsilon=0.25):
+    """
+    Computes idf the same way as rank_bm25.BM25Okapi, including the epsilon floor
+    that replaces negative idf values with epsilon * average idf.
+    """
+    # Same operations in the same order as BM25Okapi._calc_idf, so the values are bit-identical
+    idf = np.array([math.log(corpus_size - df + 0.5) - math.log(df + 0.5) for df in np.asarray(document_frequencies).tolist()], dtype=np.float64)
+    if len(idf):
+        idf[idf < 0] = epsilon * (sum(idf.tolist()) / len(idf))
+    return idf
+
+
+class BM25Index:
+    """
+    Inverted-index BM25 (Okapi) scorer with MaxScore-style dynamic pruning.
+
+    get_scores is identical to rank_bm25.BM25Okapi.get_scores. search adds the same
+    contributions in another order, so its scores can differ in the last bit. Query
+    terms are processed in decreasing order of their score upper bound; once the
+    remaining terms can no longer lift an unseen document into the top k, only the
+    current candidates are looked up in the remaining postings lists instead of
+    scanning them in full. The bounds assume no term lowers a score, so queries with
+    a negative idf term (the epsilon floor is negative when the average idf is) are
+    scored exhaustively instead.
+    """
+
+    def __init__(self, terms, term_offsets, doc_nums, term_freqs, doc_lengths, idf, k1=1.5, b=0.75):
+        self.terms = list(terms)
+        self.vocab = {term: term_id for term_id, term in enumerate(self.terms)}
+        self.term_offsets = term_offsets
+        self.doc_nums = doc_nums
+        self.term_freqs = term_freqs
+        self.doc_lengths = doc_lengths
+        self.idf = np.asarray(idf, dtype=np.float64)
+        self.k1 = k1
+        self.b = b
+        self.corpus_size = len(doc_lengths)
+        self.avgdl = float(np.mean(doc_lengths)) if len(doc_lengths) else 0.0
+        # Length normalisation per document: k1 * (1 - b + b * dl / avgdl)
+        self.doc_norms = k1 * (1 - b + b * doc_lengths / self.avgdl)
+        self.upper_bounds = self._get_upper_bounds()
+
+    @classmethod
+    def build(cls, documents_tokenized, k1=1.5, b=0.75, epsilon=0.25):
+        terms, term_offsets, doc_nums, term_freqs, doc_lengths = build_postings(documents_tokenized)
+        idf = okapi_idf(np.diff(term_offsets), len(doc_lengths), epsilon)
+        return cls(terms, term_offsets, doc_nums, term_freqs, doc_lengths, idf, k1, b)
+
+    @classmethod
+    def from_bm25okapi(cls, bm25):
+        """
+        Converts a fitted rank_bm25.BM25Okapi object, keeping its idf values and parameters.
+        """
+        vocab = {}
+        postings_docs = []
+        postings_freqs = []
+        for doc_num, frequencies in enumerate(bm25.doc_freqs):
+            for token, freq in frequencies.items():
+                term_id = vocab.setdefault(token, len(vocab))
+                if term_id == len(postings_docs):
+                    postings_docs.append([])
+                    postings_freqs.append([])
+                postings_docs[term_id].append(doc_num)
+                postings_freqs[term_id].append(freq)
+        terms, term_offsets, doc_nums, term_freqs, doc_lengths = _pack_postings(list(vocab), postings_docs, postings_freqs, bm25.doc_len)
+        idf = [bm25.idf.get(term) or 0 for term in terms]
+        return cls(terms, term_offsets, doc_nums, term_freqs, doc_lengths, idf, bm25.k1, bm25.b)
+
+    @classmethod
+    def from_compressed_index(cls, compressed_index, k1=1.5, b=0.75, epsilon=0.25):
+        """
+        Builds a BM25Index from an on-disk index written by Retrieval.compressed_index,
+        e.g. load_inverted_index() of the boolean baseline. Scores follow the
+        tokenizer that index was built with.
+        """
+        terms, term_offsets, doc_nums, term_freqs = compressed_index.decode_all()
+        doc_lengths = np.asarray(compressed_index.doc_lengths, dtype=np.int32)
+        idf = okapi_idf(np.diff(term_offsets), len(doc_lengths), epsilon)
+        return cls(terms, term_offsets, doc_nums, term_freqs, doc_lengths, idf, k1, b)
+
+    def save(self, index_path="Retrieval/savedModels/bm25-1_0.npz"):
+        np.savez(
+            index_path,
+            terms=np.array(self.terms),
+            term_offsets=self.term_offsets,
+            doc_nums=self.doc_nums,
+            term_freqs=self.term_freqs,
+            doc_lengths=self.doc_lengths,
+            idf=self.idf,
+            params=np.array([self.k1, self.b]),
+        )
+
+    @classmethod
+    def load(cls, index_path="Retrieval/savedModels/bm25-1_0.npz"):
+        with np.load(index_path) as index:
+            k1, b = index["params"]
+            return cls(index["terms"].tolist(), index["term_offsets"], index["doc_nums"], index["term_freqs"], index["doc_lengths"], index["idf"], float(k1), float(b))
+
+    def _get_upper_bounds(self):
+        # Highest single-document contribution of each term
+        impacts = self._impacts(self.doc_nums, self.term_freqs)
+        upper_bounds = np.zeros(len(self.terms), dtype=np.float64)
+        non_empty = np.diff(self.term_offsets) > 0
+        upper_bounds[non_empty] = np.maximum.reduceat(impacts, self.term_offsets[:-1][non_empty]) if len(impacts) else 0
+        return upper_bounds * self.idf
+
+    def _impacts(self, doc_nums, term_freqs):
+        tf = term_freqs.astype(np.float64)
+        return tf * (self.k1 + 1) / (tf + self.doc_norms[doc_nums])
+
+    def _query_terms(self, query_tokens):
+        counts = {}
+        for token in query_tokens:
+            term_id = self.vocab.get(token)
+            if term_id is not None:
+                counts[term_id] = counts.get(term_id, 0) + 1
+        return counts
+
+    def postings(self, term_id):
+        start, end = self.term_offsets[term_id], self.term_offsets[term_id + 1]
+        return self.doc_nums[start:end], self.term_freqs[start:end]
+
+    def get_scores(self, query_tokens):
+        """
+        Exhaustive scoring of every document, identical to BM25Okapi.get_scores: repeated
+        query tokens are added one at a time, in query order.
+        """
+        scores = np.zeros(self.corpus_size)
+        for token in query_tokens:
+            term_id = self.vocab.get(token)
+            if term_id is not None:
+                docs, freqs = self.postings(term_id)
+                scores[docs] += self.idf[term_id] * self._impacts(docs, freqs)
+        return scores
+
+    def search(self, query_tokens, k=100, stats=None):
+        """
+        Returns the top k documents for a tokenized query.
+        Args:
+            query_tokens (list): Query tokens, e.g. from simple_preprocess.
+            k (int): Number of documents to return.
+            stats (dict): Optional dictionary that receives the number of postings scored.
+        Returns:
+            tuple: (document numbers, scores), best first.
+        """
+        query_terms = self._query_terms(query_tokens)
+        weights = {term_id: count * self.idf[term_id] for term_id, count in query_terms.items()}
+        if any(weight < 0 for weight in weights.values()):
+            # Documents without any query term outscore those with a negative contribution
+            scores = self.get_scores(query_tokens)
+            if stats is not None:
+                stats["postings_total"] = stats["postings_scored"] = int(sum(self.term_offsets[t + 1] - self.term_offsets[t] for t in weights))
+            best = _argsort_descending(scores)[:k]
+            return best, scores[best]
+        # Terms with the largest possible contribution go first
+        order = sorted(weights, key=lambda t: query_terms[t] * self.upper_bounds[t], reverse=True)
+        remaining = [query_terms[t] * self.upper_bounds[t] for t in order]
+
+        scores = np.zeros(self.corpus_size)
+        touched = np.zeros(self.corpus_size, dtype=bool)
+        candidates = None
+        threshold = -np.inf
+        postings_scored = 0
+
+        for i, term_id in enumerate(order):
+            remaining_bound = sum(remaining[i + 1:])
+            docs, freqs = self.postings(term_id)
+            if candidates is None:
+                # Full pass: any document can still enter the top k
+                scores[docs] += weights[term_id] * self._impacts(docs, freqs)
+                touched[docs] = True
+                postings_scored += len(docs)
+                seen = np.flatnonzero(touched)
+                if len(seen) >= k:
+                    threshold = np.partition(scores[seen], len(seen) - k)[len(seen) - k]
+                    if remaining_bound < threshold:
+                        # Unseen documents can no longer reach the top k
+                        candidates = seen[scores[seen] + remaining_bound >= threshold]
+            else:
+                # Candidate pass: only look up the surviving candidates in this list
+                positions = np.minimum(np.searchsorted(docs, candidates), len(docs) - 1)
+                matched = docs[positions] == candidates
+                hits = candidates[matched]
+                scores[hits] += weights[term_id] * self._impacts(hits, freqs[positions[matched]])
+                postings_scored += len(hits)
+                if len(candidates) >= k:
+                    threshold = max(threshold, np.partition(scores[candidates], len(candidates) - k)[len(candidates) - k])
+                candidates = candidates[scores[candidates] + remaining_bound >= threshold]
+
+        if stats is not None:
+            stats["postings_scored"] = postings_scored
+            stats["postings_total"] = int(sum(self.term_offsets[t + 1] - self.term_offsets[t] for t in order))
+
+        pool = np.flatnonzero(touched) if candidates is None else candidates
+        best = pool[top_k_indices(scores[pool], k)]
+        if len(best) < k:
+            # Like argsort()[::-1] over all scores, fill with zero-score documents, highest number first
+            rest = np.setdiff1d(np.arange(self.corpus_size), best)[::-1][:k - len(best)]
+            best = np.concatenate([best, rest])
+        return best, scores[best]
+
+
+    def impact_matrix(self):
+        """
+        Sparse (documents, terms) matrix of the BM25 term impacts without idf, built on first use.
+        """
+        if getattr(self, "_impact_matrix", None) is None:
+            term_ids = np.repeat(np.arange(len(self.terms)), np.diff(self.term_offsets))
+            self._impact_matrix = sparse.csr_matrix(
+                (self._impacts(self.doc_nums, self.term_freqs), (self.doc_nums, term_ids)),
+                shape=(self.corpus_size, len(self.terms)),
+            )
+        return self._impact_matrix
+
+    def search_batch(self, queries_tokens, k=100):
+        """
+        Scores many tokenized queries exhaustively with one sparse matrix product and
+        returns the top k of each, like search (up to floating point rounding of near ties).
+        Returns:
+            list: (document numbers, scores) per query.
+        """
+        rows, columns, weights = [], [], []
+        negative = set()
+        for i, query_tokens in enumerate(queries_tokens):
+            for term_id, count in self._query_terms(query_tokens).items():
+                rows.append(i)
+                columns.append(term_id)
+                weights.append(count * self.idf[term_id])
+                if weights[-1] < 0:
+                    negative.add(i)
+        query_matrix = sparse.csr_matrix((weights, (rows, columns)), shape=(len(queries_tokens), len(self.terms)))
+        all_scores = (self.impact_matrix() @ query_matrix.T).T.tocsr()
+
+        results = []
+        for i in range(len(queries_tokens)):
+            start, end = all_scores.indptr[i], all_scores.indptr[i + 1]
+            pool, pool_scores = all_scores.indices[start:end], all_scores.data[start:end]
+            if i in negative:
+                # As in search: with a negative idf term every document has to be ranked
+                scores = np.zeros(self.corpus_size)
+                scores[pool] = pool_scores
+                best = _argsort_descending(scores)[:k]
+                results.append((best, scores[best]))
+                continue
+            order = np.argsort(pool, kind="stable")
+            pool, pool_scores = pool[order], pool_scores[order]
+            best = pool[top_k_indices(pool_scores, k)]
+            if len(best) < k:
+                # Same filling as search: zero-score documents, highest number first
+                rest = np.setdiff1d(np.arange(self.corpus_size), best)[::-1][:k - len(best)]
+                best = np.concatenate([best, rest])
+            scores = np.zeros(self.corpus_size)
+            scores[pool] = pool_scores
+            results.append((best, scores[best]))
+        return results
+
+
+def _argsort_descending(scores):
+    # Like argsort()[::-1]: ties, e.g. the zero-score documents, highest number first
+    return np.argsort(scores, kind="stable")[::-1]
+
+def convert_bm25_pickle(bm25_path="Retrieval/savedModels/bm25-1_0.pkl", index_path="Retrieval/savedModels/bm25-1_0.npz"):
+    """
+    Converts a pickled rank_bm25.BM25Okapi model into a saved BM25Index.
+    """
+    import joblib
+    index = BM25Index.from_bm25okapi(joblib.load(bm25_path))
+    index.save(index_path)
+    return index
+
+def check_against_rankings(index, ids, rankings_path, tokenizer, queries_path="Datasets/FinalDataset_WithModifiedQuery.json", k=100):
+    """
+    Regression check of the index against a saved BM25 run such as Rankings/bm25/bm25_1_0_top_100.json.
+    Files with "modified" in their name are checked with the modified queries.
+    Args:
+        index (BM25Index): Index built on the same corpus as the run.
+        ids (list): Document ids in index order (ids.pkl).
+        rankings_path (str): Path to the saved run.
+        tokenizer (callable): Query tokenizer, e.g. gensim simple_preprocess.
+    Returns:
+        dict: Number of queries checked, mean overlap@k and the ids of queries whose ranking changed.
+    """
+    with open(rankings_path, "r") as f:
+        rankings = json.load(f)
+    with open(queries_path, "r") as f:
+        queries = json.load(f)
+    field = "modified_query" if "modified" in rankings_path else "input"
+
+    overlaps = []
+    changed = []
+    for ranking in rankings:
+        for query_id, expected in ranking.items():
+            doc_nums, _ = index.search(tokenizer(queries[query_id][field]), k)
+            retrieved = [str(ids[doc_num]) for doc_num in doc_nums]
+            expected = [str(doc_id) for doc_id in expected[:k]]
+            overlaps.append(len(set(retrieved) & set(expected)) / max(len(expected), 1))
+            if retrieved != expected:
+                changed.append(query_id)
+    return {
+        "queries": len(overlaps),
+        "mean_overlap": float(np.mean(overlaps)) if overlaps else math.nan,
+        "changed": changed,
+    }
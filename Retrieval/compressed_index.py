@@ -0,0 +1,329 @@
+import json
+import os
+import numpy as np
+
+FORMAT_VERSION = 1
+
+
+def varint_encode(values):
+    """
+    Encodes non-negative integers as LEB128 varints (7 bits per byte, high bit set
+    on every byte except the last), vectorized over the whole array.
+    Args:
+        values (array-like): Integers in [0, 2**32).
+    Returns:
+        np.ndarray: uint8 byte stream.
+    """
+    values = np.asarray(values, dtype=np.uint64)
+    num_bytes = np.ones(len(values), dtype=np.int64)
+    for shift in (7, 14, 21, 28):
+        num_bytes += values >= (1 << shift)
+    starts = np.cumsum(num_bytes) - num_bytes
+    encoded = np.empty(int(num_bytes.sum()), dtype=np.uint8)
+    for j in range(5):
+        mask = num_bytes > j
+        if not mask.any():
+            break
+        chunk = (values[mask] >> np.uint64(7 * j)) & np.uint64(0x7F)
+        chunk |= np.where(num_bytes[mask] > j + 1, np.uint64(0x80), np.uint64(0))
+        encoded[starts[mask] + j] = chunk
+    return encoded
+
+def varint_decode(data):
+    """
+    Decodes a byte stream written by varint_encode.
+    Returns:
+        np.ndarray: int64 values.
+    """
+    data = np.asarray(data, dtype=np.uint8)
+    ends = np.flatnonzero(data < 0x80)
+    starts = np.empty(len(ends), dtype=np.int64)
+    starts[:1] = 0
+    starts[1:] = ends[:-1] + 1
+    lengths = ends - starts + 1
+    values = np.zeros(len(ends), dtype=np.int64)
+    for j in range(int(lengths.max()) if len(lengths) else 0):
+        mask = lengths > j
+        values[mask] |= (data[starts[mask] + j].astype(np.int64) & 0x7F) << (7 * j)
+    return values
+
+def concat_ranges(starts, lengths):
+    """
+    np.concatenate([np.arange(s, s + n) for s, n in zip(starts, lengths)]) without the Python loop.
+    """
+    starts = np.asarray(starts, dtype=np.int64)
+    lengths = np.asarray(lengths, dtype=np.int64)
+    ends = np.cumsum(lengths)
+    return np.arange(ends[-1] if len(ends) else 0) + np.repeat(starts - (ends - lengths), lengths)
+
+def _delta_encode(values, group_offsets):
+    """
+    Gaps between consecutive values inside each group; the first value of a group is kept as is.
+    """
+    values = np.asarray(values, dtype=np.int64)
+    gaps = np.diff(values, prepend=0)
+    firsts = group_offsets[:-1][np.diff(group_offsets) > 0]
+    gaps[firsts] = values[firsts]
+    return gaps
+
+def _delta_decode(gaps, group_offsets):
+    """
+    Inverse of _delta_encode: a running sum restarted at every group.
+    """
+    sums = np.cumsum(gaps)
+    group_sizes = np.diff(group_offsets)
+    non_empty = group_sizes > 0
+    # Subtract the running sum reached before each group started
+    bases = np.repeat((sums[group_offsets[:-1][non_empty]] - gaps[group_offsets[:-1][non_empty]]), group_sizes[non_empty])
+    return sums - bases
+
+
+class StringTable:
+    """
+    Read-only sequence of strings stored as one UTF-8 blob plus an offsets array.
+    Strings are decoded on access, so opening a table costs nothing. index() finds a
+    string by binary search, either directly if the table was written sorted or
+    through order, a permutation that lists the positions in sorted order.
+    """
+
+    def __init__(self, blob, offsets, order=None):
+        self.blob = blob
+        self.offsets = offsets
+        self.order = order
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def _bytes(self, i):
+        return bytes(self.blob[self.offsets[i]:self.offsets[i + 1]])
+
+    def __getitem__(self, i):
+        if i < 0:
+            i += len(self)
+        if not 0 <= i < len(self):
+            raise IndexError("string table index out of range")
+        return self._bytes(i).decode("utf-8")
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self[i]
+
+    def index(self, value):
+        """
+        Position of value in the table, or -1 if it is not there.
+        """
+        key = value.encode("utf-8")
+        position = (lambda i: i) if self.order is None else (lambda i: int(self.order[i]))
+        lo, hi = 0, len(self)
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self._bytes(position(mid)) < key:
+                lo = mid + 1
+            else:
+                hi = mid
+        return position(lo) if lo < len(self) and self._bytes(position(lo)) == key else -1
+
+def sorted_order(strings):
+    """
+    Permutation listing the strings in UTF-8 byte order, as used by StringTable.index.
+    """
+    return np.array(sorted(range(len(strings)), key=lambda i: strings[i].encode("utf-8")), dtype=np.int64)
+
+def write_string_table(index_path, name, strings):
+    encoded = [s.encode("utf-8") for s in strings]
+    offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    offsets[1:] = np.cumsum([len(e) for e in encoded])
+    # Written next to the targets and renamed, so readers that have the old files mapped keep them intact
+    replace_file(os.path.join(index_path, f"{name}.bin"), lambda f: f.write(b"".join(encoded)))
+    replace_file(os.path.join(index_path, f"{name}_offsets.npy"), lambda f: np.save(f, offsets))
+
+def replace_file(path, write):
+    """
+    Writes a file through write(f) under a temporary name and renames it over path.
+    """
+    temp_path = f"{path}.tmp"
+    with open(temp_path, "wb") as f:
+        write(f)
+    os.replace(temp_path, path)
+
+def open_bytes(path):
+    # np.memmap cannot map an empty file
+    if os.path.getsize(path) == 0:
+        return np.zeros(0, dtype=np.uint8)
+    return np.memmap(path, dtype=np.uint8, mode="r")
+
+def open_string_table(index_path, name):
+    return StringTable(open_bytes(os.path.join(index_path, f"{name}.bin")), np.load(os.path.join(index_path, f"{name}_offsets.npy"), mmap_mode="r"))
+
+
+def write_compressed_index(index_path, terms, term_offsets, doc_nums, term_freqs, doc_lengths, doc_ids, position_offsets=None, positions=None):
+    """
+    Writes postings to an on-disk index directory:
+
+        terms.bin, terms_offsets.npy         sorted term dictionary
+        df.npy                               document frequency of every term
+        postings.bin, postings_offsets.npy   per term: varint doc-number gaps, then varint term frequencies
+        positions.bin, positions_offsets.npy optional per term: varint position gaps inside each document
+        doc_ids.bin, doc_ids_offsets.npy     external document ids by document number
+        doc_lengths.npy, meta.json
+
+    Every file is written under a temporary name and renamed into place. meta.json is
+    removed first and written last, so it marks a complete index: a directory whose
+    write was interrupted has no meta.json and cannot be opened half-written.
+
+    Args:
+        terms (list): Terms; postings of terms[t] are doc_nums[term_offsets[t]:term_offsets[t + 1]].
+        doc_nums (np.ndarray): Document numbers, sorted within each term.
+        term_freqs (np.ndarray): Term frequency of every posting.
+        doc_lengths (np.ndarray): Number of tokens in every document.
+        doc_ids (list): External document id of every document number.
+        position_offsets (np.ndarray): Optional, positions of posting p are positions[position_offsets[p]:position_offsets[p + 1]].
+        positions (np.ndarray): Optional token positions, sorted within each posting.
+    """
+    os.makedirs(index_path, exist_ok=True)
+    meta_path = os.path.join(index_path, "meta.json")
+    if os.path.exists(meta_path):
+        os.remove(meta_path)
+    term_offsets = np.asarray(term_offsets, dtype=np.int64)
+    doc_nums = np.asarray(doc_nums, dtype=np.int64)
+    term_freqs = np.asarray(term_freqs, dtype=np.int64)
+
+    # Lay the terms out in sorted (UTF-8 byte) order so readers can binary search them
+    order = sorted_order(terms)
+    df = np.diff(term_offsets)[order]
+    posting_order = concat_ranges(term_offsets[order], df)
+    new_offsets = np.zeros(len(order) + 1, dtype=np.int64)
+    new_offsets[1:] = np.cumsum(df)
+    doc_nums, term_freqs = doc_nums[posting_order], term_freqs[posting_order]
+
+    # One stream per term: doc gaps followed by frequencies, so a lookup reads one byte range
+    gaps = _delta_encode(doc_nums, new_offsets)
+    posting_term = np.repeat(np.arange(len(order)), df)
+    interleaved = np.empty(2 * len(doc_nums), dtype=np.int64)
+    rank = np.arange(len(doc_nums)) - new_offsets[posting_term]
+    interleaved[2 * new_offsets[posting_term] + rank] = gaps
+    interleaved[2 * new_offsets[posting_term] + df[posting_term] + rank] = term_freqs
+    _write_grouped(index_path, "postings", interleaved, 2 * new_offsets)
+
+    if positions is not None:
+        position_offsets = np.asarray(position_offsets, dtype=np.int64)
+        counts = np.diff(position_offsets)[posting_order]
+        position_order = concat_ranges(position_offsets[posting_order], counts)
+        new_position_offsets = np.zeros(len(counts) + 1, dtype=np.int64)
+        new_position_offsets[1:] = np.cumsum(counts)
+        position_gaps = _delta_encode(np.asarray(positions, dtype=np.int64)[position_order], new_position_offsets)
+        _write_grouped(index_path, "positions", position_gaps, new_position_offsets[new_offsets])
+
+    write_string_table(index_path, "terms", [terms[t] for t in order])
+    write_string_table(index_path, "doc_ids", [str(doc_id) for doc_id in doc_ids])
+    replace_file(os.path.join(index_path, "df.npy"), lambda f: np.save(f, df.astype(np.int32)))
+    replace_file(os.path.join(index_path, "doc_lengths.npy"), lambda f: np.save(f, np.asarray(doc_lengths, dtype=np.int32)))
+    meta = {
+        "format_version": FORMAT_VERSION,
+        "num_terms": len(order),
+        "num_docs": len(doc_ids),
+        "num_postings": int(new_offsets[-1]),
+        "has_positions": positions is not None,
+    }
+    replace_file(meta_path, lambda f: f.write(json.dumps(meta, indent=2).encode("utf-8")))
+
+def _write_grouped(index_path, name, values, group_offsets):
+    # Byte offset of every group, so each term's stream can be decoded on its own
+    num_bytes = np.ones(len(values), dtype=np.int64)
+    for shift in (7, 14, 21, 28):
+        num_bytes += values >= (1 << shift)
+    byte_ends = np.concatenate([[0], np.cumsum(num_bytes)])
+    replace_file(os.path.join(index_path, f"{name}.bin"), lambda f: f.write(varint_encode(values).tobytes()))
+    replace_file(os.path.join(index_path, f"{name}_offsets.npy"), lambda f: np.save(f, byte_ends[group_offsets]))
+
+
+class CompressedInvertedIndex:
+    """
+    Memory-mapped reader for an index written by write_compressed_index.
+
+    Opening only maps the files; a term's postings are located by binary search in
+    the term dictionary and decoded on demand, so start-up is near-instant, the
+    pages are shared between processes and memory use grows with the postings read.
+    Offers the same get_postings/get_positions interface as Baseline's InvertedIndex.
+    """
+
+    def __init__(self, index_path):
+        with open(os.path.join(index_path, "meta.json"), "r") as f:
+            self.meta = json.load(f)
+        if self.meta["format_version"] != FORMAT_VERSION:
+            raise ValueError(f"Unsupported index format version {self.meta['format_version']} in {index_path}.")
+        self.index_path = index_path
+        self.terms = open_string_table(index_path, "terms")
+        self.doc_ids = open_string_table(index_path, "doc_ids")
+        self.df = np.load(os.path.join(index_path, "df.npy"), mmap_mode="r")
+        self.doc_lengths = np.load(os.path.join(index_path, "doc_lengths.npy"), mmap_mode="r")
+        self.postings_data = open_bytes(os.path.join(index_path, "postings.bin"))
+        self.postings_offsets = np.load(os.path.join(index_path, "postings_offsets.npy"), mmap_mode="r")
+        if self.meta["has_positions"]:
+            self.positions_data = open_bytes(os.path.join(index_path, "positions.bin"))
+            self.positions_offsets = np.load(os.path.join(index_path, "positions_offsets.npy"), mmap_mode="r")
+
+    @property
+    def num_docs(self):
+        return self.meta["num_docs"]
+
+    @property
+    def has_positions(self):
+        return self.meta["has_positions"]
+
+    def __contains__(self, term):
+        return self.terms.index(term) >= 0
+
+    def term_id(self, term):
+        return self.terms.index(term)
+
+    def document_frequency(self, term):
+        term_id = self.terms.index(term)
+        return 0 if term_id < 0 else int(self.df[term_id])
+
+    def postings_by_id(self, term_id):
+        values = varint_decode(self.postings_data[self.postings_offsets[term_id]:self.postings_offsets[term_id + 1]])
+        df = int(self.df[term_id])
+        return np.cumsum(values[:df]).astype(np.int32), values[df:].astype(np.int32)
+
+    def get_postings(self, term):
+        """
+        Returns:
+            tuple: (sorted int32 document numbers, int32 term frequencies), or None for unknown terms.
+        """
+        term_id = self.terms.index(term)
+        return None if term_id < 0 else self.postings_by_id(term_id)
+
+    def get_positions(self, term):
+        """
+        Returns:
+            tuple: (offsets, positions) where the positions of the term in its i-th posting
+            are positions[offsets[i]:offsets[i + 1]], or None for unknown terms.
+        """
+        if not self.has_positions:
+            return None
+        term_id = self.terms.index(term)
+        if term_id < 0:
+            return None
+        _, freqs = self.postings_by_id(term_id)
+        offsets = np.zeros(len(freqs) + 1, dtype=np.int64)
+        offsets[1:] = np.cumsum(freqs)
+        gaps = varint_decode(self.positions_data[self.positions_offsets[term_id]:self.positions_offsets[term_id + 1]])
+        return offsets, _delta_decode(gaps, offsets).astype(np.int32)
+
+    def decode_all(self):
+        """
+        Decodes every postings list at once, e.g. to build a BM25Index or TF-IDF matrix.
+        Returns:
+            tuple: (terms, term_offsets, doc_nums, term_freqs) in the layout of Retrieval.bm25_index.build_postings.
+        """
+        df = np.asarray(self.df, dtype=np.int64)
+        term_offsets = np.zeros(len(df) + 1, dtype=np.int64)
+        term_offsets[1:] = np.cumsum(df)
+        values = varint_decode(self.postings_data)
+        posting_term = np.repeat(np.arange(len(df)), df)
+        rank = np.arange(term_offsets[-1]) - term_offsets[posting_term]
+        gaps = values[2 * term_offsets[posting_term] + rank]
+        term_freqs = values[2 * term_offsets[posting_term] + df[posting_term] + rank]
+        doc_nums = _delta_decode(gaps, term_offsets)
+        return list(self.terms), term_offsets, doc_nums.astype(np.int32), term_freqs.astype(np.int32)
@@ -0,0 +1,113 @@
+import hashlib
+import json
+import os
+import numpy as np
+from tqdm import tqdm
+from sentence_transformers import SentenceTransformer
+
+from Retrieval.embedding_store import save_embedding_store
+
+
+def _fingerprint(documents):
+    # Cheap identity check so a resumed run is not mixed with shards of another corpus
+    lengths = np.array([len(document) for document in documents], dtype=np.int64)
+    return hashlib.sha1(lengths.tobytes()).hexdigest()
+
+def _write_json(path, data):
+    temp_path = f"{path}.tmp"
+    with open(temp_path, "w") as f:
+        json.dump(data, f, indent=2)
+    os.replace(temp_path, path)
+
+def load_manifest(output_dir):
+    manifest_path = os.path.join(output_dir, "manifest.json")
+    if not os.path.exists(manifest_path):
+        return None
+    with open(manifest_path, "r") as f:
+        return json.load(f)
+
+def embed_corpus(documents, output_dir="Retrieval/savedModels/open_source_shards", model_name="all-MiniLM-L6-v2", batch_size=64, shard_size=2048, num_workers=1):
+    """
+    Offline embedding job for the dense retriever.
+
+    Documents are sorted by length so every batch holds texts of similar length, then
+    encoded shard by shard. Each finished shard is written to its own .npz file and
+    recorded in manifest.json, so an interrupted run picks up at the first missing shard.
+    Args:
+        documents (list): Document texts in ids.pkl order.
+        output_dir (str): Directory for the shards and the manifest.
+        model_name (str): SentenceTransformer model name.
+        batch_size (int): Number of documents per forward pass.
+        shard_size (int): Number of documents per shard.
+        num_workers (int): Number of CPU processes to encode with.
+    Returns:
+        dict: The completed manifest.
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    manifest = {
+        "model_name": model_name,
+        "num_documents": len(documents),
+        "shard_size": shard_size,
+        "fingerprint": _fingerprint(documents),
+        "completed": [],
+    }
+    previous = load_manifest(output_dir)
+    if previous is not None:
+        for key in ("model_name", "num_documents", "shard_size", "fingerprint"):
+            if previous[key] != manifest[key]:
+                raise ValueError(f"Existing shards in {output_dir} were built with a different {key}.")
+        manifest = previous
+
+    order = np.argsort([len(document) for document in documents], kind="stable")
+    num_shards = (len(documents) + shard_size - 1) // shard_size
+    pending = [shard for shard in range(num_shards) if shard not in manifest["completed"]]
+    if not pending:
+        return manifest
+    print(f"{num_shards - len(pending)} of {num_shards} shards already done")
+
+    model = SentenceTransformer(model_name, device="cpu")
+    pool = model.start_multi_process_pool(["cpu"] * num_workers) if num_workers > 1 else None
+    try:
+        for shard in tqdm(pending):
+            indices = order[shard * shard_size:(shard + 1) * shard_size]
+            texts = [documents[i] for i in indices]
+            if pool is not None:
+                embeddings = model.encode_multi_process(texts, pool, batch_size=batch_size)
+            else:
+                embeddings = model.encode(texts, batch_size=batch_size, convert_to_numpy=True)
+            shard_path = os.path.join(output_dir, f"shard_{shard:05d}.npz")
+            # Write to a temporary name first so a crash never leaves a half-written shard
+            with open(f"{shard_path}.tmp", "wb") as f:
+                np.savez(f, indices=indices, embeddings=np.asarray(embeddings, dtype=np.float32))
+            os.replace(f"{shard_path}.tmp", shard_path)
+            manifest["completed"].append(shard)
+            _write_json(os.path.join(output_dir, "manifest.json"), manifest)
+    finally:
+        if pool is not None:
+            model.stop_multi_process_pool(pool)
+    return manifest
+
+def assemble_embedding_store(output_dir="Retrieval/savedModels/open_source_shards", store_path="Retrieval/savedModels/open_source_embeddings.npy"):
+    """
+    Puts the shards back into document order and writes the .npy embedding store.
+    """
+    manifest = load_manifest(output_dir)
+    if manifest is None:
+        raise FileNotFoundError(f"No manifest found in {output_dir}.")
+    num_shards = (manifest["num_documents"] + manifest["shard_size"] - 1) // manifest["shard_size"]
+    missing = sorted(set(range(num_shards)) - set(manifest["completed"]))
+    if missing:
+        raise ValueError(f"Shards {missing} have not been embedded yet.")
+
+    embeddings = None
+    for shard in range(num_shards):
+        with np.load(os.path.join(output_dir, f"shard_{shard:05d}.npz")) as data:
+            if embeddings is None:
+                embeddings = np.zeros((manifest["num_documents"], data["embeddings"].shape[1]), dtype=np.float32)
+            embeddings[data["indices"]] = data["embeddings"]
+    save_embedding_store(embeddings, store_path)
+    return store_path
+
+# Example usage
+# manifest = embed_corpus(documents, num_workers=4)
+# assemble_embedding_store()
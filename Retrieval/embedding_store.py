@@ -0,0 +1,63 @@
+import numpy as np
+
+from Retrieval.utils import top_k_indices
+
+
+def normalize_embeddings(embeddings):
+    """
+    L2-normalizes embeddings row by row so cosine similarity becomes a dot product.
+    Rows with zero norm are left as zeros.
+    Args:
+        embeddings (array-like): Matrix of shape (n, d) or a list of n vectors.
+    Returns:
+        np.ndarray: float32 matrix of shape (n, d).
+    """
+    embeddings = np.asarray(embeddings, dtype=np.float32)
+    embeddings = embeddings.reshape(embeddings.shape[0], -1)
+    norms = np.linalg.norm(embeddings, axis=1, keepdims=True)
+    return np.divide(embeddings, norms, out=np.zeros_like(embeddings), where=norms != 0)
+
+def save_embedding_store(embeddings, store_path):
+    """
+    Saves embeddings as a single pre-normalized float32 .npy matrix.
+    """
+    np.save(store_path, normalize_embeddings(embeddings))
+
+def load_embedding_store(store_path):
+    """
+    Opens an embedding store read-only with np.load(mmap_mode='r').
+    Worker processes mapping the same file share its pages through the OS page cache.
+    """
+    return np.load(store_path, mmap_mode="r")
+
+def embedding_rankings(query_embedding, document_embeddings, k):
+    """
+    Ranks documents by cosine similarity to the query with one matrix-vector product.
+    Args:
+        query_embedding (array-like): Query vector, normalized or not.
+        document_embeddings (np.ndarray): Pre-normalized store from load_embedding_store.
+        k (int): Number of documents to return.
+    Returns:
+        tuple: (document indices, cosine similarities), best first.
+    """
+    query_embedding = normalize_embeddings(np.reshape(query_embedding, (1, -1)))[0]
+    scores = document_embeddings @ query_embedding
+    rankings = top_k_indices(scores, k)
+    return rankings, scores[rankings].tolist()
+
+def embedding_rankings_batch(query_embeddings, document_embeddings, k):
+    """
+    Ranks documents for many queries with one matrix-matrix product. Scores match
+    embedding_rankings up to float32 rounding, which can swap near ties.
+    Args:
+        query_embeddings (array-like): Matrix of shape (queries, d).
+    Returns:
+        list: (document indices, cosine similarities) per query, best first.
+    """
+    query_embeddings = normalize_embeddings(query_embeddings)
+    all_scores = query_embeddings @ np.asarray(document_embeddings).T
+    results = []
+    for scores in all_scores:
+        rankings = top_k_indices(scores, k)
+        results.append((rankings, scores[rankings].tolist()))
+    return results
@@ -1,8 +1,12 @@
-from tqdm import tqdm
 import joblib
 import numpy as np
 from sentence_transformers import SentenceTransformer, util
 
+from Retrieval.ann import load_ann_index
+from Retrieval.embedding_store import embedding_rankings, embedding_rankings_batch, load_embedding_store, save_embedding_store
+from Retrieval.quantization import QuantizedEmbeddingStore
+from Retrieval.registry import registry
+
 # Load the model
 model = SentenceTransformer('all-MiniLM-L6-v2')
 
@@ -21,28 +25,72 @@ def cosine_similarity(v1, v2):
         sim = 0
     return sim
 
-def get_open_source_embeddings(documents):
-    documents_embeddings = []
-    for document in tqdm(documents):
-        documents_embeddings.append(model.encode(document))
-    return documents_embeddings
+def get_open_source_embeddings(documents, batch_size=64):
+    # Encoding in batches lets the model pad and run many documents per forward pass.
+    # For large corpora use Retrieval/embedding_job.py, which shards and resumes.
+    return model.encode(documents, batch_size=batch_size, show_progress_bar=True, convert_to_numpy=True)
     
 def open_source_rankings(query, document_embeddings, k):
     query_embedding = model.encode(query)
-    scores = []
-    for idx, embedding in enumerate(document_embeddings):
-        scores.append((idx, cosine_similarity(query_embedding, embedding)))
-    scores = sorted(scores, key=lambda x: x[1], reverse=True)
-    scores = scores[:k]
-    rankings = get_documents_from_scores(scores)
-    return rankings, scores
-
-
-def open_source_pipeline(query, documents_embeddings_path="Retrieval/savedModels/open_source_embeddings.pkl", ids_path="Retrieval/savedModels/ids.pkl", k=100):
-    document_embeddings = joblib.load(documents_embeddings_path)
-    ids = joblib.load(ids_path)
-    rankings, scores = open_source_rankings(query, document_embeddings, k)
+    return embedding_rankings(query_embedding, document_embeddings, k)
+
+def convert_embeddings_pickle(documents_embeddings_path="Retrieval/savedModels/open_source_embeddings.pkl", store_path="Retrieval/savedModels/open_source_embeddings.npy"):
+    """
+    Converts the joblib pickle of per-document embeddings into the .npy embedding store.
+    The store is generated, not committed: run this once after checkout and again
+    whenever open_source_embeddings.pkl changes.
+    """
+    save_embedding_store(joblib.load(documents_embeddings_path), store_path)
+
+
+# open_source_embeddings.npy is created by convert_embeddings_pickle() (or Retrieval/embedding_job.py)
+registry.register(
+    "open_source",
+    document_embeddings=("Retrieval/savedModels/open_source_embeddings.npy", load_embedding_store),
+    ids=("Retrieval/savedModels/ids.pkl", joblib.load),
+)
+
+def open_source_pipeline(query, documents_embeddings_path="Retrieval/savedModels/open_source_embeddings.npy", ids_path="Retrieval/savedModels/ids.pkl", k=100, ann_index_path=None, nprobe=None, quantized_store_path=None, rescore=0):
+    """
+    Dense retrieval with all-MiniLM-L6-v2. By default every document is scored exactly;
+    pass ann_index_path (built with Retrieval.ann) to search an IVF/faiss index instead,
+    with nprobe trading recall for latency, or quantized_store_path (built with
+    Retrieval.quantization) to score float16/int8/PQ codes, re-scoring the best
+    `rescore` candidates against the exact store.
+    """
+    artifacts = registry.get("open_source", document_embeddings=documents_embeddings_path, ids=ids_path)
+    ids = artifacts["ids"]
+    if ann_index_path is not None:
+        ann_index = registry.load(ann_index_path, load_ann_index)
+        rankings, scores = ann_index.search(model.encode(query), k, nprobe=nprobe)
+    elif quantized_store_path is not None:
+        store = registry.load(quantized_store_path, QuantizedEmbeddingStore.load)
+        rankings, scores = store.search(model.encode(query), k, rescore, artifacts["document_embeddings"])
+    else:
+        rankings, scores = open_source_rankings(query, artifacts["document_embeddings"], k)
     rankings2 = []
-    for ranking in tqdm(rankings):
+    for ranking in rankings:
         rankings2.append(ids[ranking])
-    return rankings2
\ No newline at end of file
+    return rankings2
+
+def open_source_pipeline_batch(queries, documents_embeddings_path="Retrieval/savedModels/open_source_embeddings.npy", ids_path="Retrieval/savedModels/ids.pkl", k=100, batch_size=64, ann_index_path=None, nprobe=None, quantized_store_path=None, rescore=0):
+    """
+    open_source_pipeline for many queries: all queries go through model.encode in
+    batches and are scored against the exact store with one matrix product. An ANN
+    index or quantized store, if given, is searched query by query with the same
+    options as open_source_pipeline.
+    Returns:
+        list: Ranked document ids per query.
+    """
+    artifacts = registry.get("open_source", document_embeddings=documents_embeddings_path, ids=ids_path)
+    ids = artifacts["ids"]
+    query_embeddings = model.encode(list(queries), batch_size=batch_size, convert_to_numpy=True)
+    if ann_index_path is not None:
+        ann_index = registry.load(ann_index_path, load_ann_index)
+        results = [ann_index.search(query_embedding, k, nprobe=nprobe) for query_embedding in query_embeddings]
+    elif quantized_store_path is not None:
+        store = registry.load(quantized_store_path, QuantizedEmbeddingStore.load)
+        results = [store.search(query_embedding, k, rescore, artifacts["document_embeddings"]) for query_embedding in query_embeddings]
+    else:
+        results = embedding_rankings_batch(query_embeddings, artifacts["document_embeddings"], k)
+    return [[ids[ranking] for ranking in rankings] for rankings, scores in results]
@@ -0,0 +1,164 @@
+import numpy as np
+
+from Retrieval.embedding_store import normalize_embeddings
+from Retrieval.utils import top_k_indices
+
+# Rows scored per block so quantized codes are never expanded to float32 all at once
+BLOCK_SIZE = 65536
+
+
+def kmeans(vectors, num_clusters, num_iterations=20, seed=0):
+    """
+    Plain (Euclidean) k-means, used to train the product quantization codebooks.
+    """
+    rng = np.random.default_rng(seed)
+    num_clusters = min(num_clusters, len(vectors))
+    centroids = vectors[rng.choice(len(vectors), num_clusters, replace=False)].copy()
+    for _ in range(num_iterations):
+        distances = (vectors ** 2).sum(axis=1, keepdims=True) - 2 * vectors @ centroids.T + (centroids ** 2).sum(axis=1)
+        assignment = np.argmin(distances, axis=1)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, assignment, vectors)
+        counts = np.bincount(assignment, minlength=num_clusters)
+        filled = counts > 0
+        centroids[filled] = sums[filled] / counts[filled, None]
+    return centroids
+
+
+class QuantizedEmbeddingStore:
+    """
+    Compact storage for normalized document embeddings.
+
+    Modes:
+        float16: half precision copy (2 bytes per dimension).
+        int8: symmetric per-dimension scalar quantization (1 byte per dimension).
+        pq: product quantization with 256 centroids per subspace (1 byte per subspace).
+
+    Queries stay in float32 and are scored against the codes directly (asymmetric
+    distance computation); search() can re-score the best candidates exactly.
+    """
+
+    def __init__(self, mode, codes, params):
+        self.mode = mode
+        self.codes = codes
+        self.params = params
+
+    @classmethod
+    def build(cls, embeddings, mode="int8", num_subspaces=48, num_iterations=20, seed=0):
+        """
+        Args:
+            embeddings (array-like): Document embeddings of shape (n, d).
+            mode (str): "float16", "int8" or "pq".
+            num_subspaces (int): Number of PQ subspaces; must divide d.
+        """
+        vectors = normalize_embeddings(embeddings)
+        if mode == "float16":
+            return cls(mode, vectors.astype(np.float16), {})
+        if mode == "int8":
+            scale = np.abs(vectors).max(axis=0) / 127
+            scale[scale == 0] = 1
+            codes = np.clip(np.round(vectors / scale), -127, 127).astype(np.int8)
+            return cls(mode, codes, {"scale": scale.astype(np.float32)})
+        if mode == "pq":
+            if vectors.shape[1] % num_subspaces != 0:
+                raise ValueError(f"num_subspaces={num_subspaces} does not divide dimension {vectors.shape[1]}.")
+            subvectors = vectors.reshape(len(vectors), num_subspaces, -1)
+            codebooks = np.stack([
+                kmeans(subvectors[:, j], 256, num_iterations, seed + j) for j in range(num_subspaces)
+            ])
+            codes = np.empty((len(vectors), num_subspaces), dtype=np.uint8)
+            for j in range(num_subspaces):
+                # ||x||^2 is the same for every centroid, so it is left out of the argmin
+                distances = (codebooks[j] ** 2).sum(axis=1) - 2 * subvectors[:, j] @ codebooks[j].T
+                codes[:, j] = np.argmin(distances, axis=1)
+            return cls(mode, codes, {"codebooks": codebooks.astype(np.float32)})
+        raise ValueError(f"Unknown quantization mode '{mode}'.")
+
+    def __len__(self):
+        return len(self.codes)
+
+    def memory_bytes(self):
+        return self.codes.nbytes + sum(value.nbytes for value in self.params.values())
+
+    def scores(self, query_embedding):
+        """
+        Approximate cosine similarity of the query with every document.
+        """
+        query_embedding = normalize_embeddings(np.reshape(query_embedding, (1, -1)))[0]
+        scores = np.empty(len(self.codes), dtype=np.float32)
+        if self.mode == "pq":
+            # Lookup table of the query's inner product with every centroid of every subspace
+            codebooks = self.params["codebooks"]
+            lookup = np.einsum("mkd,md->mk", codebooks, query_embedding.reshape(len(codebooks), -1))
+            subspaces = np.arange(len(codebooks))
+        elif self.mode == "int8":
+            query_embedding = query_embedding * self.params["scale"]
+        for start in range(0, len(self.codes), BLOCK_SIZE):
+            block = self.codes[start:start + BLOCK_SIZE]
+            if self.mode == "pq":
+                scores[start:start + len(block)] = lookup[subspaces, block].sum(axis=1)
+            else:
+                scores[start:start + len(block)] = block.astype(np.float32) @ query_embedding
+        return scores
+
+    def search(self, query_embedding, k=100, rescore=0, exact_embeddings=None):
+        """
+        Returns the top k documents for a query.
+        Args:
+            query_embedding (array-like): Query vector.
+            k (int): Number of documents to return.
+            rescore (int): Number of approximate candidates to re-score exactly (0 disables).
+            exact_embeddings (np.ndarray): Normalized float32 store used for re-scoring.
+        Returns:
+            tuple: (document indices, scores), best first.
+        """
+        scores = self.scores(query_embedding)
+        if rescore and exact_embeddings is not None:
+            # Sorted candidates read the (possibly memory-mapped) exact store in file order
+            candidates = np.sort(top_k_indices(scores, max(k, rescore)))
+            query_embedding = normalize_embeddings(np.reshape(query_embedding, (1, -1)))[0]
+            exact = np.asarray(exact_embeddings[candidates]) @ query_embedding
+            best = top_k_indices(exact, k)
+            return candidates[best], exact[best].tolist()
+        best = top_k_indices(scores, k)
+        return best, scores[best].tolist()
+
+    def save(self, store_path):
+        np.savez(store_path, mode=np.array(self.mode), codes=self.codes, **self.params)
+
+    @classmethod
+    def load(cls, store_path):
+        with np.load(store_path) as store:
+            params = {key: store[key] for key in store.files if key not in ("mode", "codes")}
+            return cls(str(store["mode"]), store["codes"], params)
+
+
+def evaluate_quantization(embeddings, query_embeddings, settings=({"mode": "float16"}, {"mode": "int8"}, {"mode": "pq"}), k=100, rescore=0):
+    """
+    Reports the memory saved and the recall@k lost by each quantization setting
+    relative to exact float32 search.
+    Args:
+        embeddings (array-like): Document embeddings of shape (n, d).
+        query_embeddings (array-like): Query embeddings used to measure recall.
+        settings (tuple): Keyword arguments for QuantizedEmbeddingStore.build, one per setting.
+        k (int): Cut-off for recall.
+        rescore (int): Candidates re-scored exactly, as in QuantizedEmbeddingStore.search.
+    Returns:
+        list: One dictionary per setting.
+    """
+    exact_embeddings = normalize_embeddings(embeddings)
+    exact_rankings = [set(top_k_indices(exact_embeddings @ q, k).tolist()) for q in normalize_embeddings(query_embeddings)]
+    results = []
+    for setting in settings:
+        store = QuantizedEmbeddingStore.build(embeddings, **setting)
+        recalls = []
+        for query_embedding, expected in zip(query_embeddings, exact_rankings):
+            rankings, _ = store.search(query_embedding, k, rescore, exact_embeddings)
+            recalls.append(len(expected & set(rankings.tolist())) / max(len(expected), 1))
+        results.append({
+            **setting,
+            "bytes": store.memory_bytes(),
+            "memory_saved": 1 - store.memory_bytes() / exact_embeddings.nbytes,
+            f"recall@{k}": float(np.mean(recalls)),
+        })
+    return results
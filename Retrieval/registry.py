@@ -0,0 +1,220 @@
+import importlib
+import os
+import threading
+import joblib
+
+
+# Modules that register each retriever when they are imported
+RETRIEVER_MODULES = {
+    "tf_idf": "Retrieval.tf_idf",
+    "bm25": "Retrieval.bm25",
+    "open_source": "Retrieval.openSource",
+    "vision": "Retrieval.vision",
+    "boolean": "Baseline.boolean",
+}
+
+
+class RetrieverRegistry:
+    """
+    Keeps retrieval artifacts (pickles, indexes, embeddings) resident in memory.
+
+    Each artifact file is loaded once and shared by every retriever that uses it,
+    so ids.pkl is only unpickled a single time. Before an artifact is handed out its
+    modification time and size are compared with the loaded copy; when the file has
+    changed on disk it is reloaded and swapped in as a whole, so callers only ever
+    see the complete old or the complete new artifact. The artifacts of a retriever
+    are checked and swapped together (see get), so ids.pkl and the index it belongs
+    to always come from the same state of the files.
+    """
+
+    def __init__(self):
+        self._specs = {}
+        self._artifacts = {}
+        # (retriever, artifact paths) -> (file stamps, artifacts) of the last consistent load
+        self._groups = {}
+        self._current_groups = {}
+        self._load_locks = {}
+        self._builders = {}
+        self._lock = threading.Lock()
+
+    def register(self, name, **artifacts):
+        """
+        Registers a retriever and the artifacts it needs.
+        Args:
+            name (str): Retriever name, e.g. "tf_idf".
+            artifacts: Keyword arguments of the form key=(path, loader).
+        """
+        self._specs[name] = artifacts
+
+    def register_builder(self, name, build):
+        """
+        Registers a function that creates a retriever's artifacts when they are missing
+        or out of date (e.g. the lazily compiled Boolean index) and then loads them
+        through get. warm_up calls it instead of get.
+        """
+        self._builders[name] = build
+
+    def load(self, path, loader=joblib.load):
+        """
+        Returns the loaded artifact at path, reloading it if the file changed.
+        Args:
+            path (str): Path of the artifact file.
+            loader (callable): Function that loads the file, joblib.load by default.
+        Returns:
+            object: The loaded artifact.
+        """
+        key = (os.path.abspath(path), loader)
+        stamp = self._get_stamp(path)
+        cached = self._artifacts.get(key)
+        if cached is not None and cached[0] == stamp:
+            return cached[1]
+
+        with self._lock:
+            load_lock = self._load_locks.setdefault(key, threading.Lock())
+        with load_lock:
+            # Another thread may have finished the reload while we waited
+            stamp = self._get_stamp(path)
+            cached = self._artifacts.get(key)
+            if cached is not None and cached[0] == stamp:
+                return cached[1]
+            try:
+                value = loader(path)
+            except Exception as e:
+                if cached is None:
+                    raise
+                print(f"Warning: reloading {path} failed ({e}), keeping the loaded copy")
+                return cached[1]
+            self._artifacts[key] = (stamp, value)
+            return value
+
+    def get(self, name, **paths):
+        """
+        Returns the artifacts of a registered retriever as a dictionary.
+        All files are stat-ed first; if any of them changed, every changed file is
+        loaded and the new set is only handed out when no file changed meanwhile.
+        A set that cannot be loaded consistently (a rebuild is still writing files,
+        or a loader fails) leaves the previous set in use.
+        Args:
+            name (str): Retriever name.
+            paths: Optional key=path overrides for the registered artifact paths.
+        Returns:
+            dict: Artifact key to loaded artifact.
+        """
+        if name not in self._specs:
+            raise KeyError(f"Retriever '{name}' is not registered.")
+        spec = {key: (paths.get(key) or path, loader) for key, (path, loader) in self._specs[name].items()}
+        group_key = (name, tuple(sorted((key, os.path.abspath(path)) for key, (path, _) in spec.items())))
+        self._current_groups[name] = group_key
+        cached = self._groups.get(group_key)
+        if cached is not None and self._is_current(spec, cached[0]):
+            return dict(cached[1])
+
+        with self._lock:
+            load_lock = self._load_locks.setdefault(group_key, threading.Lock())
+        with load_lock:
+            for attempt in range(3):
+                # Another thread may have finished the reload while we waited
+                cached = self._groups.get(group_key)
+                if cached is not None and self._is_current(spec, cached[0]):
+                    return dict(cached[1])
+                try:
+                    stamps = self._get_stamps(spec)
+                    artifacts = {key: self._load_at(path, loader, stamps[key]) for key, (path, loader) in spec.items()}
+                    if self._get_stamps(spec) != stamps:
+                        raise RuntimeError("artifact files changed while they were loaded")
+                except Exception as e:
+                    if cached is not None:
+                        print(f"Warning: reloading {name} failed ({e}), keeping the loaded copy")
+                        return dict(cached[1])
+                    if attempt == 2:
+                        raise
+                    continue
+                self._groups[group_key] = (stamps, artifacts)
+                return dict(artifacts)
+
+    def _load_at(self, path, loader, stamp):
+        # Shares artifacts with load(): ids.pkl loaded for one retriever is reused by the others
+        key = (os.path.abspath(path), loader)
+        cached = self._artifacts.get(key)
+        if cached is not None and cached[0] == stamp:
+            return cached[1]
+        value = loader(path)
+        self._artifacts[key] = (stamp, value)
+        return value
+
+    def warm_up(self, names=None):
+        """
+        Loads the artifacts of the given retrievers (all registered ones by default).
+        Returns:
+            list: Names of the retrievers that were warmed up.
+        """
+        names = list(self._specs) if names is None else list(names)
+        for name in names:
+            if name not in self._specs and name in RETRIEVER_MODULES:
+                importlib.import_module(RETRIEVER_MODULES[name])
+            if name in self._builders:
+                self._builders[name]()
+            else:
+                self.get(name)
+            print(f"{name} warmed up...")
+        return names
+
+    def is_warm(self, names=None):
+        """
+        Checks whether the artifacts of the given retrievers are loaded and current,
+        for the paths the retriever was last used with (including get overrides).
+        """
+        names = list(self._specs) if names is None else list(names)
+        for name in names:
+            if name not in self._specs:
+                return False
+            group_key = self._current_groups.get(name)
+            cached = self._groups.get(group_key)
+            if cached is None or not self._is_current({key: (path, None) for key, path in group_key[1]}, cached[0]):
+                return False
+        return True
+
+    def artifact_stamps(self, names=None, paths=()):
+        """
+        Modification time and size of the artifact files of the given retrievers (all
+        registered ones by default) and of any extra paths; missing files are left out.
+        The stamps change whenever an index is rebuilt, e.g. to version cached results.
+        Returns:
+            list: Sorted (absolute path, (mtime_ns, size)) pairs.
+        """
+        names = list(self._specs) if names is None else list(names)
+        files = {os.path.abspath(path) for name in names for path, _ in self._specs.get(name, {}).values()}
+        files.update(os.path.abspath(path) for path in paths)
+        stamps = []
+        for path in sorted(files):
+            try:
+                stamps.append((path, self._get_stamp(path)))
+            except OSError:
+                continue
+        return stamps
+
+    def clear(self):
+        """
+        Drops every loaded artifact; they are loaded again on next use.
+        """
+        with self._lock:
+            self._artifacts = {}
+            self._groups = {}
+
+    @staticmethod
+    def _get_stamp(path):
+        stat = os.stat(path)
+        return (stat.st_mtime_ns, stat.st_size)
+
+    def _get_stamps(self, spec):
+        return {key: self._get_stamp(path) for key, (path, _) in spec.items()}
+
+    def _is_current(self, spec, stamps):
+        try:
+            return self._get_stamps(spec) == stamps
+        except OSError:
+            return False
+
+
+# Shared registry used by the *_pipeline functions
+registry = RetrieverRegistry()
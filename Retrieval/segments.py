@@ -0,0 +1,361 @@
+import threading
+import numpy as np
+
+from Retrieval.analyzer import index_tokens
+from Retrieval.bm25_index import build_postings, okapi_idf
+from Retrieval.compressed_index import concat_ranges
+from Retrieval.embedding_store import normalize_embeddings
+from Retrieval.utils import top_k_indices
+
+
+def _same_segments(current, snapshot):
+    return len(current) >= len(snapshot) and all(a is b for a, b in zip(current, snapshot))
+
+
+class BackgroundMerger:
+    """
+    Runs merge_segments periodically on a daemon thread.
+    """
+
+    def start_background_merge(self, interval=5.0, **merge_kwargs):
+        """
+        Starts a daemon thread that calls merge_segments(**merge_kwargs) every interval seconds.
+        """
+        if getattr(self, "merger", None) is not None:
+            return
+        self.stop_event = threading.Event()
+
+        def run():
+            while not self.stop_event.wait(interval):
+                try:
+                    self.merge_segments(**merge_kwargs)
+                except Exception as e:
+                    print(f"Warning: segment merge failed ({e})")
+
+        self.merger = threading.Thread(target=run, daemon=True)
+        self.merger.start()
+
+    def stop_background_merge(self):
+        if getattr(self, "merger", None) is not None:
+            self.stop_event.set()
+            self.merger.join()
+            self.merger = None
+
+
+class PostingsSegment:
+    """
+    Immutable block of consecutive documents with its own postings.
+    Terms are global term ids (sorted), document numbers are local to the segment;
+    global document number = base + local number.
+    """
+
+    def __init__(self, base, term_ids, term_offsets, doc_nums, term_freqs, doc_lengths):
+        self.base = base
+        self.term_ids = term_ids
+        self.term_offsets = term_offsets
+        self.doc_nums = doc_nums
+        self.term_freqs = term_freqs
+        self.doc_lengths = doc_lengths
+        # Values derived from the global statistics, keyed by the statistics they depend on
+        self.cache = {}
+
+    def __len__(self):
+        return len(self.doc_lengths)
+
+    def postings(self, term_id):
+        position = np.searchsorted(self.term_ids, term_id)
+        if position == len(self.term_ids) or self.term_ids[position] != term_id:
+            return None
+        start, end = self.term_offsets[position], self.term_offsets[position + 1]
+        return self.doc_nums[start:end], self.term_freqs[start:end]
+
+    def cached(self, key, stamp, compute):
+        value = self.cache.get(key)
+        if value is None or value[0] != stamp:
+            value = (stamp, compute())
+            self.cache[key] = value
+        return value[1]
+
+    @classmethod
+    def merge(cls, segments):
+        """
+        Concatenates consecutive segments into one, without re-tokenizing anything.
+        """
+        base = segments[0].base
+        term_ids = np.concatenate([np.repeat(s.term_ids, np.diff(s.term_offsets)) for s in segments])
+        doc_nums = np.concatenate([s.doc_nums + (s.base - base) for s in segments])
+        term_freqs = np.concatenate([s.term_freqs for s in segments])
+        # Stable sort keeps document order inside each term, since segments are consecutive
+        order = np.argsort(term_ids, kind="stable")
+        term_ids, doc_nums, term_freqs = term_ids[order], doc_nums[order], term_freqs[order]
+        unique_ids, starts = np.unique(term_ids, return_index=True)
+        term_offsets = np.append(starts, len(term_ids)).astype(np.int64)
+        doc_lengths = np.concatenate([s.doc_lengths for s in segments])
+        return cls(base, unique_ids, term_offsets, doc_nums.astype(np.int32), term_freqs.astype(np.int32), doc_lengths)
+
+
+class SegmentedIndex(BackgroundMerger):
+    """
+    Incrementally updatable sparse index searched with BM25 or TF-IDF.
+
+    The index is a list of segments: a large main segment and small delta segments,
+    one per add_documents call. Global statistics (document frequencies, number of
+    documents and total length) are updated incrementally when a segment is added;
+    idf, avgdl and the per-segment values derived from them are recomputed lazily,
+    with vectorized passes, the next time a query needs them. merge_segments (or the
+    background merger) compacts the delta segments, so documents can be added
+    continuously without rebuilding the index from scratch.
+
+    doc_ids only ever grows, so adding documents appends to it in place; a search
+    reads the first corpus_size ids it saw under the lock and copies only the short
+    list of segments.
+    """
+
+    def __init__(self, tokenizer=index_tokens, k1=1.5, b=0.75, epsilon=0.25):
+        self.tokenizer = tokenizer
+        self.k1 = k1
+        self.b = b
+        self.epsilon = epsilon
+        self.segments = []
+        self.doc_ids = []
+        self.vocab = {}
+        self.df = np.zeros(1024, dtype=np.int64)
+        self.corpus_size = 0
+        self.total_length = 0
+        self.version = 0
+        self.lock = threading.Lock()
+        self.stats_cache = {}
+
+    @classmethod
+    def from_postings(cls, doc_ids, terms, term_offsets, doc_nums, term_freqs, doc_lengths, **kwargs):
+        """
+        Starts an index whose main segment is built from existing postings, e.g. those of
+        a BM25Index (index.terms, index.term_offsets, ...) or CompressedInvertedIndex.decode_all().
+        """
+        index = cls(**kwargs)
+        index.add_postings(doc_ids, terms, term_offsets, doc_nums, term_freqs, doc_lengths)
+        return index
+
+    def add_documents(self, doc_ids, texts):
+        """
+        Tokenizes and indexes new documents as a delta segment.
+        """
+        self.add_tokenized_documents(doc_ids, [self.tokenizer(text) for text in texts])
+
+    def add_tokenized_documents(self, doc_ids, documents_tokenized):
+        """
+        Indexes documents already tokenized with this index's tokenizer as a delta segment.
+        """
+        terms, term_offsets, doc_nums, term_freqs, doc_lengths = build_postings(documents_tokenized)
+        self.add_postings(doc_ids, terms, term_offsets, doc_nums, term_freqs, doc_lengths)
+
+    def add_postings(self, doc_ids, terms, term_offsets, doc_nums, term_freqs, doc_lengths):
+        term_offsets = np.asarray(term_offsets, dtype=np.int64)
+        df = np.diff(term_offsets)
+        with self.lock:
+            term_ids = np.array([self.vocab.setdefault(term, len(self.vocab)) for term in terms], dtype=np.int64)
+            # Segments keep their terms in global id order so they can be binary searched and merged
+            order = np.argsort(term_ids)
+            posting_order = concat_ranges(term_offsets[:-1][order], df[order])
+            new_offsets = np.zeros(len(order) + 1, dtype=np.int64)
+            new_offsets[1:] = np.cumsum(df[order])
+            segment = PostingsSegment(
+                self.corpus_size,
+                term_ids[order],
+                new_offsets,
+                np.asarray(doc_nums, dtype=np.int32)[posting_order],
+                np.asarray(term_freqs, dtype=np.int32)[posting_order],
+                np.asarray(doc_lengths, dtype=np.int32),
+            )
+            if len(self.vocab) > len(self.df):
+                df_grown = np.zeros(max(len(self.vocab), 2 * len(self.df)), dtype=np.int64)
+                df_grown[:len(self.df)] = self.df
+                self.df = df_grown
+            np.add.at(self.df, term_ids, df)
+            self.corpus_size += len(segment)
+            self.total_length += int(segment.doc_lengths.sum())
+            self.doc_ids.extend(doc_ids)
+            self.segments.append(segment)
+            self.version += 1
+
+    def __len__(self):
+        return self.corpus_size
+
+    def statistic(self, key, compute):
+        value = self.stats_cache.get(key)
+        if value is None or value[0] != self.version:
+            value = (self.version, compute())
+            self.stats_cache[key] = value
+        return value[1]
+
+    def bm25_idf(self):
+        return self.statistic("bm25_idf", lambda: okapi_idf(self.df[:len(self.vocab)], self.corpus_size, self.epsilon))
+
+    def tf_idf_idf(self):
+        # Same idf as train_tf_idf: log(N / df)
+        return self.statistic("tf_idf_idf", lambda: np.log(self.corpus_size / np.maximum(self.df[:len(self.vocab)], 1)))
+
+    def query_term_counts(self, query):
+        counts = {}
+        for token in self.tokenizer(query):
+            term_id = self.vocab.get(token)
+            if term_id is not None:
+                counts[term_id] = counts.get(term_id, 0) + 1
+        return counts
+
+    def search_bm25(self, query, k=100):
+        """
+        BM25 (Okapi) over all segments with global idf and avgdl, equal to a BM25Index
+        built on the same documents.
+        Returns:
+            tuple: (document ids, scores), best first.
+        """
+        with self.lock:
+            segments, doc_ids, num_docs = list(self.segments), self.doc_ids, self.corpus_size
+            idf = self.bm25_idf()
+            avgdl = self.total_length / self.corpus_size if self.corpus_size else 0.0
+            # Looked up with the statistics, so every term id is covered by idf
+            counts = self.query_term_counts(query)
+        scores = np.zeros(num_docs)
+        for segment in segments:
+            # Only depend on avgdl, so they stay valid while additions leave it unchanged
+            doc_norms = segment.cached("bm25_norms", (self.k1, self.b, avgdl), lambda: self.k1 * (1 - self.b + self.b * segment.doc_lengths / avgdl))
+            for term_id, count in counts.items():
+                postings = segment.postings(term_id)
+                if postings is not None:
+                    docs, freqs = postings
+                    tf = freqs.astype(np.float64)
+                    scores[segment.base + docs] += count * idf[term_id] * tf * (self.k1 + 1) / (tf + doc_norms[docs])
+        rankings = top_k_indices(scores, k)
+        return [doc_ids[i] for i in rankings], scores[rankings].tolist()
+
+    def search_tf_idf(self, query, k=100):
+        """
+        TF-IDF cosine ranking over all segments with the weighting of tf_idf_rankings:
+        (count / length) * log(N / df) for documents and queries.
+        Returns:
+            tuple: (document ids, scores), best first.
+        """
+        with self.lock:
+            segments, doc_ids, num_docs, version = list(self.segments), self.doc_ids, self.corpus_size, self.version
+            idf = self.tf_idf_idf()
+            counts = self.query_term_counts(query)
+        num_tokens = len(self.tokenizer(query))
+        weights = {term_id: count / num_tokens * idf[term_id] for term_id, count in counts.items()}
+        query_norm = np.linalg.norm(list(weights.values())) if weights else 0
+        scores = np.zeros(num_docs, dtype=np.float32)
+        if query_norm == 0:
+            rankings = top_k_indices(scores, k)
+            return [doc_ids[i] for i in rankings], scores[rankings].tolist()
+        for segment in segments:
+            doc_norms = segment.cached("tf_idf_norms", version, lambda: self._tf_idf_norms(segment, idf))
+            dot_products = np.zeros(len(segment))
+            for term_id, weight in weights.items():
+                postings = segment.postings(term_id)
+                if postings is not None:
+                    docs, freqs = postings
+                    dot_products[docs] += weight * freqs / segment.doc_lengths[docs] * idf[term_id]
+            denominators = doc_norms * query_norm
+            np.divide(dot_products, denominators, out=scores[segment.base:segment.base + len(segment)], where=denominators != 0, casting="unsafe")
+        rankings = top_k_indices(scores, k)
+        return [doc_ids[i] for i in rankings], scores[rankings].tolist()
+
+    @staticmethod
+    def _tf_idf_norms(segment, idf):
+        # One vectorized pass over the segment's postings
+        posting_terms = np.repeat(segment.term_ids, np.diff(segment.term_offsets))
+        lengths = np.maximum(segment.doc_lengths[segment.doc_nums], 1)
+        values = segment.term_freqs / lengths * idf[posting_terms]
+        return np.sqrt(np.bincount(segment.doc_nums, weights=values ** 2, minlength=len(segment)))
+
+    def merge_segments(self, max_segments=4, main_ratio=0.1):
+        """
+        Compacts the delta segments once there are more than max_segments segments.
+        The merged deltas are folded into the main segment when they exceed main_ratio
+        of its size. Searches keep using the old segments until the merged one is swapped in.
+        Returns:
+            bool: Whether a merge happened.
+        """
+        with self.lock:
+            segments = list(self.segments)
+        if len(segments) <= max_segments:
+            return False
+        deltas = segments[1:]
+        if sum(len(s) for s in deltas) > main_ratio * len(segments[0]):
+            to_merge = segments
+        else:
+            to_merge = deltas
+        # The expensive part runs without the lock; segments added meanwhile are kept
+        merged = PostingsSegment.merge(to_merge)
+        with self.lock:
+            current = self.segments
+            if _same_segments(current, segments):
+                kept = segments[:len(segments) - len(to_merge)]
+                self.segments = kept + [merged] + current[len(segments):]
+                return True
+        return False
+
+
+class SegmentedEmbeddings(BackgroundMerger):
+    """
+    Dense counterpart of SegmentedIndex for the open-source and vision embeddings:
+    new documents are embedded into a small delta segment that is searched together
+    with the main store, and merge_segments concatenates the deltas.
+    """
+
+    def __init__(self, embed=None):
+        """
+        Args:
+            embed (callable): Maps a list of texts to an (n, d) array, e.g.
+                Retrieval.openSource.get_open_source_embeddings.
+        """
+        self.embed = embed
+        self.segments = []
+        self.doc_ids = []
+        self.lock = threading.Lock()
+
+    @classmethod
+    def from_store(cls, document_embeddings, doc_ids, embed=None):
+        """
+        Uses an existing (possibly memory-mapped) embedding store as the main segment.
+        """
+        index = cls(embed)
+        index.add_embeddings(doc_ids, document_embeddings, normalized=True)
+        return index
+
+    def add_documents(self, doc_ids, texts):
+        self.add_embeddings(doc_ids, self.embed(list(texts)))
+
+    def add_embeddings(self, doc_ids, embeddings, normalized=False):
+        embeddings = embeddings if normalized else normalize_embeddings(embeddings)
+        with self.lock:
+            self.segments.append(embeddings)
+            self.doc_ids.extend(doc_ids)
+
+    def __len__(self):
+        return len(self.doc_ids)
+
+    def search(self, query_embedding, k=100):
+        """
+        Returns:
+            tuple: (document ids, cosine similarities), best first.
+        """
+        with self.lock:
+            segments, doc_ids = list(self.segments), self.doc_ids
+        query_embedding = normalize_embeddings(np.reshape(query_embedding, (1, -1)))[0]
+        scores = np.concatenate([segment @ query_embedding for segment in segments]) if segments else np.zeros(0, dtype=np.float32)
+        rankings = top_k_indices(scores, k)
+        return [doc_ids[i] for i in rankings], scores[rankings].tolist()
+
+    def merge_segments(self, max_segments=4):
+        with self.lock:
+            segments = list(self.segments)
+        if len(segments) <= max_segments:
+            return False
+        # The main segment may be a read-only memory map, so only the deltas are concatenated
+        merged = np.concatenate(segments[1:])
+        with self.lock:
+            if _same_segments(self.segments, segments):
+                self.segments = segments[:1] + [merged] + self.segments[len(segments):]
+                return True
+        return False
@@ -0,0 +1,48 @@
+import fitz
+from fpdf import FPDF
+from PIL import Image
+
+from Retrieval.analyzer import sanitize_text
+
+
+def create_pdf_document(input_text):
+    """
+    Lays out text exactly like create_pdf in Retrieval/vision.py (A4, Arial 10,
+    5mm line height) but keeps the PDF in memory instead of writing it to temp/PDFs.
+    """
+    pdf = FPDF()
+    pdf.add_page()
+    pdf.set_font("Arial", size=10)
+    pdf.multi_cell(0, 5, txt=input_text)
+    return pdf
+
+def pdf_to_bytes(pdf):
+    data = pdf.output(dest="S")
+    # PyFPDF returns a latin-1 string, fpdf2 returns a bytearray
+    if isinstance(data, str):
+        data = data.encode("latin-1")
+    return bytes(data)
+
+def render_pdf_pages(pdf_data, zoom=2.0):
+    """
+    Rasterizes every page of an in-memory PDF.
+    Args:
+        pdf_data (bytes): PDF file contents.
+        zoom (float): Zoom level, 2.0 as in pdf_to_image.
+    Returns:
+        list: One RGB PIL image per page, pixel-identical to the PNGs pdf_to_image writes.
+    """
+    images = []
+    with fitz.open(stream=pdf_data, filetype="pdf") as pdf_document:
+        mat = fitz.Matrix(zoom, zoom)
+        for page in pdf_document:
+            pix = page.get_pixmap(matrix=mat)
+            images.append(Image.frombytes("RGB", (pix.width, pix.height), pix.samples))
+    return images
+
+def text_to_page_images(text, zoom=2.0):
+    """
+    Sanitizes and renders text to page images without touching the filesystem.
+    """
+    pdf = create_pdf_document(sanitize_text(text))
+    return render_pdf_pages(pdf_to_bytes(pdf), zoom)
@@ -1,9 +1,13 @@
 import numpy as np
 from collections import defaultdict
-from gensim.utils import simple_preprocess
+from scipy import sparse
 from tqdm import tqdm
 import joblib
 
+from Retrieval.analyzer import analyze_query
+from Retrieval.registry import registry
+from Retrieval.utils import top_k_indices
+
 
 def get_tf_query(query):
     k = len(query)
@@ -15,52 +19,186 @@ def get_tf_query(query):
     return tf_query
 
 def get_tf_idf_query(query, idf_dict):
-    query = simple_preprocess(query)
+    # Same tokens as gensim simple_preprocess, cached across retrievers
+    query = analyze_query(query).index_tokens
     tf_idf_query = defaultdict(lambda: 0)
     tf_query = get_tf_query(query)
     for token in tf_query.keys():
-        tf_idf_query[token] = tf_query[token] * idf_dict[token]
+        # .get avoids inserting unseen query tokens into the idf defaultdict
+        tf_idf_query[token] = tf_query[token] * idf_dict.get(token, 0)
     return tf_idf_query
-    
+
 def get_tf_idf_vector(tf_idf_instance, vocab):
     temp = []
     for key in vocab.keys():
         temp.append(tf_idf_instance[key])
     return temp
 
+def get_vocab_index(vocab):
+    """
+    Maps every vocabulary term to its column in the TF-IDF matrix.
+    Columns follow the insertion order of vocab, as in the original dense document_matrix.
+    """
+    return {term: column for column, term in enumerate(vocab.keys())}
+
+def get_query_weights(query, idf_dict, vocab_index):
+    """
+    Builds the query vector from the query's own terms only.
+    Args:
+        query (str): Query text.
+        idf_dict (dict): Term to idf mapping.
+        vocab_index (dict): Term to column mapping from get_vocab_index.
+    Returns:
+        tuple: (columns, weights) arrays for the non-zero query entries, by increasing column
+        so single and batched scoring add up the terms in the same order.
+    """
+    columns = []
+    weights = []
+    for token, weight in get_tf_idf_query(query, idf_dict).items():
+        column = vocab_index.get(token)
+        if column is not None and weight != 0:
+            columns.append(column)
+            weights.append(weight)
+    order = np.argsort(columns, kind="stable")
+    return np.array(columns, dtype=np.int64)[order], np.array(weights, dtype=np.float32)[order]
+
+def build_tf_idf_index(documents_tokenized, idf_dict, vocab):
+    """
+    Builds the sparse TF-IDF index straight from tokenized documents.
+    Uses the same weighting as train_tf_idf: (count / document length) * idf.
+    Args:
+        documents_tokenized (list): One token list per document, in ids.pkl order.
+        idf_dict (dict): Term to idf mapping.
+        vocab (dict): Vocabulary whose key order defines the matrix columns.
+    Returns:
+        tuple: (CSC float32 document matrix, float32 document norms).
+    """
+    vocab_index = get_vocab_index(vocab)
+    rows, columns, values = [], [], []
+    for i, tokens in enumerate(tqdm(documents_tokenized)):
+        counts = defaultdict(lambda: 0)
+        for token in tokens:
+            counts[token] += 1
+        for token, count in counts.items():
+            column = vocab_index.get(token)
+            weight = (count / len(tokens)) * idf_dict.get(token, 0)
+            if column is not None and weight != 0:
+                rows.append(i)
+                columns.append(column)
+                values.append(weight)
+    document_matrix = sparse.csc_matrix(
+        (np.array(values, dtype=np.float32), (rows, columns)),
+        shape=(len(documents_tokenized), len(vocab_index)),
+        dtype=np.float32,
+    )
+    return document_matrix, get_document_norms(document_matrix)
+
+def convert_document_matrix(document_matrix):
+    """
+    Converts the dense document_matrix pickle into the sparse TF-IDF index.
+    Returns:
+        tuple: (CSC float32 document matrix, float32 document norms).
+    """
+    document_matrix = sparse.csc_matrix(np.asarray(document_matrix, dtype=np.float32))
+    return document_matrix, get_document_norms(document_matrix)
+
+def get_document_norms(document_matrix):
+    # Accumulate in float64 so long documents do not lose precision
+    squared = document_matrix.multiply(document_matrix).sum(axis=1, dtype=np.float64)
+    return np.sqrt(np.asarray(squared).ravel()).astype(np.float32)
+
+def save_tf_idf_index(document_matrix, doc_norms, index_path="Retrieval/savedModels/tf_idf_index.npz"):
+    """
+    Saves the sparse matrix together with the precomputed document norms.
+    """
+    document_matrix = sparse.csc_matrix(document_matrix)
+    np.savez(
+        index_path,
+        data=document_matrix.data,
+        indices=document_matrix.indices,
+        indptr=document_matrix.indptr,
+        shape=np.array(document_matrix.shape),
+        doc_norms=doc_norms,
+    )
+
+def load_vocab_index(vocab_path="Retrieval/savedModels/vocab.pkl"):
+    return get_vocab_index(joblib.load(vocab_path))
 
-def tf_idf_rankings(query, idf_dict, tf_idf_dict, vocab, document_matrix, k):
-    query_vector = np.reshape(np.array(get_tf_idf_vector(get_tf_idf_query(query, idf_dict), vocab)), (1, -1))
-    scores = []
-    dot_products = document_matrix @ query_vector.T
-
-    query_norm = np.linalg.norm(query_vector)
-    doc_norms = np.linalg.norm(document_matrix, axis=1, keepdims=True)
-    cosine_similarities = dot_products / (doc_norms * query_norm)
-    cosine_similarities = cosine_similarities.flatten()
-    rankings = np.argsort(cosine_similarities)[::-1]
-    rankings = rankings[:k]
-    scores = []
-    for rank in rankings:
-        scores.append(cosine_similarities[rank])
-    # scores = sorted(cosine_similarities, key=lambda x: x[1], reverse=True)
-    # scores = scores[:k]
-    # rankings = get_documents_from_scores(scores)
-    return rankings, scores
-
-def tf_idf_pipeline(query, idf_dict_path="Retrieval/savedModels/idf.pkl", tf_idf_dict_path="Retrieval/savedModels/tf_idf_dict.pkl", vocab_path="Retrieval/savedModels/vocab.pkl", document_matrix_path="Retrieval/savedModels/document_matrix.pkl", ids_path="Retrieval/savedModels/ids.pkl", k=100):
-    idf_dict = joblib.load(idf_dict_path)
-    print("idf loaded...")
-    tf_idf_dict = joblib.load(tf_idf_dict_path)
-    print("tf-idf loaded...")
-    vocab = joblib.load(vocab_path)
-    print("vocab loaded...")
-    document_matrix = joblib.load(document_matrix_path)
-    print("document_matrix loaded...")
-    ids = joblib.load(ids_path)
-    print("ids loaded")
-    rankings, scores = tf_idf_rankings(query, idf_dict, tf_idf_dict, vocab, document_matrix, k)
+def load_tf_idf_index(index_path="Retrieval/savedModels/tf_idf_index.npz"):
+    with np.load(index_path) as index:
+        document_matrix = sparse.csc_matrix(
+            (index["data"], index["indices"], index["indptr"]),
+            shape=tuple(index["shape"]),
+        )
+        doc_norms = index["doc_norms"]
+    return document_matrix, doc_norms
+
+
+def tf_idf_rankings(query, idf_dict, vocab_index, document_matrix, doc_norms, k):
+    columns, weights = get_query_weights(query, idf_dict, vocab_index)
+    scores = np.zeros(document_matrix.shape[0], dtype=np.float32)
+    query_norm = np.linalg.norm(weights)
+    if query_norm != 0:
+        # Only the query's columns of the CSC matrix are touched
+        dot_products = document_matrix[:, columns] @ weights
+        denominators = doc_norms * query_norm
+        np.divide(dot_products, denominators, out=scores, where=denominators != 0)
+    rankings = top_k_indices(scores, k)
+    return rankings, scores[rankings].tolist()
+
+def tf_idf_rankings_batch(queries, idf_dict, vocab_index, document_matrix, doc_norms, k):
+    """
+    Scores many queries with one sparse matrix product over the union of their terms.
+    Gives the same rankings and scores as calling tf_idf_rankings on each query.
+    Returns:
+        list: (rankings, scores) per query.
+    """
+    query_weights = [get_query_weights(query, idf_dict, vocab_index) for query in queries]
+    columns = np.unique(np.concatenate([c for c, _ in query_weights] + [np.zeros(0, dtype=np.int64)]))
+    # Dense block of the query vectors restricted to the columns they use
+    query_block = np.zeros((len(columns), len(queries)), dtype=np.float32)
+    query_norms = np.zeros(len(queries), dtype=np.float32)
+    for i, (query_columns, weights) in enumerate(query_weights):
+        query_block[np.searchsorted(columns, query_columns), i] = weights
+        query_norms[i] = np.linalg.norm(weights)
+    dot_products = np.asarray(document_matrix[:, columns] @ query_block)
+
+    results = []
+    for i in range(len(queries)):
+        scores = np.zeros(document_matrix.shape[0], dtype=np.float32)
+        if query_norms[i] != 0:
+            denominators = doc_norms * query_norms[i]
+            np.divide(dot_products[:, i], denominators, out=scores, where=denominators != 0)
+        rankings = top_k_indices(scores, k)
+        results.append((rankings, scores[rankings].tolist()))
+    return results
+
+registry.register(
+    "tf_idf",
+    idf=("Retrieval/savedModels/idf.pkl", joblib.load),
+    vocab_index=("Retrieval/savedModels/vocab.pkl", load_vocab_index),
+    index=("Retrieval/savedModels/tf_idf_index.npz", load_tf_idf_index),
+    ids=("Retrieval/savedModels/ids.pkl", joblib.load),
+)
+
+def tf_idf_pipeline(query, idf_dict_path="Retrieval/savedModels/idf.pkl", vocab_path="Retrieval/savedModels/vocab.pkl", index_path="Retrieval/savedModels/tf_idf_index.npz", ids_path="Retrieval/savedModels/ids.pkl", k=100):
+    artifacts = registry.get("tf_idf", idf=idf_dict_path, vocab_index=vocab_path, index=index_path, ids=ids_path)
+    document_matrix, doc_norms = artifacts["index"]
+    rankings, scores = tf_idf_rankings(query, artifacts["idf"], artifacts["vocab_index"], document_matrix, doc_norms, k)
+    ids = artifacts["ids"]
     rankings2 = []
-    for ranking in tqdm(rankings):
+    for ranking in rankings:
         rankings2.append(ids[ranking])
-    return rankings2
\ No newline at end of file
+    return rankings2
+
+def tf_idf_pipeline_batch(queries, idf_dict_path="Retrieval/savedModels/idf.pkl", vocab_path="Retrieval/savedModels/vocab.pkl", index_path="Retrieval/savedModels/tf_idf_index.npz", ids_path="Retrieval/savedModels/ids.pkl", k=100):
+    """
+    tf_idf_pipeline for many queries at once.
+    Returns:
+        list: Ranked document ids per query.
+    """
+    artifacts = registry.get("tf_idf", idf=idf_dict_path, vocab_index=vocab_path, index=index_path, ids=ids_path)
+    document_matrix, doc_norms = artifacts["index"]
+    ids = artifacts["ids"]
+    results = tf_idf_rankings_batch(queries, artifacts["idf"], artifacts["vocab_index"], document_matrix, doc_norms, k)
+    return [[ids[ranking] for ranking in rankings] for rankings, scores in results]
@@ -0,0 +1,42 @@
+import os
+import numpy as np
+
+
+def top_k_indices(scores, k):
+    """
+    Returns the indices of the k highest scores, best first.
+    Uses np.argpartition so only the selected k entries are fully sorted.
+    Args:
+        scores (np.ndarray): 1-D array of scores, one per document.
+        k (int): Number of indices to return.
+    Returns:
+        np.ndarray: Indices of the top k scores in descending score order.
+    """
+    scores = np.asarray(scores)
+    k = min(k, scores.shape[0])
+    if k <= 0:
+        return np.empty(0, dtype=np.int64)
+    if k < scores.shape[0]:
+        candidates = np.argpartition(-scores, k - 1)[:k]
+        # argpartition picks arbitrary documents among those tied with the k-th score;
+        # keep the lowest indices, as a full stable sort would
+        kth_score = scores[candidates].min()
+        above = np.flatnonzero(scores > kth_score)
+        tied = np.flatnonzero(scores == kth_score)[:k - len(above)]
+        candidates = np.sort(np.concatenate([above, tied]))
+    else:
+        candidates = np.arange(scores.shape[0])
+    # Stable sort keeps the lower index first when scores tie
+    order = np.argsort(-scores[candidates], kind="stable")
+    return candidates[order]
+
+def iter_documents(path):
+    """
+    Yields the text of every file in a directory, one file at a time and in
+    sorted filename order, so the order is the same on every run.
+    """
+    for filename in sorted(os.listdir(path)):
+        file_path = os.path.join(path, filename)
+        if os.path.isfile(file_path):
+            with open(file_path, "r") as f:
+                yield f.read()
@@ -1,15 +1,22 @@
 import os
 from tqdm import tqdm
 import numpy as np
+import torch
 from transformers import ViTModel, ViTFeatureExtractor, ViTImageProcessor
 from PIL import Image
-import re
 from fpdf import FPDF
 from datetime import datetime
 import fitz
 import joblib
 import json
 
+from Retrieval.analyzer import sanitize_text
+from Retrieval.embedding_store import embedding_rankings, embedding_rankings_batch, load_embedding_store, save_embedding_store
+from Retrieval.quantization import QuantizedEmbeddingStore
+from Retrieval.registry import registry
+from Retrieval.text_render import text_to_page_images
+from Retrieval.utils import iter_documents
+
 model = ViTModel.from_pretrained('google/vit-base-patch16-224-in21k')
 processor = ViTImageProcessor.from_pretrained('google/vit-base-patch16-224-in21k')
 
@@ -65,21 +72,6 @@ def pdf_to_image(pdf_path, zoom=2.0):
     # Return the list containing paths of all images
     return image_paths
 
-def sanitize_text(text):
-    """
-    Cleans and standardizes text by keeping only alphanumeric characters and spaces.
-    Args:
-        text (str): Text to sanitize.
-    Returns:
-        str: Sanitized text.
-    """
-    if isinstance(text, str):
-        # Use regex to keep only alphanumeric characters and spaces
-        text = re.sub(r'[^a-zA-Z0-9\s]', '', text)
-        # Optionally, collapse multiple spaces into a single space
-        text = re.sub(r'\s+', ' ', text).strip()
-    return text
-
 def text_to_images(text):
     text = sanitize_text(text)
     pdf_path = create_pdf(text)
@@ -87,49 +79,90 @@ def text_to_images(text):
     return image_paths
 
 def documents_to_images(path):
-    document_set = []
-    for filename in os.listdir(path):
-        file_path = os.path.join(path, filename)
-        if os.path.isfile(file_path):
-            with open(file_path, "r") as f:
-                content = f.read()
-                document_set.append(content)
+    # Documents are streamed from disk instead of being read into memory up front
     document_image_paths = []
-    for document in document_set:
+    for document in iter_documents(path):
         image_paths = text_to_images(document)
         document_image_paths.append(image_paths)
     return document_image_paths
 
+def set_inference_threads(num_threads=None, num_interop_threads=None):
+    """
+    Sets the number of CPU threads torch uses for ViT inference.
+    Args:
+        num_threads (int): Intra-op threads, e.g. all cores for offline indexing
+            or a few per worker when serving several queries at once.
+        num_interop_threads (int): Inter-op threads; can only be set before the first forward pass.
+    """
+    if num_threads:
+        torch.set_num_threads(num_threads)
+    if num_interop_threads:
+        try:
+            torch.set_num_interop_threads(num_interop_threads)
+        except RuntimeError as e:
+            print(f"Warning: could not set inter-op threads ({e})")
+
+def encode_page_images(images, batch_size=32):
+    """
+    Encodes page images with ViT in fixed-size batches under torch.inference_mode().
+    Args:
+        images (list): PIL images.
+        batch_size (int): Number of images per forward pass.
+    Returns:
+        np.ndarray: float32 array of shape (len(images), 768), mean-pooled over patches.
+    """
+    vectors = []
+    with torch.inference_mode():
+        for start in range(0, len(images), batch_size):
+            inputs = processor(images=images[start:start + batch_size], return_tensors="pt")
+            outputs = model(**inputs)
+            vectors.append(outputs.last_hidden_state.mean(dim=1).numpy())
+    if not vectors:
+        return np.zeros((0, model.config.hidden_size), dtype=np.float32)
+    return np.concatenate(vectors)
+
+def texts_to_vision_embeddings(texts, batch_size=32, show_progress=True):
+    """
+    Renders every text to pages and encodes the pages of many texts together,
+    filling each ViT batch regardless of where one text ends and the next begins.
+    Page embeddings are then averaged back per text.
+    Returns:
+        np.ndarray: float32 array of shape (len(texts), 1, 768); each row matches
+        what single_unit_embedding returns for that text.
+    """
+    sums = np.zeros((len(texts), model.config.hidden_size), dtype=np.float64)
+    counts = np.zeros(len(texts), dtype=np.int64)
+    pending_images, pending_texts = [], []
+
+    def flush():
+        if pending_images:
+            np.add.at(sums, pending_texts, encode_page_images(pending_images, batch_size))
+            np.add.at(counts, pending_texts, 1)
+            pending_images.clear()
+            pending_texts.clear()
+
+    for i, text in enumerate(tqdm(texts, disable=not show_progress)):
+        for image in text_to_page_images(text):
+            pending_images.append(image)
+            pending_texts.append(i)
+            if len(pending_images) == batch_size:
+                flush()
+    flush()
+    means = sums / np.maximum(counts, 1)[:, None]
+    return means.astype(np.float32)[:, None, :]
+
 def single_unit_embedding(text):
-    image_paths = text_to_images(text)
-    temp = []
-    for image_path in image_paths:
-        image = Image.open(image_path)
-        inputs = processor(images=image, return_tensors="pt")
-        outputs = model(**inputs)
-        vector = outputs.last_hidden_state.mean(dim=1).detach().numpy()
-        temp.append(vector)
-    return np.mean(np.array(temp), axis=0)
+    # Pages are rendered in memory with the same layout as text_to_images
+    return texts_to_vision_embeddings([text], show_progress=False)[0]
 
 def single_image_embedding(image):
-    inputs = processor(images=image, return_tensors="pt")
-    outputs = model(**inputs)
-    vector = outputs.last_hidden_state.mean(dim=1).detach().numpy()
-    return vector
-
-def documents_to_vision_embeddings(documents):
-    document_vision_embeddings = []
-    for document in tqdm(documents):
-        vector = single_unit_embedding(document)
-        document_vision_embeddings.append(vector)
-    return document_vision_embeddings
-
-def queries_to_vision_embeddings(queries):
-    query_vision_embeddings = []
-    for query in tqdm(queries):
-        vector = single_unit_embedding(query)
-        query_vision_embeddings.append(vector)
-    return query_vision_embeddings
+    return encode_page_images([image])
+
+def documents_to_vision_embeddings(documents, batch_size=32):
+    return texts_to_vision_embeddings(documents, batch_size)
+
+def queries_to_vision_embeddings(queries, batch_size=32):
+    return texts_to_vision_embeddings(queries, batch_size)
 
 def get_documents_from_scores(scores):
     rankings = []
@@ -148,27 +181,67 @@ def cosine_similarity(v1, v2):
 
 def vision_rankings(query_embedding, document_embeddings, k):
     # query_embedding = single_unit_embedding(query)
-    scores = []
-    for idx, embedding in enumerate(document_embeddings):
-        scores.append((idx, cosine_similarity(query_embedding[0], embedding[0])))
-    scores = sorted(scores, key=lambda x: x[1], reverse=True)
-    scores = scores[:k]
-    rankings = get_documents_from_scores(scores)
-    return rankings, scores
-
-
-def vision_pipeline(query, document_embeddings_path="Retrieval/savedModels/document-vision-embeddings.json", ids_path="Retrieval/savedModels/ids.pkl", k=100):
-    # document_embeddings = joblib.load(document_embeddings_path)
-    ids = joblib.load(ids_path)
+    return embedding_rankings(query_embedding, document_embeddings, k)
+
+
+def load_vision_embeddings_json(document_embeddings_path="Retrieval/savedModels/document-vision-embeddings.json"):
     with open(document_embeddings_path, "r") as f:
-        document_vision_embeddings2 = json.load(f)
-    document_vision_embeddings = []
-    for embedding in tqdm(document_vision_embeddings2):
-        document_vision_embeddings.append(np.array(embedding))
-    print("loaded embeddings")
+        document_vision_embeddings = json.load(f)
+    return np.array(document_vision_embeddings, dtype=np.float32)
+
+def convert_vision_embeddings(json_path="Retrieval/savedModels/document-vision-embeddings.json", store_path="Retrieval/savedModels/document-vision-embeddings.npy"):
+    """
+    Converts the JSON list of (1, 768) vision embeddings into a binary, memory-mappable
+    .npy store of pre-normalized float32 rows, read by vision_pipeline.
+    """
+    save_embedding_store(load_vision_embeddings_json(json_path), store_path)
+
+registry.register(
+    "vision",
+    document_embeddings=("Retrieval/savedModels/document-vision-embeddings.npy", load_embedding_store),
+    ids=("Retrieval/savedModels/ids.pkl", joblib.load),
+)
+
+def _vision_artifacts(document_embeddings_path, ids_path, quantized_store_path, rescore):
+    """
+    Returns (ids, quantized store or None, exact embeddings or None) for a vision search.
+    """
+    store = registry.load(quantized_store_path, QuantizedEmbeddingStore.load) if quantized_store_path is not None else None
+    if store is not None and not rescore:
+        # Without re-scoring the full embeddings are never touched, so they are not loaded
+        return registry.load(ids_path), store, None
+    artifacts = registry.get("vision", document_embeddings=document_embeddings_path, ids=ids_path)
+    return artifacts["ids"], store, artifacts["document_embeddings"]
+
+def vision_pipeline(query, document_embeddings_path="Retrieval/savedModels/document-vision-embeddings.npy", ids_path="Retrieval/savedModels/ids.pkl", k=100, quantized_store_path=None, rescore=0):
+    """
+    Vision retrieval over ViT page embeddings. Pass quantized_store_path (built with
+    Retrieval.quantization) to score compact float16/int8/PQ codes instead of the full
+    embeddings, re-scoring the best `rescore` candidates against the exact store.
+    """
     query_embedding = single_unit_embedding(query)
-    rankings, scores = vision_rankings(query_embedding, document_vision_embeddings, k)
+    ids, store, document_embeddings = _vision_artifacts(document_embeddings_path, ids_path, quantized_store_path, rescore)
+    if store is not None:
+        rankings, scores = store.search(query_embedding, k, rescore, document_embeddings)
+    else:
+        rankings, scores = vision_rankings(query_embedding, document_embeddings, k)
     rankings2 = []
     for ranking in rankings:
         rankings2.append(ids[ranking])
-    return rankings2
\ No newline at end of file
+    return rankings2
+
+def vision_pipeline_batch(queries, document_embeddings_path="Retrieval/savedModels/document-vision-embeddings.npy", ids_path="Retrieval/savedModels/ids.pkl", k=100, batch_size=32, quantized_store_path=None, rescore=0):
+    """
+    vision_pipeline for many queries: the rendered pages of all queries share ViT
+    batches. The exact store is scored with one matrix product; a quantized store,
+    if given, is searched query by query with the same options as vision_pipeline.
+    Returns:
+        list: Ranked document ids per query.
+    """
+    query_embeddings = queries_to_vision_embeddings(list(queries), batch_size)[:, 0, :]
+    ids, store, document_embeddings = _vision_artifacts(document_embeddings_path, ids_path, quantized_store_path, rescore)
+    if store is not None:
+        results = [store.search(query_embedding, k, rescore, document_embeddings) for query_embedding in query_embeddings]
+    else:
+        results = embedding_rankings_batch(query_embeddings, document_embeddings, k)
+    return [[ids[ranking] for ranking in rankings] for rankings, scores in results]
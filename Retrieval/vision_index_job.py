@@ -0,0 +1,208 @@
+import hashlib
+import json
+import os
+import queue
+import threading
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+from tqdm import tqdm
+
+from Retrieval.embedding_store import save_embedding_store
+from Retrieval.text_render import text_to_page_images
+
+# This module must stay importable without loading ViT: rendering workers import it
+_processor = None
+
+
+def _init_render_worker(processor_name):
+    global _processor
+    from transformers import ViTImageProcessor
+    _processor = ViTImageProcessor.from_pretrained(processor_name)
+
+def _render_document(text):
+    """
+    Runs in a worker process: renders one document and preprocesses its pages
+    into ViT pixel arrays, which are much smaller to send back than raw page images.
+    """
+    images = text_to_page_images(text)
+    return _processor(images=images, return_tensors="np")["pixel_values"]
+
+def _fingerprint(lengths):
+    # Cheap identity check so a resumed run is not mixed with ranges of another corpus
+    return hashlib.sha1(np.array(lengths, dtype=np.int64).tobytes()).hexdigest()
+
+def _write_json(path, data):
+    temp_path = f"{path}.tmp"
+    with open(temp_path, "w") as f:
+        json.dump(data, f, indent=2)
+    os.replace(temp_path, path)
+
+def load_manifest(output_dir):
+    manifest_path = os.path.join(output_dir, "manifest.json")
+    if not os.path.exists(manifest_path):
+        return None
+    with open(manifest_path, "r") as f:
+        return json.load(f)
+
+def _encode_ranges(work_queue, output_dir, manifest, batch_size, errors):
+    """
+    Encoder thread: takes rendered documents in order, runs ViT on full page batches
+    and checkpoints every finished document range.
+    """
+    import torch
+    from Retrieval import vision
+
+    range_size = manifest["range_size"]
+    range_start, sums, counts = None, None, None
+    pending_pages, pending_docs = [], []
+
+    def encode_pending():
+        if pending_pages:
+            with torch.inference_mode():
+                pixel_values = torch.from_numpy(np.stack(pending_pages))
+                vectors = vision.model(pixel_values=pixel_values).last_hidden_state.mean(dim=1).numpy()
+            np.add.at(sums, pending_docs, vectors)
+            np.add.at(counts, pending_docs, 1)
+            pending_pages.clear()
+            pending_docs.clear()
+
+    def checkpoint(bounds):
+        length = bounds["length"]
+        encode_pending()
+        embeddings = (sums / np.maximum(counts, 1)[:, None]).astype(np.float32)
+        shard_path = os.path.join(output_dir, f"range_{range_start:08d}.npy")
+        with open(f"{shard_path}.tmp", "wb") as f:
+            np.save(f, embeddings[:length])
+        os.replace(f"{shard_path}.tmp", shard_path)
+        manifest["ranges"][str(range_start)] = bounds
+        manifest["completed"].append(range_start)
+        _write_json(os.path.join(output_dir, "manifest.json"), manifest)
+
+    try:
+        while True:
+            item = work_queue.get()
+            if item is None:
+                break
+            doc_index, future, range_bounds = item
+            start = doc_index - doc_index % range_size
+            if start != range_start:
+                range_start = start
+                sums = np.zeros((range_size, vision.model.config.hidden_size), dtype=np.float64)
+                counts = np.zeros(range_size, dtype=np.int64)
+            for pixel_values in future.result():
+                pending_pages.append(pixel_values)
+                pending_docs.append(doc_index - range_start)
+                if len(pending_pages) == batch_size:
+                    encode_pending()
+            if range_bounds is not None:
+                # Last document of its range: everything for the range has been queued
+                checkpoint(range_bounds)
+    except Exception as e:
+        errors.append(e)
+        # Keep draining so the producer never blocks on a full queue
+        while work_queue.get() is not None:
+            pass
+
+def index_documents(documents, output_dir="Retrieval/savedModels/vision_ranges", range_size=256, num_render_workers=4, batch_size=32, max_pending=64, num_threads=None, processor_name="google/vit-base-patch16-224-in21k"):
+    """
+    Offline vision indexing job.
+
+    Documents are streamed, rendered and preprocessed in a process pool, and passed
+    through a bounded queue to an encoder that runs batched ViT inference. Every
+    finished range of range_size documents is saved as range_<start>.npy and recorded
+    in manifest.json, so after a crash only the unfinished ranges are processed again.
+    Every range is recorded with its length and a fingerprint of its documents; a
+    resumed run that streams different documents for a completed range (another or a
+    grown corpus, where the last range was partial) raises a ValueError.
+    Args:
+        documents (iterable): Document texts in ids.pkl order, e.g. Retrieval.utils.iter_documents(path).
+        output_dir (str): Directory for the ranges and the manifest.
+        range_size (int): Number of documents per checkpointed range.
+        num_render_workers (int): Processes rendering PDFs to pages.
+        batch_size (int): Pages per ViT forward pass.
+        max_pending (int): Rendered documents allowed to wait for the encoder.
+        num_threads (int): torch intra-op threads for the encoder.
+    Returns:
+        dict: The manifest after the run.
+    """
+    from Retrieval.vision import set_inference_threads
+    set_inference_threads(num_threads)
+
+    os.makedirs(output_dir, exist_ok=True)
+    manifest = load_manifest(output_dir) or {"range_size": range_size, "completed": [], "ranges": {}, "num_documents": None, "fingerprint": None}
+    if manifest["range_size"] != range_size:
+        raise ValueError(f"Existing ranges in {output_dir} use range_size={manifest['range_size']}.")
+    if manifest["completed"] and "ranges" not in manifest:
+        raise ValueError(f"Existing ranges in {output_dir} were built without fingerprints.")
+    manifest.setdefault("ranges", {})
+    completed = set(manifest["completed"])
+    lengths, range_lengths = [], []
+
+    def check_range(start):
+        # A completed range is only reused when it streams exactly the documents it was built from
+        if {"length": len(range_lengths), "fingerprint": _fingerprint(range_lengths)} != manifest["ranges"][str(start)]:
+            raise ValueError(f"Existing ranges in {output_dir} were built from different documents (range starting at {start}).")
+
+    work_queue = queue.Queue(maxsize=max_pending)
+    errors = []
+    encoder = threading.Thread(target=_encode_ranges, args=(work_queue, output_dir, manifest, batch_size, errors))
+    encoder.start()
+
+    with ProcessPoolExecutor(num_render_workers, initializer=_init_render_worker, initargs=(processor_name,)) as pool:
+        try:
+            buffered = None
+            for doc_index, text in enumerate(tqdm(documents)):
+                start = doc_index - doc_index % range_size
+                if doc_index == start:
+                    if start - range_size in completed:
+                        check_range(start - range_size)
+                    range_lengths = []
+                lengths.append(len(text))
+                range_lengths.append(len(text))
+                if start in completed:
+                    if len(range_lengths) > manifest["ranges"][str(start)]["length"]:
+                        check_range(start)
+                    continue
+                # Hold one document back: the last document of the stream also closes a range
+                if buffered is not None:
+                    work_queue.put(buffered + (None,))
+                buffered = (doc_index, pool.submit(_render_document, text))
+                if (doc_index + 1) % range_size == 0:
+                    work_queue.put(buffered + ({"length": range_size, "fingerprint": _fingerprint(range_lengths)},))
+                    buffered = None
+                if errors:
+                    break
+            if lengths and len(lengths) - len(range_lengths) in completed:
+                check_range(len(lengths) - len(range_lengths))
+            if buffered is not None:
+                work_queue.put(buffered + ({"length": len(range_lengths), "fingerprint": _fingerprint(range_lengths)},))
+        finally:
+            work_queue.put(None)
+            encoder.join()
+    if errors:
+        raise errors[0]
+
+    manifest["num_documents"] = len(lengths)
+    manifest["fingerprint"] = _fingerprint(lengths)
+    _write_json(os.path.join(output_dir, "manifest.json"), manifest)
+    return manifest
+
+def assemble_vision_store(output_dir="Retrieval/savedModels/vision_ranges", store_path="Retrieval/savedModels/document-vision-embeddings.npy"):
+    """
+    Concatenates the checkpointed ranges in document order into the vision embedding store.
+    """
+    manifest = load_manifest(output_dir)
+    if manifest is None or manifest["num_documents"] is None:
+        raise ValueError(f"The indexing job in {output_dir} has not finished.")
+    starts = range(0, manifest["num_documents"], manifest["range_size"])
+    missing = sorted(set(starts) - set(manifest["completed"]))
+    if missing:
+        raise ValueError(f"Ranges starting at {missing} have not been indexed yet.")
+    embeddings = np.concatenate([np.load(os.path.join(output_dir, f"range_{start:08d}.npy")) for start in starts])
+    save_embedding_store(embeddings, store_path)
+    return store_path
+
+# Example usage
+# from Retrieval.utils import iter_documents
+# index_documents(iter_documents("Datasets/documents"), num_render_workers=8)
+# assemble_vision_store()
@@ -0,0 +1,274 @@
+import asyncio
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from Retrieval.registry import RETRIEVER_MODULES, registry
+
+SERVER_CONFIG = {
+    "host": "127.0.0.1",
+    "port": 8000,
+    # Requests collected into one process_queries call
+    "max_batch_size": 16,
+    # Seconds the first request of a batch waits for others to join
+    "max_wait": 0.05,
+    # Requests waiting for a batch; beyond this new requests are shed with 503
+    "max_queue": 256,
+    # Batches processed at the same time
+    "max_concurrent_batches": 2,
+}
+
+MAX_BODY_SIZE = 64 * 1024
+
+STATUS_TEXT = {
+    200: "OK",
+    400: "Bad Request",
+    404: "Not Found",
+    405: "Method Not Allowed",
+    413: "Payload Too Large",
+    500: "Internal Server Error",
+    503: "Service Unavailable",
+}
+
+
+class Overloaded(Exception):
+    """
+    Raised when the request queue is full and a request is shed.
+    """
+
+
+class MicroBatcher:
+    """
+    Collects concurrent requests into micro-batches for a batch function such as
+    QAPipeline.process_queries, so the query encoders, the ViT and the sparse scorers
+    see many queries per call. A batch is sent when it reaches max_batch_size or when
+    its first request has waited max_wait seconds. The queue is bounded: when it is
+    full, submit raises Overloaded instead of letting latency grow without limit.
+    """
+
+    def __init__(self, process_batch, max_batch_size=16, max_wait=0.05, max_queue=256, max_concurrent_batches=2):
+        self.process_batch = process_batch
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait
+        self.queue = asyncio.Queue(max_queue)
+        self.slots = asyncio.Semaphore(max_concurrent_batches)
+        self.executor = ThreadPoolExecutor(max_concurrent_batches)
+        self.stats = {"requests": 0, "shed": 0, "batches": 0, "batched_requests": 0, "in_flight": 0}
+
+    async def submit(self, item):
+        """
+        Queues one item and waits for its result.
+        """
+        future = asyncio.get_running_loop().create_future()
+        try:
+            self.queue.put_nowait((item, future))
+        except asyncio.QueueFull:
+            self.stats["shed"] += 1
+            raise Overloaded()
+        self.stats["requests"] += 1
+        return await future
+
+    async def run(self):
+        """
+        Forms batches until cancelled.
+        """
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self.queue.get()]
+            deadline = loop.time() + self.max_wait
+            while len(batch) < self.max_batch_size:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self.queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+            # Waiting for a free slot keeps further requests in the bounded queue
+            await self.slots.acquire()
+            # Requests whose clients went away meanwhile are not processed
+            batch = [(item, future) for item, future in batch if not future.done()]
+            if not batch:
+                self.slots.release()
+                continue
+            asyncio.create_task(self._process(batch))
+
+    async def _process(self, batch):
+        self.stats["batches"] += 1
+        self.stats["batched_requests"] += len(batch)
+        self.stats["in_flight"] += len(batch)
+        try:
+            await self._resolve(batch)
+        finally:
+            self.stats["in_flight"] -= len(batch)
+            self.slots.release()
+
+    async def _resolve(self, batch):
+        try:
+            results = await self._run_batch([item for item, _ in batch])
+        except Exception as e:
+            if len(batch) == 1:
+                if not batch[0][1].done():
+                    batch[0][1].set_exception(e)
+                return
+            # One failing query must not fail the others it was batched with
+            print(f"Warning: batch of {len(batch)} failed ({e}), retrying its requests one by one")
+            for entry in batch:
+                if not entry[1].done():
+                    await self._resolve([entry])
+            return
+        for (_, future), result in zip(batch, results):
+            if not future.done():
+                future.set_result(result)
+
+    async def _run_batch(self, items):
+        return await asyncio.get_running_loop().run_in_executor(self.executor, self.process_batch, items)
+
+    def get_stats(self):
+        stats = dict(self.stats, queued=self.queue.qsize())
+        stats["mean_batch_size"] = stats["batched_requests"] / stats["batches"] if stats["batches"] else 0.0
+        return stats
+
+
+class QAServer:
+    """
+    Minimal asyncio HTTP/1.1 front-end for QAPipeline, using only the standard library.
+
+        POST /query   {"query": "..."} -> process_query result (503 when overloaded)
+        GET  /health  liveness
+        GET  /ready   200 once every retriever's indexes are built, loaded and current, else 503
+        GET  /stats   batching and shedding counters, and the pipeline's cache hit rates
+    """
+
+    def __init__(self, pipeline, max_batch_size=16, max_wait=0.05, max_queue=256, max_concurrent_batches=2, retrievers=None):
+        self.pipeline = pipeline
+        self.batcher_config = (max_batch_size, max_wait, max_queue, max_concurrent_batches)
+        self.retrievers = list(RETRIEVER_MODULES) if retrievers is None else list(retrievers)
+        self.batcher = None
+        self.warming = True
+        self.started = time.time()
+
+    def is_ready(self):
+        return not self.warming and registry.is_warm(self.retrievers)
+
+    async def warm_up(self):
+        # Loading indexes and embeddings happens off the event loop, so /health answers meanwhile
+        try:
+            await asyncio.get_running_loop().run_in_executor(None, registry.warm_up, self.retrievers)
+        except Exception as e:
+            print(f"Warning: warm-up failed ({e})")
+        finally:
+            self.warming = False
+
+    async def handle_query(self, body):
+        try:
+            query = json.loads(body or b"{}").get("query")
+        except (ValueError, AttributeError):
+            return 400, {"error": "Body must be a JSON object."}
+        if not isinstance(query, str) or not query.strip():
+            return 400, {"error": "Field 'query' must be a non-empty string."}
+        try:
+            return 200, await self.batcher.submit(query)
+        except Overloaded:
+            return 503, {"error": "Server overloaded, retry later."}
+        except Exception as e:
+            return 500, {"error": f"Pipeline execution failed: {e}"}
+
+    async def route(self, method, path, body):
+        if path == "/query":
+            if method != "POST":
+                return 405, {"error": "Use POST."}
+            return await self.handle_query(body)
+        if method != "GET":
+            return 405, {"error": "Use GET."}
+        if path == "/health":
+            return 200, {"status": "ok", "uptime": time.time() - self.started}
+        if path == "/ready":
+            ready = self.is_ready()
+            return (200 if ready else 503), {"ready": ready, "warming": self.warming, "retrievers": self.retrievers}
+        if path == "/stats":
+            stats = self.batcher.get_stats()
+            if getattr(self.pipeline, "cache", None) is not None:
+                stats["cache"] = self.pipeline.cache.get_stats()
+            return 200, stats
+        return 404, {"error": f"No route for {path}."}
+
+    async def handle_connection(self, reader, writer):
+        try:
+            request_line = await reader.readline()
+            parts = request_line.decode("latin-1").split()
+            if len(parts) != 3:
+                return
+            method, path = parts[0], parts[1].split("?", 1)[0]
+            headers = {}
+            while True:
+                line = await reader.readline()
+                if line in (b"\r\n", b"\n", b""):
+                    break
+                name, _, value = line.decode("latin-1").partition(":")
+                headers[name.strip().lower()] = value.strip()
+            length = int(headers.get("content-length", 0) or 0)
+            if length > MAX_BODY_SIZE:
+                status, payload = 413, {"error": "Request body too large."}
+            else:
+                body = await reader.readexactly(length) if length else b""
+                request = asyncio.create_task(self.route(method, path, body))
+                # The client sends nothing after its request. End of input may only be a
+                # half-close (the client shut down its sending side and still reads), so
+                # only a connection error, e.g. a reset, means the client has gone away
+                hang_up = asyncio.create_task(reader.read(1))
+                await asyncio.wait({request, hang_up}, return_when=asyncio.FIRST_COMPLETED)
+                connection_lost = hang_up.done() and hang_up.exception() is not None
+                if connection_lost and not request.done():
+                    # Cancelling the request cancels its queued future, so the batcher skips it
+                    request.cancel()
+                    return
+                hang_up.cancel()
+                status, payload = await request
+            await self.respond(writer, status, payload)
+        except (ValueError, asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+    async def respond(self, writer, status, payload):
+        body = json.dumps(payload, default=str).encode("utf-8")
+        head = [
+            f"HTTP/1.1 {status} {STATUS_TEXT.get(status, '')}",
+            "Content-Type: application/json",
+            f"Content-Length: {len(body)}",
+            "Connection: close",
+        ]
+        if status == 503:
+            head.append("Retry-After: 1")
+        writer.write(("\r\n".join(head) + "\r\n\r\n").encode("latin-1") + body)
+        await writer.drain()
+
+    async def serve(self, host="127.0.0.1", port=8000):
+        self.batcher = MicroBatcher(self.pipeline.process_queries, *self.batcher_config)
+        batcher_task = asyncio.create_task(self.batcher.run())
+        warm_up_task = asyncio.create_task(self.warm_up())
+        server = await asyncio.start_server(self.handle_connection, host, port)
+        print(f"Serving on http://{host}:{port}")
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            batcher_task.cancel()
+            warm_up_task.cancel()
+
+
+def main():
+    from main import QAPipeline
+
+    config = dict(SERVER_CONFIG)
+    host, port = config.pop("host"), config.pop("port")
+    server = QAServer(QAPipeline(), **config)
+    asyncio.run(server.serve(host, port))
+
+if __name__ == "__main__":
+    main()
+
+# Example usage
+# python -m Serving.server
+# curl -X POST localhost:8000/query -d '{"query": "Who is Harry Potter?"}'
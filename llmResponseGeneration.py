@@ -2,17 +2,17 @@ import json
 import sys
 import os
 from AnswerGeneration.getAnswer import generate_answer_withContext
+from Ranking.run_format import load_run
 
 def load_json(file_path):
     with open(file_path, 'r') as f:
         return json.load(f)
 
 def getRanking(file_path, query_id):
-    ranking = load_json(file_path)
-    # print(f"Ranking from file {file_path}: {ranking}")
-    for rank in ranking:
-        if query_id in rank:
-            return str(rank[query_id][0])
+    # The run is loaded once (from its binary .run copy if converted) and then looked up by query id
+    ranking = load_run(file_path)
+    if query_id in ranking:
+        return str(ranking[query_id][0])
     print("Query ID not found")
     return None
 
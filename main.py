@@ -1,81 +1,352 @@
-from Query_Modification.QueryModification import modified_query
-from retrieval import (
-    retrieve_with_sparse_methods,
-    retrieve_with_dense_methods,
-    combine_retrieval_results
-)
-from Agents import execute_agent_searches
-from answer_generation import generate_answers
-from Ranking.RRF.RRF_implementation import reciprocal_rank_fusion
+import copy
+import hashlib
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+from functools import partial
+
+# Agents
+from Agents.togetherAIAgent import generate_article_from_query
+from Agents.wikiAgent import get_wiki_data
+from Agents.rankerAgent import rankerAgent
+from Query_Modification.QueryModification import query_Modifier, getKeywords
+
+from Ranking.RRF.fusion import fuse_lists
+
+# Retrieval Models
+from Retrieval.tf_idf import tf_idf_pipeline_batch
+from Retrieval.bm25 import bm25_pipeline_batch
+from Retrieval.vision import vision_pipeline_batch
+from Retrieval.openSource import open_source_pipeline_batch
+from Retrieval.registry import registry
+from Baseline.boolean import boolean_pipeline
+from Baseline.ingestion import iter_json_records
+from Cache.answer_cache import AnswerCache, normalize_query
+# Answer Generation
+from AnswerGeneration.getAnswer import generate_answer_withContext, generate_answer_zeroShot
+
+DOCUMENTS_PATH = "Datasets/mini_wiki_collection.json"
+
+# Seconds a stage may take once it has been started; later results are dropped
+STAGE_DEADLINES = {
+    "query_modification": 15,
+    "agents": 30,
+    "retrieval": 20,
+    "answers": 30,
+    "ranker": 30,
+}
+
+# Rankings fused with RRF, as in the tf_idf_bm25_open runs
+FUSED_RETRIEVERS = ("tf_idf", "bm25", "open_source")
+
+
+def load_document_texts(documents_path):
+    """
+    Maps every wikipedia_id of the collection to its full text, the context given to the LLM.
+    """
+    return {record["wikipedia_id"]: " ".join(record["text"]) for record in iter_json_records(documents_path)}
+
+def map_queries(retriever, queries):
+    """
+    Batch interface for retrievers that answer one query at a time.
+    """
+    return [retriever(query) for query in queries]
+
+
+class StageTask:
+    """
+    A stage task submitted to an executor. Its deadline counts from the moment a worker
+    starts running it, so time spent waiting for a free worker does not use it up. A task
+    still queued a full deadline after the pipeline started waiting for it is cancelled.
+    """
+
+    def __init__(self, executor, timeout, fn, args):
+        self.timeout = timeout
+        self.start = None
+        self.started = threading.Event()
+        self.future = executor.submit(self._run, fn, args)
+
+    def _run(self, fn, args):
+        self.start = time.monotonic()
+        self.started.set()
+        return fn(*args)
+
+    def wait(self):
+        """
+        Waits until the task has started and then until it finishes or its deadline passes.
+        A task that does not start within its deadline is cancelled and counts as late.
+        Returns:
+            bool: Whether the task finished in time.
+        """
+        if not self.started.wait(self.timeout):
+            if self.future.cancel():
+                return False
+            # A worker picked the task up just now
+            self.started.wait()
+        wait([self.future], timeout=max(self.start + self.timeout - time.monotonic(), 0))
+        return self.future.done()
+
 
 class QAPipeline:
-    def __init__(self):
-        pass
+    """
+    Runs the stages of the QnA system as a graph of concurrent tasks:
+
+        queries -> query modification -> retrieval (modified queries) -+
+        queries -> retrieval (original queries) -----------------------+-> RRF fusion -> answers -> ranker
+        queries -> keywords -> Wikipedia agent, article agent ---------+
+
+    Retrieval runs once per retriever for a whole batch of queries, on workers of its
+    own, fusion is one vectorized call per fused run, and the LLM calls of all queries
+    run concurrently. Every task has a deadline measured from its start (STAGE_DEADLINES,
+    per query for batch retrieval tasks). A task that misses it is left out of fusion
+    and answer ranking instead of holding up the answer.
+    """
+
+    def __init__(self, config=None):
+        self.config = config or {}
+        self.deadlines = {**STAGE_DEADLINES, **self.config.get("stage_deadlines", {})}
+        self.retrieval_depth = self.config.get("retrieval_depth", 100)
+        # Every retriever takes a list of queries and returns one ranking per query
+        self.retrievers = {
+            "boolean": partial(map_queries, partial(boolean_pipeline, top_n=self.retrieval_depth)),
+            "tf_idf": partial(tf_idf_pipeline_batch, k=self.retrieval_depth),
+            "bm25": partial(bm25_pipeline_batch, k=self.retrieval_depth),
+            "vision": partial(vision_pipeline_batch, k=self.retrieval_depth),
+            "open_source": partial(open_source_pipeline_batch, k=self.retrieval_depth),
+        }
+        # Shared by all queries; network-bound stages mostly wait, so it can be larger than the CPU count
+        self.executor = ThreadPoolExecutor(self.config.get("max_workers", 32))
+        # Retrieval and the document load get their own workers, so they never queue behind LLM calls
+        self.retrieval_executor = ThreadPoolExecutor(self.config.get("retrieval_workers", 8))
+        # Stage outputs per normalized query; "cache": None turns caching off
+        cache_config = self.config.get("cache", {})
+        self.cache = AnswerCache(**cache_config, version=self._cache_version()) if cache_config is not None else None
+
+    def _cache_version(self):
+        """
+        Version of the cached stage outputs: the settings they depend on and the stamps
+        of the index files and documents, so a rebuilt index invalidates the cache.
+        """
+        state = (self.retrieval_depth, FUSED_RETRIEVERS, sorted(self.retrievers), registry.artifact_stamps(paths=[DOCUMENTS_PATH]))
+        return hashlib.sha1(repr(state).encode("utf-8")).hexdigest()
+
+    def _submit(self, tasks, name, stage, fn, *args, size=1):
+        """
+        Starts a stage task. size is the number of queries the task handles at once;
+        the deadline of a batch retrieval task grows with it.
+        """
+        executor = self.retrieval_executor if stage == "retrieval" else self.executor
+        tasks[name] = StageTask(executor, self.deadlines[stage] * size, fn, args)
+
+    def _gather(self, tasks, names, dropped):
+        """
+        Waits for the named tasks until their deadlines and returns the results that arrived in time.
+        Late or failed tasks are recorded in dropped; a late task keeps its worker until it returns.
+        """
+        results = {}
+        for name in names:
+            future = tasks[name].future
+            if not tasks[name].wait():
+                print(f"Warning: {name} missed its deadline and is dropped")
+                dropped.append(name)
+            elif future.exception() is not None:
+                print(f"Warning: {name} failed ({future.exception()}) and is dropped")
+                dropped.append(name)
+            else:
+                results[name] = future.result()
+        return results
 
     def process_query(self, query: str):
         """
         Process a query through the entire pipeline.
-        
+
         Args:
             query: The input query string
-            
+
         Returns:
             Dictionary containing the final answer and intermediate results
         """
-        try:
-            # Step 1: Query Modification using LLMs
-            modified_query = modified_query(query)
-
-            # Step 2: Parallel Retrieval Process
-            # 2a. Traditional Retrieval Methods (TF-IDF & BM25)
-            sparse_results = retrieve_with_sparse_methods(modified_query)
-
-            # 2b. Dense Retrieval with Embedding Models
-            dense_results = retrieve_with_dense_methods(modified_query)
-
-            # 2c. Agent-based Searches
-            agent_results = execute_agent_searches(query)
-
-            # Step 3: Combine all retrieval results
-            combined_results = combine_retrieval_results(
-                sparse_results,
-                dense_results,
-                agent_results
-            )
-
-            # Step 4: Generate multiple answer candidates using LLMs
-            answer_candidates = generate_answers(
-                query=query,
-                modified_query=modified_query,
-                retrieved_content=combined_results
-            )
-
-            # Step 5: Re-rank the generated answers
-            ranked_answers = rerank_answers(
-                query=query,
-                answer_candidates=answer_candidates
-            )
-
-            # Return the best answer and intermediate results
-            return {
+        return self.process_queries([query])[0]
+
+    def process_queries(self, queries):
+        """
+        Process many queries together, e.g. the QnA_Eval query set. Queries answered
+        before are served from the cache; repeats within the batch are run once.
+
+        Args:
+            queries: List of query strings
+
+        Returns:
+            List with the process_query result of every query, in order
+        """
+        queries = list(queries)
+        if self.cache is None:
+            return self._process_queries(queries)
+        self.cache.set_version(self._cache_version())
+        results = [self.cache.get("result", query) for query in queries]
+        pending = {}
+        for i, result in enumerate(results):
+            if result is None:
+                pending.setdefault(normalize_query(queries[i]), []).append(i)
+        if pending:
+            computed = self._process_queries([queries[ids[0]] for ids in pending.values()])
+            for ids, result in zip(pending.values(), computed):
+                for i in ids:
+                    results[i] = result if i == ids[0] else copy.deepcopy(result)
+        for query, result in zip(queries, results):
+            result['original_query'] = query
+        return results
+
+    def _cached(self, stage, queries):
+        if self.cache is None:
+            return [None] * len(queries)
+        return [self.cache.get(stage, query) for query in queries]
+
+    def _process_queries(self, queries):
+        tasks = {}
+        dropped = []
+        # Stages cached for a query are not run again for it
+        modified_queries = {i: modified for i, modified in enumerate(self._cached("modified_query", queries)) if modified is not None}
+        rankings = self._cached("rankings", queries)
+        # A rankings entry carries the modified query its _modified runs were retrieved with
+        for i, entry in enumerate(rankings):
+            if entry is not None:
+                rankings[i] = entry["rankings"]
+                if entry["modified_query"] is not None:
+                    modified_queries[i] = entry["modified_query"]
+        answer_candidates = self._cached("answer_candidates", queries)
+        retrieval_ids = [i for i, ranking in enumerate(rankings) if ranking is None]
+        answer_ids = [i for i, candidates in enumerate(answer_candidates) if candidates is None]
+
+        def query_dropped(i):
+            names = [name.split(":", 1)[1] for name in dropped if name.startswith(f"{i}:")]
+            return names + [name for name in dropped if ":" not in name and (i in modified_queries or not name.endswith("_modified"))]
+
+        # Everything that only needs the original queries starts right away, retrieval first
+        if retrieval_ids:
+            for name, retriever in self.retrievers.items():
+                self._submit(tasks, name, "retrieval", retriever, [queries[i] for i in retrieval_ids], size=len(retrieval_ids))
+        if answer_ids:
+            self._submit(tasks, "documents", "retrieval", registry.load, DOCUMENTS_PATH, load_document_texts)
+        for i, query in enumerate(queries):
+            if i not in modified_queries:
+                self._submit(tasks, f"{i}:modified_query", "query_modification", query_Modifier, query)
+        for i in answer_ids:
+            query = queries[i]
+            self._submit(tasks, f"{i}:agent2", "agents", generate_article_from_query, query)
+            self._submit(tasks, f"{i}:agent1", "agents", lambda query=query: get_wiki_data(getKeywords(query)))
+
+        # Step 1: Query Modification using LLMs; the modified branch only runs for the queries modified in time
+        names = [f"{i}:modified_query" for i in range(len(queries)) if i not in modified_queries]
+        for name, modified_query in self._gather(tasks, names, dropped).items():
+            i = int(name.split(":", 1)[0])
+            modified_queries[i] = modified_query
+            if self.cache is not None:
+                self.cache.put("modified_query", queries[i], modified_query)
+        modified_ids = [i for i in retrieval_ids if i in modified_queries]
+        if modified_ids:
+            for name, retriever in self.retrievers.items():
+                self._submit(tasks, f"{name}_modified", "retrieval", retriever, [modified_queries[i] for i in modified_ids], size=len(modified_ids))
+
+        # Step 2: Retrieval, dropping the rankings that are late
+        names = list(self.retrievers) if retrieval_ids else []
+        if answer_ids:
+            names.append("documents")
+        if modified_ids:
+            names += [f"{name}_modified" for name in self.retrievers]
+        batch_rankings = self._gather(tasks, names, dropped)
+        documents = batch_rankings.pop("documents", {})
+        for i in retrieval_ids:
+            rankings[i] = {}
+        for name in self.retrievers:
+            for i, ranking in zip(retrieval_ids, batch_rankings.get(name, [])):
+                rankings[i][name] = ranking
+        for name in self.retrievers:
+            for i, ranking in zip(modified_ids, batch_rankings.get(f"{name}_modified", [])):
+                rankings[i][f"{name}_modified"] = ranking
+
+        # Step 3: Combine the rankings that arrived with RRF, one vectorized call per fused run
+        retrieved = [rankings[i] for i in retrieval_ids]
+        fused_runs = {
+            "tf_idf_bm25_open_RRF_Ranking": [[r[name] for name in FUSED_RETRIEVERS if name in r] for r in retrieved],
+            "tf_idf_bm25_open_RRF_Ranking_modified": [[r[f"{name}_modified"] for name in FUSED_RETRIEVERS if f"{name}_modified" in r] for r in retrieved],
+        }
+        fused_runs["tf_idf_bm25_open_RRF_Ranking_combined"] = [
+            original_lists + modified_lists if original_lists and modified_lists else []
+            for original_lists, modified_lists in zip(*fused_runs.values())
+        ]
+        for run_name, lists in fused_runs.items():
+            for i, fused in zip(retrieval_ids, fuse_lists(lists)):
+                if fused:
+                    rankings[i][run_name] = fused
+        # Only complete stage outputs are cached, so a dropped retriever is retried next time
+        if self.cache is not None:
+            for i in retrieval_ids:
+                if not query_dropped(i):
+                    self.cache.put("rankings", queries[i], {"modified_query": modified_queries.get(i), "rankings": rankings[i]})
+
+        # Step 4: Generate answer candidates from every context, for all queries concurrently
+        answer_names = []
+        for i in answer_ids:
+            query = queries[i]
+            agent_results = self._gather(tasks, [f"{i}:agent1", f"{i}:agent2"], dropped)
+            contexts = {}
+            if agent_results.get(f"{i}:agent1"):
+                contexts["agent1"] = (query, agent_results[f"{i}:agent1"][0])
+            if agent_results.get(f"{i}:agent2"):
+                contexts["agent2"] = (query, agent_results[f"{i}:agent2"])
+            for name, ranking in rankings[i].items():
+                if ranking and str(ranking[0]) in documents and (i in modified_queries or not name.endswith("_modified")):
+                    question = modified_queries[i] if name.endswith("_modified") else query
+                    contexts[name] = (question, documents[str(ranking[0])])
+            contexts["zeroShot"] = (query, None)
+            for name, (question, context) in contexts.items():
+                if context is None:
+                    self._submit(tasks, f"{i}:{name}_answer", "answers", generate_answer_zeroShot, question)
+                else:
+                    self._submit(tasks, f"{i}:{name}_answer", "answers", generate_answer_withContext, question, context)
+                answer_names.append(f"{i}:{name}_answer")
+            answer_candidates[i] = {}
+        answers = self._gather(tasks, answer_names, dropped)
+        for task_name, answer in answers.items():
+            i, name = task_name.split(":", 1)
+            answer_candidates[int(i)][name[:-len("_answer")]] = answer
+        if self.cache is not None:
+            for i in answer_ids:
+                if not query_dropped(i):
+                    self.cache.put("answer_candidates", queries[i], answer_candidates[i])
+
+        # Step 5: Re-rank the generated answers
+        for i, query in enumerate(queries):
+            if answer_candidates[i]:
+                self._submit(tasks, f"{i}:ranker", "ranker", rankerAgent, {"query": query, **answer_candidates[i]})
+        ranked = self._gather(tasks, [f"{i}:ranker" for i in range(len(queries)) if answer_candidates[i]], dropped)
+
+        # Return the best answer and intermediate results of every query
+        results = []
+        for i, query in enumerate(queries):
+            ranked_answers = [ranked[f"{i}:ranker"]] if f"{i}:ranker" in ranked else []
+            results.append({
                 'original_query': query,
-                'modified_query': modified_query,
-                'retrieval_results': combined_results,
-                'answer_candidates': answer_candidates,
+                'modified_query': modified_queries.get(i),
+                'retrieval_results': rankings[i],
+                'answer_candidates': answer_candidates[i],
                 'ranked_answers': ranked_answers,
-                'best_answer': ranked_answers[0] if ranked_answers else None
-            }
-
-        except Exception as e:
-            raise
+                'best_answer': ranked_answers[0][1] if ranked_answers else None,
+                'dropped_stages': query_dropped(i)
+            })
+            if self.cache is not None and not results[-1]['dropped_stages']:
+                self.cache.put("result", query, results[-1])
+        return results
 
 def main():
     # Example configuration
     config = {
-        'llm_model': 'your_llm_model_name',
-        'embedding_model': 'your_embedding_model_name',
-        'max_results': 10,
-        'reranking_threshold': 0.8
+        'retrieval_depth': 100,
+        'max_workers': 32,
+        'retrieval_workers': 8,
+        'stage_deadlines': {'answers': 45},
+        'cache': {'max_entries': 1024, 'ttl': 24 * 3600, 'db_path': 'Cache/answer_cache.sqlite'}
     }
 
     # Initialize the pipeline
@@ -88,8 +359,9 @@ def main():
         print(f"Original Query: {result['original_query']}")
         print(f"Modified Query: {result['modified_query']}")
         print(f"Best Answer: {result['best_answer']}")
+        print(f"Cache: {pipeline.cache.get_stats()}")
     except Exception as e:
         print(f"Pipeline execution failed: {str(e)}")
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
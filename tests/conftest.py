@@ -0,0 +1,46 @@
+import os
+import sys
+from collections import Counter
+
+import numpy as np
+import pytest
+
+# The packages of the repository are imported from its root, as the scripts do
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from Retrieval.analyzer import index_tokens
+
+WORDS = (
+    "harry potter wizard school magic castle dragon river mountain king queen war peace "
+    "music guitar piano song album band city river bridge train station football goal "
+    "player team science physics atom energy planet star galaxy ocean island ship"
+).split()
+
+
+@pytest.fixture
+def corpus():
+    """
+    200 synthetic documents over a small vocabulary, so terms repeat across documents.
+    """
+    rng = np.random.default_rng(0)
+    return [" ".join(rng.choice(WORDS, size=rng.integers(3, 40))) for _ in range(200)]
+
+
+@pytest.fixture
+def queries():
+    rng = np.random.default_rng(1)
+    return [" ".join(rng.choice(WORDS, size=rng.integers(1, 6))) for _ in range(25)] + ["unknown words only", ""]
+
+
+@pytest.fixture
+def tf_idf_model(corpus):
+    """
+    The corpus tokenized with idf and vocabulary as train_tf_idf computes them.
+    Returns:
+        tuple: (documents_tokenized, idf_dict, vocab)
+    """
+    documents_tokenized = [index_tokens(text) for text in corpus]
+    df = Counter(token for tokens in documents_tokenized for token in set(tokens))
+    vocab = {token: None for tokens in documents_tokenized for token in tokens}
+    idf_dict = {token: np.log(len(corpus) / df[token]) for token in vocab}
+    return documents_tokenized, idf_dict, vocab
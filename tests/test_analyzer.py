@@ -0,0 +1,64 @@
+import re
+
+import numpy as np
+import pytest
+from gensim.utils import simple_preprocess
+
+from Retrieval.analyzer import Vocabulary, analyze, analyze_corpus, analyze_query, index_tokens, sanitize_text, word_tokens
+
+TEXTS = [
+    "Harry Potter and the Philosopher's Stone (1997)",
+    "abc123def _private __dunder__ snake_case_word x y zz",
+    "Ünïcödé Straße, naïve café — 東京 and Αθήνα",
+    "supercalifragilisticexpialidocious is longer than fifteen, fifteenletters! is not",
+    "U.S.A. e-mail 3rd 42 2nd-best a1b2c3",
+    "tabs\tand\nnewlines\r\n  spaces",
+    "",
+]
+
+
+@pytest.mark.parametrize("text", TEXTS)
+def test_index_tokens_equal_simple_preprocess(text):
+    assert index_tokens(text) == simple_preprocess(text)
+
+
+def test_index_tokens_equal_simple_preprocess_on_the_corpus(corpus):
+    rng = np.random.default_rng(0)
+    characters = list("abcXYZ_09 -.'éß東") + [" "] * 4
+    texts = corpus + ["".join(rng.choice(characters, size=60)) for _ in range(300)]
+    for text in texts:
+        assert index_tokens(text) == simple_preprocess(text)
+
+
+@pytest.mark.parametrize("text", TEXTS)
+def test_word_tokens_are_the_boolean_tokenization(text):
+    assert word_tokens(text) == re.findall(r"\w+", text.lower())
+
+
+def test_sanitize_text():
+    assert sanitize_text("  Hello,\n\tWörld!  (2024) ") == "Hello Wrld 2024"
+    assert sanitize_text(None) is None
+
+
+def test_one_pass_analysis_and_cached_queries(corpus):
+    for text in corpus[:20] + TEXTS:
+        assert analyze(text) == (word_tokens(text), index_tokens(text))
+    analysis = analyze_query("Who is Harry Potter?")
+    assert analysis == (("who", "is", "harry", "potter"), ("who", "is", "harry", "potter"))
+    assert analyze_query("Who is Harry Potter?") is analysis
+
+
+def test_analyze_corpus(corpus):
+    words, tokens, vocabulary, token_ids = analyze_corpus(corpus)
+    assert words == [word_tokens(text) for text in corpus]
+    assert tokens == [index_tokens(text) for text in corpus]
+    for document_tokens, ids in zip(tokens, token_ids):
+        assert ids.dtype == np.int32
+        assert vocabulary.decode(ids) == document_tokens
+    # Ids follow the order of first appearance
+    first_seen = list(dict.fromkeys(token for document_tokens in tokens for token in document_tokens))
+    assert vocabulary.tokens == first_seen
+    assert vocabulary.encode(["harry", "unseen"], add=False).tolist() == [vocabulary.get("harry")]
+    assert "unseen" not in vocabulary and len(vocabulary) == len(first_seen)
+    sanitized_words, _, _, _ = analyze_corpus(["It's a test!"], sanitize=True)
+    assert sanitized_words == [["its", "a", "test"]]
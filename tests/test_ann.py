@@ -0,0 +1,79 @@
+import numpy as np
+import pytest
+
+from Retrieval.ann import IVFIndex, build_ann_index, load_ann_index
+from Retrieval.embedding_store import embedding_rankings, normalize_embeddings
+
+
+@pytest.fixture
+def embeddings():
+    # Topic clusters, like sentence embeddings of a document collection
+    rng = np.random.default_rng(0)
+    topics = rng.normal(size=(20, 32))
+    return topics[rng.integers(0, 20, size=2000)] + 0.3 * rng.normal(size=(2000, 32))
+
+
+@pytest.fixture
+def query_embeddings(embeddings):
+    rng = np.random.default_rng(1)
+    return embeddings[rng.choice(len(embeddings), 20)] + 0.3 * rng.normal(size=(20, 32))
+
+
+def test_every_vector_is_in_exactly_one_list(embeddings):
+    index = IVFIndex.build(embeddings, nlist=16)
+    assert index.nlist == 16
+    assert index.list_offsets[-1] == len(embeddings)
+    np.testing.assert_array_equal(np.sort(index.list_ids), np.arange(len(embeddings)))
+
+
+def test_probing_every_list_is_exact_search(embeddings, query_embeddings):
+    index = IVFIndex.build(embeddings, nlist=16)
+    store = normalize_embeddings(embeddings)
+    for query_embedding in query_embeddings:
+        rankings, scores = index.search(query_embedding, k=10, nprobe=16)
+        expected_rankings, expected_scores = embedding_rankings(query_embedding, store, 10)
+        np.testing.assert_array_equal(rankings, expected_rankings)
+        np.testing.assert_allclose(scores, expected_scores, rtol=1e-6)
+
+
+def test_recall_grows_with_nprobe(embeddings, query_embeddings):
+    index = IVFIndex.build(embeddings, nlist=32)
+    store = normalize_embeddings(embeddings)
+    recalls = []
+    for nprobe in (1, 4, 32):
+        found = 0
+        for query_embedding in query_embeddings:
+            expected, _ = embedding_rankings(query_embedding, store, 10)
+            rankings, _ = index.search(query_embedding, k=10, nprobe=nprobe)
+            found += len(set(rankings.tolist()) & set(expected.tolist()))
+        recalls.append(found / (10 * len(query_embeddings)))
+    assert recalls == sorted(recalls)
+    assert recalls[1] >= 0.9 and recalls[2] == 1.0
+
+
+def test_save_and_load_round_trip(embeddings, query_embeddings, tmp_path):
+    index = build_ann_index(embeddings, nlist=16, nprobe=3)
+    index_path = str(tmp_path / "ivf.npz")
+    index.save(index_path)
+    loaded = load_ann_index(index_path)
+    assert loaded.nprobe == 3
+    for query_embedding in query_embeddings:
+        rankings, scores = loaded.search(query_embedding, k=10)
+        expected_rankings, expected_scores = index.search(query_embedding, k=10)
+        np.testing.assert_array_equal(rankings, expected_rankings)
+        assert scores == expected_scores
+
+
+def test_unknown_backend_is_rejected(embeddings):
+    with pytest.raises(ValueError):
+        build_ann_index(embeddings, backend="hnsw")
+
+
+def test_faiss_backend_matches_exact_search_with_every_list_probed(embeddings, query_embeddings):
+    pytest.importorskip("faiss")
+    index = build_ann_index(embeddings, backend="faiss", nlist=16)
+    store = normalize_embeddings(embeddings)
+    for query_embedding in query_embeddings:
+        rankings, _ = index.search(query_embedding, k=10, nprobe=16)
+        expected_rankings, _ = embedding_rankings(query_embedding, store, 10)
+        np.testing.assert_array_equal(rankings, expected_rankings)
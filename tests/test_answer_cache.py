@@ -0,0 +1,112 @@
+import pytest
+
+import Cache.answer_cache as answer_cache
+from Cache.answer_cache import AnswerCache, normalize_query
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """
+    Controllable time.time for the cache module.
+    """
+    now = [1000.0]
+    monkeypatch.setattr(answer_cache.time, "time", lambda: now[0])
+    return now
+
+
+def test_queries_differing_in_whitespace_and_case_share_entries():
+    assert normalize_query(" Who is  Harry Potter?") == normalize_query("who is harry potter?") == "who is harry potter?"
+    cache = AnswerCache()
+    cache.put("modified_query", "Who is Harry Potter?", "harry potter wizard")
+    assert cache.get("modified_query", "who is harry   POTTER?") == "harry potter wizard"
+    assert cache.get("rankings", "who is harry potter?") is None
+
+
+def test_symbols_and_non_latin_queries_keep_their_own_keys():
+    assert normalize_query("C++") != normalize_query("C")
+    assert normalize_query("Straße") == normalize_query("STRASSE")
+    assert normalize_query("ｈａｒｒｙ") == "harry"
+    cache = AnswerCache()
+    cache.put("result", "東京はどこ", "tokyo")
+    cache.put("result", "Где Москва", "moscow")
+    assert cache.get("result", "東京はどこ") == "tokyo"
+    assert cache.get("result", "где москва") == "moscow"
+    assert cache.get("result", "C") is None
+
+
+def test_queries_without_a_key_are_not_cached():
+    cache = AnswerCache()
+    cache.put("result", "  ", "answer")
+    assert cache.get("result", "  ") is None
+    assert cache.get_stats()["entries"] == 0
+
+
+def test_version_change_clears_both_tiers(tmp_path):
+    db_path = str(tmp_path / "answers.sqlite")
+    cache = AnswerCache(db_path=db_path, version="index-1")
+    cache.put("result", "query", "old answer")
+    assert AnswerCache(db_path=db_path, version="index-1").get("result", "query") == "old answer"
+    cache.set_version("index-2")
+    assert cache.get("result", "query") is None
+    cache.put("result", "query", "new answer")
+    # A restart with the old version does not serve entries of the new one either
+    assert AnswerCache(db_path=db_path, version="index-1").get("result", "query") is None
+
+
+def test_returned_values_are_copies():
+    cache = AnswerCache()
+    value = {"rankings": {"bm25": ["1", "2"]}}
+    cache.put("rankings", "query", value)
+    value["rankings"]["bm25"].append("3")
+    cache.get("rankings", "query")["rankings"]["bm25"].clear()
+    assert cache.get("rankings", "query") == {"rankings": {"bm25": ["1", "2"]}}
+
+
+def test_least_recently_used_entries_are_evicted():
+    cache = AnswerCache(max_entries=2)
+    cache.put("result", "a", 1)
+    cache.put("result", "b", 2)
+    assert cache.get("result", "a") == 1
+    cache.put("result", "c", 3)
+    assert cache.get("result", "b") is None
+    assert (cache.get("result", "a"), cache.get("result", "c")) == (1, 3)
+
+
+def test_entries_expire(clock):
+    cache = AnswerCache(ttl=60)
+    cache.put("result", "query", "answer")
+    clock[0] += 59
+    assert cache.get("result", "query") == "answer"
+    clock[0] += 2
+    assert cache.get("result", "query") is None
+    assert cache.get_stats()["entries"] == 0
+
+
+def test_sqlite_tier_survives_restarts(clock, tmp_path):
+    db_path = str(tmp_path / "cache" / "answers.sqlite")
+    cache = AnswerCache(max_entries=1, ttl=60, db_path=db_path)
+    cache.put("result", "first", "one")
+    cache.put("result", "second", "two")
+    # Evicted from memory, still on disk
+    assert cache.get("result", "first") == "one"
+    restarted = AnswerCache(ttl=60, db_path=db_path)
+    assert restarted.get("result", "second") == "two"
+    assert restarted.get_stats()["result"]["disk_hits"] == 1
+    clock[0] += 61
+    assert AnswerCache(ttl=60, db_path=db_path).get("result", "first") is None
+    restarted.clear()
+    clock[0] -= 61
+    assert AnswerCache(db_path=db_path).get("result", "second") is None
+
+
+def test_stats_count_hits_and_misses():
+    cache = AnswerCache()
+    cache.put("rankings", "query", [])
+    cache.get("rankings", "query")
+    cache.get("rankings", "other")
+    cache.get("custom_stage", "query")
+    stats = cache.get_stats()
+    assert stats["entries"] == 1
+    assert stats["rankings"] == {"hits": 1, "disk_hits": 0, "misses": 1, "hit_rate": 0.5}
+    assert stats["custom_stage"]["misses"] == 1
+    assert stats["result"]["hit_rate"] == 0.0
@@ -0,0 +1,70 @@
+import joblib
+import numpy as np
+import pytest
+
+from Retrieval.analyzer import index_tokens
+from Retrieval.bm25 import bm25_pipeline, bm25_pipeline_batch
+from Retrieval.bm25_index import BM25Index
+from Retrieval.embedding_store import embedding_rankings, embedding_rankings_batch, normalize_embeddings
+from Retrieval.tf_idf import build_tf_idf_index, get_vocab_index, save_tf_idf_index, tf_idf_pipeline, tf_idf_pipeline_batch, tf_idf_rankings, tf_idf_rankings_batch
+
+
+@pytest.fixture
+def tf_idf_index(tf_idf_model):
+    documents_tokenized, idf_dict, vocab = tf_idf_model
+    document_matrix, doc_norms = build_tf_idf_index(documents_tokenized, idf_dict, vocab)
+    return idf_dict, vocab, document_matrix, doc_norms
+
+
+def assert_top_k(rankings, scores, expected_scores, k, tolerance):
+    # A correct top k up to rounding: the scores are the k best ones, whichever near tie comes first
+    np.testing.assert_allclose(scores, np.sort(expected_scores)[::-1][:k], rtol=tolerance, atol=tolerance)
+    np.testing.assert_allclose(expected_scores[rankings], scores, rtol=tolerance, atol=tolerance)
+
+
+@pytest.mark.parametrize("k", [1, 10, 500])
+def test_tf_idf_batch_is_identical_to_single_queries(tf_idf_index, queries, k):
+    idf_dict, vocab, document_matrix, doc_norms = tf_idf_index
+    vocab_index = get_vocab_index(vocab)
+    results = tf_idf_rankings_batch(queries, idf_dict, vocab_index, document_matrix, doc_norms, k)
+    for query, (rankings, scores) in zip(queries, results):
+        expected_rankings, expected_scores = tf_idf_rankings(query, idf_dict, vocab_index, document_matrix, doc_norms, k)
+        np.testing.assert_array_equal(rankings, expected_rankings)
+        assert scores == expected_scores
+
+
+@pytest.mark.parametrize("k", [1, 10, 500])
+def test_bm25_batch_matches_single_queries(corpus, queries, k):
+    index = BM25Index.build([index_tokens(text) for text in corpus])
+    queries_tokens = [index_tokens(query) for query in queries]
+    for query_tokens, (rankings, scores) in zip(queries_tokens, index.search_batch(queries_tokens, k)):
+        assert len(rankings) == min(k, len(corpus))
+        assert_top_k(rankings, scores, index.get_scores(query_tokens), k, 1e-12)
+
+
+def test_embedding_batch_matches_single_queries():
+    rng = np.random.default_rng(0)
+    store = normalize_embeddings(rng.normal(size=(500, 32)))
+    query_embeddings = rng.normal(size=(20, 32))
+    for query_embedding, (rankings, scores) in zip(query_embeddings, embedding_rankings_batch(query_embeddings, store, 10)):
+        expected_rankings, expected_scores = embedding_rankings(query_embedding, store, 10)
+        all_scores = store @ normalize_embeddings(query_embedding[None])[0]
+        assert_top_k(rankings, scores, all_scores, 10, 1e-6)
+        np.testing.assert_allclose(scores, expected_scores, atol=1e-6)
+
+
+def test_batch_pipelines_return_the_single_query_rankings(corpus, queries, tf_idf_index, tmp_path):
+    idf_dict, vocab, document_matrix, doc_norms = tf_idf_index
+    paths = {name: str(tmp_path / name) for name in ("idf.pkl", "vocab.pkl", "tf_idf_index.npz", "ids.pkl", "bm25.npz")}
+    joblib.dump(dict(idf_dict), paths["idf.pkl"])
+    joblib.dump(vocab, paths["vocab.pkl"])
+    joblib.dump([f"doc{i}" for i in range(len(corpus))], paths["ids.pkl"])
+    save_tf_idf_index(document_matrix, doc_norms, paths["tf_idf_index.npz"])
+    BM25Index.build([index_tokens(text) for text in corpus]).save(paths["bm25.npz"])
+
+    tf_idf_paths = dict(idf_dict_path=paths["idf.pkl"], vocab_path=paths["vocab.pkl"], index_path=paths["tf_idf_index.npz"], ids_path=paths["ids.pkl"], k=20)
+    assert tf_idf_pipeline_batch(queries, **tf_idf_paths) == [tf_idf_pipeline(query, **tf_idf_paths) for query in queries]
+    # Single queries are pruned, the batch is scored exhaustively; without near ties the rankings are the same
+    bm25_paths = dict(index_path=paths["bm25.npz"], ids_path=paths["ids.pkl"], k=20)
+    for query, ranking in zip(queries, bm25_pipeline_batch(queries, **bm25_paths)):
+        assert ranking == bm25_pipeline(query, **bm25_paths)
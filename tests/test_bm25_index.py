@@ -0,0 +1,80 @@
+import numpy as np
+import pytest
+from rank_bm25 import BM25Okapi
+
+from Retrieval.analyzer import index_tokens
+from Retrieval.bm25_index import BM25Index
+
+
+@pytest.fixture
+def documents_tokenized(corpus):
+    return [index_tokens(text) for text in corpus]
+
+
+def assert_same_top_k(result, expected_scores, k):
+    # search sums the term contributions in another order than get_scores: equal up to the last bit
+    docs, scores = result
+    top_scores = np.sort(expected_scores)[::-1][:k]
+    assert len(set(docs.tolist())) == len(docs)
+    np.testing.assert_allclose(scores, top_scores, rtol=1e-12, atol=0)
+    np.testing.assert_allclose(expected_scores[docs], scores, rtol=1e-12, atol=0)
+
+
+def test_scores_are_identical_to_bm25okapi(documents_tokenized, queries):
+    okapi = BM25Okapi(documents_tokenized)
+    built = BM25Index.build(documents_tokenized)
+    converted = BM25Index.from_bm25okapi(okapi)
+    # Repeated query terms; "river" is in most documents, so its idf gets the epsilon floor
+    for query in queries + ["river river harry river", "magic castle magic"]:
+        query_tokens = index_tokens(query)
+        expected = okapi.get_scores(query_tokens)
+        np.testing.assert_array_equal(built.get_scores(query_tokens), expected)
+        np.testing.assert_array_equal(converted.get_scores(query_tokens), expected)
+
+
+@pytest.mark.parametrize("k", [1, 5, 20, 500])
+def test_pruned_search_returns_exhaustive_top_k(documents_tokenized, queries, k):
+    index = BM25Index.build(documents_tokenized)
+    okapi = BM25Okapi(documents_tokenized)
+    for query in queries:
+        query_tokens = index_tokens(query)
+        stats = {}
+        result = index.search(query_tokens, k, stats)
+        assert len(result[0]) == min(k, len(documents_tokenized))
+        assert_same_top_k(result, okapi.get_scores(query_tokens), k)
+        assert stats["postings_scored"] <= stats["postings_total"]
+
+
+def test_pruning_skips_postings():
+    # One rare term and one term in every document: the common term only needs the candidates.
+    # A unique term per document keeps the average idf, and so the floored idf of "common", positive
+    documents_tokenized = [["common"] * (1 + i % 5) + [f"unique{i}"] + (["rare"] if i < 3 else []) for i in range(1000)]
+    index = BM25Index.build(documents_tokenized)
+    stats = {}
+    index.search(["rare", "common"], k=3, stats=stats)
+    assert stats["postings_scored"] < stats["postings_total"] / 10
+
+
+@pytest.mark.parametrize("k", [1, 5, 30, 60])
+def test_negative_idf_falls_back_to_exhaustive_scoring(k):
+    # Most terms are in most documents, so the average idf and with it the epsilon floor are negative
+    documents_tokenized = [["common", "usual"] * (1 + i % 3) + ["alpha", "beta", "gamma", "delta"] + (["rare"] if i % 10 == 0 else []) if i < 45 else ["other"] for i in range(60)]
+    okapi = BM25Okapi(documents_tokenized)
+    index = BM25Index.build(documents_tokenized)
+    assert index.idf[index.vocab["common"]] < 0
+    queries_tokens = [["common"], ["rare", "common"], ["rare", "usual", "usual"], ["rare"]]
+    for query_tokens, result in zip(queries_tokens, index.search_batch(queries_tokens, k)):
+        expected = okapi.get_scores(query_tokens)
+        assert_same_top_k(index.search(query_tokens, k), expected, k)
+        assert_same_top_k(result, expected, k)
+
+
+def test_save_and_load_round_trip(documents_tokenized, queries, tmp_path):
+    index = BM25Index.build(documents_tokenized, k1=1.2, b=0.7)
+    index_path = str(tmp_path / "bm25.npz")
+    index.save(index_path)
+    loaded = BM25Index.load(index_path)
+    assert (loaded.k1, loaded.b) == (1.2, 0.7)
+    for query in queries:
+        query_tokens = index_tokens(query)
+        np.testing.assert_array_equal(loaded.get_scores(query_tokens), index.get_scores(query_tokens))
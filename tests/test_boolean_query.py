@@ -0,0 +1,95 @@
+import numpy as np
+import pytest
+
+from Baseline.boolean_query import boolean_filter, boolean_query_retrieval, intersect_all, intersect_sorted, parse_query
+from Baseline.boolean_retrieval import create_inverted_index, preprocess_text
+
+
+@pytest.fixture
+def documents(corpus):
+    return {f"d{i}": text for i, text in enumerate(corpus)}
+
+
+@pytest.fixture
+def inverted_index(documents):
+    return create_inverted_index(documents, store_positions=True)
+
+
+def contains_phrase(tokens, phrase):
+    return any(tokens[i:i + len(phrase)] == phrase for i in range(len(tokens)))
+
+
+def within(tokens, first, second, distance):
+    first_positions = [i for i, token in enumerate(tokens) if token == first]
+    second_positions = [i for i, token in enumerate(tokens) if token == second]
+    return any(abs(i - j) <= distance for i in first_positions for j in second_positions)
+
+
+# Queries with the predicate every matching document's tokens must satisfy
+QUERIES = [
+    ("harry", lambda t: "harry" in t),
+    ("harry potter", lambda t: "harry" in t and "potter" in t),
+    ("harry AND potter", lambda t: "harry" in t and "potter" in t),
+    ("harry OR dragon", lambda t: "harry" in t or "dragon" in t),
+    ("NOT harry", lambda t: "harry" not in t),
+    ("magic NOT harry NOT potter", lambda t: "magic" in t and "harry" not in t and "potter" not in t),
+    ("(harry OR dragon) AND NOT (castle OR river)", lambda t: ("harry" in t or "dragon" in t) and not ("castle" in t or "river" in t)),
+    ("war OR peace music", lambda t: "war" in t or ("peace" in t and "music" in t)),
+    ('"river bridge"', lambda t: contains_phrase(t, ["river", "bridge"])),
+    ('"river bridge train" OR king', lambda t: contains_phrase(t, ["river", "bridge", "train"]) or "king" in t),
+    ("harry NEAR/3 potter", lambda t: within(t, "harry", "potter", 3)),
+    ("star NEAR/1 planet", lambda t: within(t, "star", "planet", 1)),
+    ("unknown", lambda t: False),
+    ("unknown OR harry", lambda t: "harry" in t),
+]
+
+
+def test_query_syntax():
+    assert parse_query('einstein AND (relativity OR "photoelectric effect") NOT quantum') == ("and", [
+        ("term", "einstein"),
+        ("or", [("term", "relativity"), ("phrase", ["photoelectric", "effect"])]),
+        ("not", ("term", "quantum")),
+    ])
+    assert parse_query("nobel NEAR/5 prize NEAR/5 physics") == ("near", 5, ["nobel", "prize", "physics"])
+    # Lower-case operators are ordinary words
+    assert parse_query("war or peace") == ("and", [("term", "war"), ("term", "or"), ("term", "peace")])
+    assert parse_query("U.S. army") == ("and", [("phrase", ["u", "s"]), ("term", "army")])
+
+
+@pytest.mark.parametrize("query", ["", "(harry", "harry)", "harry AND", '""', '"a b" NEAR/2 c', "a NEAR/2 b NEAR/3 c"])
+def test_invalid_queries_are_rejected(query):
+    with pytest.raises(ValueError):
+        parse_query(query)
+
+
+@pytest.mark.parametrize("query, predicate", QUERIES)
+def test_matches_are_exactly_the_documents_satisfying_the_query(documents, inverted_index, query, predicate):
+    doc_ids = inverted_index.doc_ids
+    matches = boolean_filter(query, inverted_index)
+    assert list(matches) == sorted(matches)
+    expected = [doc_num for doc_num, doc_id in enumerate(doc_ids) if predicate(preprocess_text(documents[doc_id]))]
+    assert matches.tolist() == expected
+
+
+def test_phrases_need_positions(documents):
+    with pytest.raises(ValueError):
+        boolean_filter('"harry potter"', create_inverted_index(documents))
+
+
+def test_matches_are_ranked_by_frequency_of_the_positive_terms(documents, inverted_index):
+    results = boolean_query_retrieval("(harry OR potter) NOT castle", inverted_index, top_n=1000)
+    scores = {doc_id: sum(preprocess_text(documents[doc_id]).count(term) for term in ("harry", "potter")) for doc_id in results}
+    assert all(0 < score for score in scores.values())
+    assert [scores[doc_id] for doc_id in results] == sorted(scores.values(), reverse=True)
+    # Documents matching only through NOT still count as matches
+    assert len(boolean_query_retrieval("NOT harry", inverted_index, top_n=1000)) == len(boolean_filter("NOT harry", inverted_index))
+
+
+def test_galloping_intersection_equals_merge():
+    rng = np.random.default_rng(0)
+    for size_a, size_b in ((5, 10000), (100, 120), (0, 50), (3000, 3)):
+        a = np.unique(rng.integers(0, 20000, size_a)).astype(np.int32)
+        b = np.unique(rng.integers(0, 20000, size_b)).astype(np.int32)
+        np.testing.assert_array_equal(intersect_sorted(a, b), np.intersect1d(a, b))
+    lists = [np.unique(rng.integers(0, 1000, size)).astype(np.int32) for size in (900, 50, 400)]
+    np.testing.assert_array_equal(intersect_all(lists), np.intersect1d(np.intersect1d(lists[0], lists[1]), lists[2]))
@@ -0,0 +1,69 @@
+import heapq
+import json
+
+import pytest
+
+import Baseline.boolean as boolean
+from Baseline.corpus_store import CorpusStore
+from Baseline.boolean_retrieval import boolean_retrieval, create_inverted_index, preprocess_text, retrieve_single_query
+
+
+@pytest.fixture
+def wikipedia_dict(corpus):
+    # Ids out of order, so ties have to be broken by id and not by position
+    return {f"{(i * 37) % 200:03d}": text for i, text in enumerate(corpus)}
+
+
+def legacy_boolean_retrieval(query_text, wikipedia_dict, top_n):
+    # The baseline before postings kept term frequencies: re-tokenize every matching document
+    query_tokens = preprocess_text(query_text)
+    relevant_docs = {doc_id for doc_id, text in wikipedia_dict.items() if set(query_tokens) & set(preprocess_text(text))}
+    doc_scores = [(sum(preprocess_text(wikipedia_dict[doc_id]).count(token) for token in query_tokens), doc_id) for doc_id in relevant_docs]
+    return [doc_id for _, doc_id in heapq.nlargest(top_n, doc_scores)]
+
+
+@pytest.mark.parametrize("top_n", [1, 10, 100, 500])
+def test_rankings_match_the_legacy_baseline(wikipedia_dict, queries, top_n):
+    queries_dict = {str(i): query for i, query in enumerate(queries + ["river river harry"])}
+    inverted_index = create_inverted_index(wikipedia_dict)
+    results = boolean_retrieval(queries_dict, inverted_index, wikipedia_dict, top_n)
+    for query_id, query_text in queries_dict.items():
+        assert results[query_id] == legacy_boolean_retrieval(query_text, wikipedia_dict, top_n)
+
+
+def test_positions_are_stored_per_posting(wikipedia_dict):
+    inverted_index = create_inverted_index(wikipedia_dict, store_positions=True)
+    for term in ("harry", "river"):
+        docs, freqs = inverted_index.get_postings(term)
+        offsets, positions = inverted_index.get_positions(term)
+        assert list(docs) == sorted(docs)
+        for i, (doc_num, freq) in enumerate(zip(docs, freqs)):
+            tokens = preprocess_text(wikipedia_dict[inverted_index.doc_ids[doc_num]])
+            assert offsets[i + 1] - offsets[i] == freq
+            assert [tokens[p] for p in positions[offsets[i]:offsets[i + 1]]] == [term] * freq
+
+
+def test_single_query_builds_and_reuses_the_saved_index(wikipedia_dict, tmp_path):
+    index_path = str(tmp_path / "inverted_index")
+    expected = legacy_boolean_retrieval("harry potter castle", wikipedia_dict, 20)
+    assert retrieve_single_query("harry potter castle", wikipedia_dict, 20, index_path) == expected
+    # The saved index is used: the documents are no longer needed
+    assert retrieve_single_query("harry potter castle", {}, 20, index_path) == expected
+
+
+def test_boolean_pipeline_loads_the_index_once_and_follows_the_store(monkeypatch, tmp_path):
+    collection = tmp_path / "collection.json"
+    collection.write_text(json.dumps([{"wikipedia_id": str(i), "text": [f"harry document {i}"]} for i in range(5)]))
+    paths = {"wikipedia_data_path": str(collection), "corpus_store_path": str(tmp_path / "store"), "inverted_index_path": str(tmp_path / "index")}
+    loads = []
+    load_inverted_index = boolean.load_inverted_index
+    monkeypatch.setattr(boolean, "load_inverted_index", lambda path: loads.append(path) or load_inverted_index(path))
+
+    assert len(boolean.boolean_pipeline("harry", top_n=10, **paths)) == 5
+    assert boolean.boolean_pipeline("document 3", top_n=1, **paths) == ["3"]
+    assert len(loads) == 1
+
+    # Documents appended to the store are found once the index has been rebuilt
+    CorpusStore(paths["corpus_store_path"]).extend([{"wikipedia_id": "new", "text": ["harry potter potter"]}])
+    assert boolean.boolean_pipeline("potter", top_n=10, **paths) == ["new"]
+    assert len(loads) == 2
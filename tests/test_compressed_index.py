@@ -0,0 +1,149 @@
+import json
+import os
+
+import numpy as np
+import pytest
+
+from Baseline.boolean_query import boolean_query_retrieval
+from Baseline.boolean_retrieval import create_inverted_index, load_inverted_index, preprocess_text, retrieve_single_query, save_inverted_index
+from Retrieval.bm25_index import BM25Index
+import Retrieval.compressed_index as compressed_index
+from Retrieval.compressed_index import (
+    CompressedInvertedIndex,
+    StringTable,
+    _delta_decode,
+    _delta_encode,
+    concat_ranges,
+    sorted_order,
+    varint_decode,
+    varint_encode,
+)
+
+
+@pytest.fixture
+def documents(corpus):
+    # Some documents without any token, and non-ASCII ids
+    documents = {f"d{i}": text for i, text in enumerate(corpus)}
+    documents.update({"empty": "", "ünïcode-id": "Café crème, über alles"})
+    return documents
+
+
+@pytest.fixture
+def index_pair(documents, tmp_path):
+    inverted_index = create_inverted_index(documents, store_positions=True)
+    index_path = str(tmp_path / "inverted_index")
+    save_inverted_index(inverted_index, index_path)
+    return inverted_index, load_inverted_index(index_path)
+
+
+def test_varint_round_trip():
+    boundaries = [0, 1, 127, 128, 255, 2 ** 14 - 1, 2 ** 14, 2 ** 21 - 1, 2 ** 21, 2 ** 28 - 1, 2 ** 28, 2 ** 32 - 1]
+    values = np.concatenate([boundaries, np.random.default_rng(0).integers(0, 2 ** 32, 1000)])
+    encoded = varint_encode(values)
+    assert encoded.dtype == np.uint8
+    assert len(varint_encode(boundaries)) == sum([1, 1, 1, 2, 2, 2, 3, 3, 4, 4, 5, 5])
+    np.testing.assert_array_equal(varint_decode(encoded), values)
+    assert len(varint_decode(varint_encode([]))) == 0
+
+
+def test_delta_coding_restarts_at_every_group():
+    group_offsets = np.array([0, 3, 3, 5, 9])
+    values = np.array([4, 7, 20, 0, 2, 1, 5, 6, 100])
+    gaps = _delta_encode(values, group_offsets)
+    np.testing.assert_array_equal(gaps, [4, 3, 13, 0, 2, 1, 4, 1, 94])
+    np.testing.assert_array_equal(_delta_decode(gaps, group_offsets), values)
+
+
+def test_concat_ranges():
+    np.testing.assert_array_equal(concat_ranges([5, 0, 10], [2, 0, 3]), [5, 6, 10, 11, 12])
+    assert len(concat_ranges([], [])) == 0
+
+
+def test_string_table_lookup():
+    strings = ["river", "Zürich", "", "apple", "äpfel", "b"]
+    encoded = [s.encode("utf-8") for s in strings]
+    offsets = np.cumsum([0] + [len(e) for e in encoded])
+    table = StringTable(np.frombuffer(b"".join(encoded), dtype=np.uint8), offsets, sorted_order(strings))
+    assert list(table) == strings and table[-1] == "b"
+    for i, s in enumerate(strings):
+        assert table.index(s) == i
+    assert table.index("missing") == -1
+    with pytest.raises(IndexError):
+        table[len(strings)]
+
+
+def test_postings_and_positions_round_trip(documents, index_pair):
+    inverted_index, compressed = index_pair
+    assert isinstance(compressed, CompressedInvertedIndex)
+    assert list(compressed.doc_ids) == inverted_index.doc_ids
+    assert compressed.num_docs == len(inverted_index.doc_ids) and compressed.has_positions
+    for term, (docs, freqs) in inverted_index.postings.items():
+        assert term in compressed
+        assert compressed.document_frequency(term) == len(docs)
+        compressed_docs, compressed_freqs = compressed.get_postings(term)
+        np.testing.assert_array_equal(compressed_docs, docs)
+        np.testing.assert_array_equal(compressed_freqs, freqs)
+        for expected, actual in zip(inverted_index.get_positions(term), compressed.get_positions(term)):
+            np.testing.assert_array_equal(actual, expected)
+    assert compressed.get_postings("missing") is None and compressed.get_positions("missing") is None
+    # Every token is counted in the document lengths
+    np.testing.assert_array_equal(compressed.doc_lengths, [len(preprocess_text(documents[doc_id])) for doc_id in inverted_index.doc_ids])
+
+
+def test_decode_all_matches_the_postings(index_pair):
+    inverted_index, compressed = index_pair
+    terms, term_offsets, doc_nums, term_freqs = compressed.decode_all()
+    assert terms == sorted(inverted_index.postings, key=lambda term: term.encode("utf-8"))
+    for t, term in enumerate(terms):
+        docs, freqs = inverted_index.get_postings(term)
+        np.testing.assert_array_equal(doc_nums[term_offsets[t]:term_offsets[t + 1]], docs)
+        np.testing.assert_array_equal(term_freqs[term_offsets[t]:term_offsets[t + 1]], freqs)
+
+
+def test_retrieval_is_the_same_on_the_compressed_index(documents, index_pair, queries, tmp_path):
+    inverted_index, compressed = index_pair
+    for query in ('"river bridge" OR harry NOT castle', "star NEAR/2 planet", "NOT music"):
+        assert boolean_query_retrieval(query, compressed, 50) == boolean_query_retrieval(query, inverted_index, 50)
+    index_path = str(tmp_path / "inverted_index")
+    for query in queries:
+        assert retrieve_single_query(query, {}, 20, index_path) == retrieve_single_query(query, documents, 20, str(tmp_path / "built"))
+
+
+def test_bm25_from_compressed_index(documents, index_pair, queries):
+    _, compressed = index_pair
+    index = BM25Index.from_compressed_index(compressed)
+    expected = BM25Index.build([preprocess_text(text) for text in documents.values()])
+    for query in queries:
+        query_tokens = preprocess_text(query)
+        # idf values are summed in another term order for the epsilon floor, so equal up to rounding
+        np.testing.assert_allclose(index.get_scores(query_tokens), expected.get_scores(query_tokens), rtol=1e-12)
+
+
+def test_unknown_format_versions_are_rejected(index_pair, tmp_path):
+    meta_path = os.path.join(str(tmp_path / "inverted_index"), "meta.json")
+    with open(meta_path) as f:
+        meta = json.load(f)
+    meta["format_version"] += 1
+    with open(meta_path, "w") as f:
+        json.dump(meta, f)
+    with pytest.raises(ValueError):
+        CompressedInvertedIndex(str(tmp_path / "inverted_index"))
+
+
+def test_interrupted_rewrite_cannot_be_opened(index_pair, monkeypatch, tmp_path):
+    inverted_index, compressed = index_pair
+    index_path = str(tmp_path / "inverted_index")
+    term = next(iter(inverted_index.postings))
+    expected = [np.array(part) for part in compressed.get_postings(term)]
+
+    def fail(*args):
+        raise OSError("disk full")
+
+    monkeypatch.setattr(compressed_index, "write_string_table", fail)
+    with pytest.raises(OSError):
+        save_inverted_index(create_inverted_index({"x": "other words"}), index_path)
+    assert not os.path.exists(os.path.join(index_path, "meta.json"))
+    with pytest.raises(FileNotFoundError):
+        CompressedInvertedIndex(index_path)
+    # Readers that had the old files open keep reading them
+    assert [list(part) for part in compressed.get_postings(term)] == [list(part) for part in expected]
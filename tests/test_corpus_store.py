@@ -0,0 +1,50 @@
+import os
+
+import pytest
+
+import Baseline.corpus_store as corpus_store
+from Baseline.boolean_retrieval import preprocess_text
+from Baseline.corpus_store import CorpusStore, compile_corpus
+from Retrieval.analyzer import sanitize_text
+
+
+def make_docs(ids):
+    return [{"wikipedia_id": str(i), "text": [f"Document {i} is about topic {i % 3}.", "More text, here!"]} for i in ids]
+
+
+def test_store_matches_sanitized_documents(tmp_path):
+    docs = make_docs(range(20)) + make_docs([3])
+    store = compile_corpus(docs, str(tmp_path / "store"))
+    assert len(store) == 20
+    assert list(store) == [str(i) for i in range(20)]
+    for doc in docs[:20]:
+        text = sanitize_text(" ".join(doc["text"]))
+        doc_num = store.doc_num(doc["wikipedia_id"])
+        assert store[doc["wikipedia_id"]] == text
+        assert store.tokens(doc_num) == preprocess_text(text)
+    assert "missing" not in store
+
+
+def test_extend_appends_new_documents_only(tmp_path):
+    store = compile_corpus(make_docs(range(10)), str(tmp_path / "store"))
+    store, count = store.extend(make_docs(range(5, 30)), limit=12)
+    assert count == 12
+    assert len(store) == 22
+    assert store["21"] == sanitize_text(" ".join(make_docs([21])[0]["text"]))
+
+
+def test_interrupted_extend_leaves_no_valid_looking_store(tmp_path, monkeypatch):
+    store_path = str(tmp_path / "store")
+    store = compile_corpus(make_docs(range(10)), store_path)
+
+    def crash(*args):
+        raise OSError("disk full")
+
+    monkeypatch.setattr(corpus_store, "write_string_table", crash)
+    with pytest.raises(OSError):
+        store.extend(make_docs(range(10, 20)))
+    assert not os.path.exists(os.path.join(store_path, "meta.json"))
+    monkeypatch.undo()
+    # A store without meta.json is compiled again from scratch
+    store = compile_corpus(make_docs(range(15)), store_path)
+    assert list(store) == [str(i) for i in range(15)]
@@ -0,0 +1,83 @@
+import importlib
+import sys
+import types
+
+import numpy as np
+import pytest
+
+
+class FakeSentenceTransformer:
+    """
+    Stands in for the MiniLM model: the embedding of a text is derived from its length,
+    so every document can be checked against the assembled store.
+    """
+    calls = []
+    fail_after = None
+
+    def __init__(self, model_name, device=None):
+        self.model_name = model_name
+
+    def encode(self, texts, batch_size=64, convert_to_numpy=True):
+        if self.fail_after is not None and len(self.calls) >= self.fail_after:
+            raise RuntimeError("interrupted")
+        self.calls.append(list(texts))
+        return np.array([embed(text) for text in texts], dtype=np.float32)
+
+
+def embed(text):
+    return [len(text), 1.0, -len(text) % 7]
+
+
+@pytest.fixture
+def embedding_job(monkeypatch):
+    module = types.ModuleType("sentence_transformers")
+    module.SentenceTransformer = FakeSentenceTransformer
+    monkeypatch.setitem(sys.modules, "sentence_transformers", module)
+    monkeypatch.setattr(FakeSentenceTransformer, "calls", [])
+    monkeypatch.setattr(FakeSentenceTransformer, "fail_after", None)
+    monkeypatch.delitem(sys.modules, "Retrieval.embedding_job", raising=False)
+    yield importlib.import_module("Retrieval.embedding_job")
+    sys.modules.pop("Retrieval.embedding_job", None)
+
+
+@pytest.fixture
+def documents():
+    rng = np.random.default_rng(0)
+    return ["x" * int(length) for length in rng.integers(1, 100, size=25)]
+
+
+def test_shards_are_length_sorted_and_assembled_in_document_order(embedding_job, documents, tmp_path):
+    output_dir, store_path = str(tmp_path / "shards"), str(tmp_path / "store.npy")
+    manifest = embedding_job.embed_corpus(documents, output_dir, shard_size=10)
+    assert manifest["completed"] == [0, 1, 2]
+    for texts in FakeSentenceTransformer.calls:
+        assert [len(text) for text in texts] == sorted(len(text) for text in texts)
+    embedding_job.assemble_embedding_store(output_dir, store_path)
+    expected = np.array([embed(document) for document in documents], dtype=np.float32)
+    expected /= np.linalg.norm(expected, axis=1, keepdims=True)
+    np.testing.assert_allclose(np.load(store_path), expected, rtol=1e-6)
+
+
+def test_interrupted_run_resumes_at_the_first_missing_shard(embedding_job, documents, tmp_path):
+    output_dir = str(tmp_path / "shards")
+    FakeSentenceTransformer.fail_after = 2
+    with pytest.raises(RuntimeError):
+        embedding_job.embed_corpus(documents, output_dir, shard_size=10)
+    assert embedding_job.load_manifest(output_dir)["completed"] == [0, 1]
+    with pytest.raises(ValueError):
+        embedding_job.assemble_embedding_store(output_dir, str(tmp_path / "store.npy"))
+
+    FakeSentenceTransformer.fail_after = None
+    FakeSentenceTransformer.calls = []
+    manifest = embedding_job.embed_corpus(documents, output_dir, shard_size=10)
+    assert manifest["completed"] == [0, 1, 2]
+    assert len(FakeSentenceTransformer.calls) == 1
+
+
+def test_shards_of_another_corpus_are_rejected(embedding_job, documents, tmp_path):
+    output_dir = str(tmp_path / "shards")
+    embedding_job.embed_corpus(documents, output_dir, shard_size=10)
+    with pytest.raises(ValueError):
+        embedding_job.embed_corpus(documents[::-1], output_dir, shard_size=10)
+    with pytest.raises(ValueError):
+        embedding_job.embed_corpus(documents, output_dir, shard_size=5)
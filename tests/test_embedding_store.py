@@ -0,0 +1,42 @@
+import numpy as np
+import pytest
+
+from Retrieval.embedding_store import embedding_rankings, load_embedding_store, normalize_embeddings, save_embedding_store
+
+
+@pytest.fixture
+def embeddings():
+    rng = np.random.default_rng(0)
+    return rng.normal(size=(300, 32))
+
+
+def cosine_similarities(query_embedding, embeddings):
+    # The cosine similarity the retriever computed before the store existed, in float64
+    return embeddings @ query_embedding / (np.linalg.norm(embeddings, axis=1) * np.linalg.norm(query_embedding))
+
+
+def test_normalize_embeddings_keeps_zero_rows():
+    normalized = normalize_embeddings([[3.0, 4.0], [0.0, 0.0]])
+    assert normalized.dtype == np.float32
+    np.testing.assert_allclose(normalized, [[0.6, 0.8], [0.0, 0.0]], rtol=1e-6)
+
+
+def test_store_is_normalized_and_memory_mapped(embeddings, tmp_path):
+    store_path = str(tmp_path / "store.npy")
+    save_embedding_store(list(embeddings), store_path)
+    store = load_embedding_store(store_path)
+    assert isinstance(store, np.memmap)
+    assert store.dtype == np.float32 and store.shape == embeddings.shape
+    np.testing.assert_allclose(np.linalg.norm(store, axis=1), 1, rtol=1e-6)
+
+
+def test_rankings_match_cosine_similarity(embeddings, tmp_path):
+    store_path = str(tmp_path / "store.npy")
+    save_embedding_store(embeddings, store_path)
+    store = load_embedding_store(store_path)
+    rng = np.random.default_rng(1)
+    for query_embedding in rng.normal(size=(10, 32)):
+        expected = cosine_similarities(query_embedding, embeddings)
+        rankings, scores = embedding_rankings(query_embedding * 5, store, 10)
+        np.testing.assert_array_equal(rankings, np.argsort(-expected)[:10])
+        np.testing.assert_allclose(scores, expected[rankings], atol=1e-6)
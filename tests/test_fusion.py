@@ -0,0 +1,127 @@
+from collections import defaultdict
+
+import numpy as np
+import pytest
+
+from Ranking.RRF.RRF_implementation import (
+    reciprocal_rank_fusion,
+    reciprocal_rank_fusion_multiple_lists,
+    reciprocal_rank_fusion_six,
+    reciprocal_rank_fusion_three,
+    reciprocal_rank_fusion_two,
+)
+from Ranking.RRF.fusion import encode_rankings, fuse, fuse_lists, fuse_runs
+
+
+def legacy_rrf(rank_lists, K=60, top_n=100):
+    # The loop every reciprocal_rank_fusion_* function ran before the vectorized engine
+    rrf_map = defaultdict(float)
+    for rank_list in rank_lists:
+        for rank, doc in enumerate(rank_list, 1):
+            rrf_map[doc] += 1 / (rank + K)
+    sorted_docs = sorted(rrf_map.items(), key=lambda x: x[1], reverse=True)
+    return [doc for doc, score in sorted_docs[:top_n]]
+
+
+def reference_comb(rank_lists, score_lists, method, weights, normalization, top_n):
+    fused = defaultdict(float)
+    hits = defaultdict(int)
+    for rank_list, scores, weight in zip(rank_lists, score_lists, weights):
+        scores = np.asarray(scores, dtype=np.float64)
+        if normalization == "minmax" and len(scores):
+            spread = scores.max() - scores.min()
+            scores = (scores - scores.min()) / spread if spread > 0 else np.ones_like(scores)
+        elif normalization == "zscore" and len(scores):
+            std = scores.std()
+            scores = (scores - scores.mean()) / std if std > 0 else np.zeros_like(scores)
+        for doc, score in zip(rank_list, scores):
+            fused[doc] += weight * score
+            hits[doc] += 1
+    if method == "combmnz":
+        fused = {doc: score * hits[doc] for doc, score in fused.items()}
+    return [doc for doc, _ in sorted(fused.items(), key=lambda x: x[1], reverse=True)[:top_n]]
+
+
+def random_queries(num_queries, num_systems, seed=0, num_docs=60, max_depth=40):
+    # Small document pool so lists overlap and RRF scores tie often
+    rng = np.random.default_rng(seed)
+    queries = []
+    for _ in range(num_queries):
+        lists = []
+        for _ in range(num_systems):
+            depth = int(rng.integers(0, max_depth))
+            lists.append([f"doc{d}" for d in rng.choice(num_docs, depth, replace=False)])
+        queries.append(lists)
+    return queries
+
+
+@pytest.mark.parametrize("num_systems", [1, 2, 3, 6, 10])
+@pytest.mark.parametrize("top_n", [1, 10, 100])
+def test_rrf_equals_the_legacy_loop(num_systems, top_n):
+    queries = random_queries(30, num_systems, seed=num_systems)
+    assert fuse_lists(queries, top_n=top_n) == [legacy_rrf(lists, top_n=top_n) for lists in queries]
+
+
+def test_ties_keep_first_appearance():
+    # Every document of both lists ties with the one at the same rank in the other list
+    lists = [["a", "b", "c"], ["x", "y", "z"]]
+    assert fuse_lists([lists]) == [legacy_rrf(lists)] == [["a", "x", "b", "y", "c", "z"]]
+    # Repeated documents inside a list contribute once per occurrence, as in the loop
+    lists = [["a", "b", "a"], ["b"]]
+    assert fuse_lists([lists]) == [legacy_rrf(lists)]
+    # Ids are kept as given, so 1 and "1" stay different documents
+    lists = [[1, "1", 2], ["2", 1]]
+    assert fuse_lists([lists]) == [legacy_rrf(lists)]
+
+
+def test_legacy_entry_points():
+    (l1, l2, l3, l4, l5, l6), = random_queries(1, 6, seed=1)
+    assert reciprocal_rank_fusion_two(l1, l2, K=10, top_n=20) == legacy_rrf([l1, l2], K=10, top_n=20)
+    assert reciprocal_rank_fusion_three(l1, l2, l3) == legacy_rrf([l1, l2, l3])
+    assert reciprocal_rank_fusion_six(l1, l2, l3, l4, l5, l6) == legacy_rrf([l1, l2, l3, l4, l5, l6])
+    queries = random_queries(5, 3, seed=2)
+    json_input = [{f"q{i}": lists} for i, lists in enumerate(queries)]
+    assert reciprocal_rank_fusion(json_input, top_n=15) == [{f"q{i}": legacy_rrf(lists, top_n=15)} for i, lists in enumerate(queries)]
+    runs = [[{f"q{i}": [int(doc[3:]) for doc in lists[s]]} for i, lists in enumerate(queries)] for s in range(3)]
+    expected = {f"q{i}": legacy_rrf([[doc[3:] for doc in ranked] for ranked in lists]) for i, lists in enumerate(queries)}
+    assert reciprocal_rank_fusion_multiple_lists(runs) == expected
+
+
+@pytest.mark.parametrize("method", ["combsum", "combmnz"])
+@pytest.mark.parametrize("normalization", [None, "minmax", "zscore"])
+def test_score_fusion_equals_a_reference(method, normalization):
+    queries = random_queries(20, 3, seed=3)
+    rng = np.random.default_rng(4)
+    scores = [[sorted(rng.random(len(ranked)).tolist(), reverse=True) for ranked in lists] for lists in queries]
+    weights = [1.0, 0.5, 2.0]
+    fused = fuse_lists(queries, method, weights, normalization=normalization, top_n=25, scores=scores)
+    for lists, score_lists, result in zip(queries, scores, fused):
+        assert result == reference_comb(lists, score_lists, method, weights, normalization, 25)
+
+
+def test_score_fusion_without_scores_uses_ranks():
+    queries = random_queries(10, 2, seed=5)
+    depth = max(len(ranked) for lists in queries for ranked in lists)
+    rank_scores = [[[(depth - r) / depth for r in range(len(ranked))] for ranked in lists] for lists in queries]
+    fused = fuse_lists(queries, "combsum", top_n=30)
+    for lists, score_lists, result in zip(queries, rank_scores, fused):
+        assert result == reference_comb(lists, score_lists, "combsum", [1, 1], None, 30)
+
+
+def test_fuse_pads_short_results():
+    doc_ids, _, doc_map = encode_rankings([[["a", "b"], ["b"]], [[], []]])
+    fused_docs, fused_scores = fuse(doc_ids, top_n=4)
+    assert fused_docs.tolist() == [[doc_map.ids["b"], doc_map.ids["a"], -1, -1], [-1, -1, -1, -1]]
+    assert np.isneginf(fused_scores[0, 2:]).all() and np.isneginf(fused_scores[1]).all()
+    with pytest.raises(ValueError):
+        fuse(doc_ids, method="borda")
+
+
+def test_fuse_runs_accepts_both_run_layouts():
+    tf_idf = {"q1": ["a", "b"], "q2": ["c"]}
+    bm25 = [{"q1": ["b", "c"]}, {"q3": ["d"]}]
+    assert fuse_runs([tf_idf, bm25]) == {
+        "q1": legacy_rrf([["a", "b"], ["b", "c"]]),
+        "q2": ["c"],
+        "q3": ["d"],
+    }
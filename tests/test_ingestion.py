@@ -0,0 +1,50 @@
+import json
+
+import pytest
+
+from Baseline.ingestion import analyze_records, iter_json_array, iter_json_records
+from Retrieval.analyzer import index_tokens, sanitize_text, word_tokens
+
+ARRAYS = [
+    [],
+    [1.5e10],
+    [1, -2.25, 3e-5, 10, True, None, "a,]b"],
+    [{"wikipedia_id": "1", "text": ["Hello, World!", "[x]"]}, {"wikipedia_id": "2", "text": []}],
+    [[1, [2, 3]], {"a": [4.5]}, "end"],
+]
+
+
+@pytest.mark.parametrize("data", ARRAYS)
+@pytest.mark.parametrize("chunk_size", [1, 2, 3, 7, 1 << 20])
+def test_iter_json_array_matches_json_load(tmp_path, data, chunk_size):
+    path = tmp_path / "data.json"
+    path.write_text(json.dumps(data, indent=1))
+    assert list(iter_json_array(str(path), chunk_size)) == data
+    path.write_text(json.dumps(data, separators=(",", ":")))
+    assert list(iter_json_array(str(path), chunk_size)) == data
+
+
+@pytest.mark.parametrize("text", ["[1,,2]", "[,1]", "[1,]", "[1 2]", "[1", "{}", "[1x]"])
+@pytest.mark.parametrize("chunk_size", [1, 3, 1 << 20])
+def test_iter_json_array_rejects_malformed_arrays(tmp_path, text, chunk_size):
+    path = tmp_path / "data.json"
+    path.write_text(text)
+    with pytest.raises(ValueError):
+        list(iter_json_array(str(path), chunk_size))
+
+
+def test_iter_json_records_reads_jsonl(tmp_path):
+    path = tmp_path / "data.jsonl"
+    path.write_text('{"a": 1}\n\n{"a": 2}\n')
+    assert list(iter_json_records(str(path))) == [{"a": 1}, {"a": 2}]
+
+
+@pytest.mark.parametrize("num_workers", [0, 2])
+def test_analyze_records_keeps_order(num_workers):
+    records = [{"wikipedia_id": str(i), "text": [f"Paragraph {i}, about Tokens!", "Second paragraph."]} for i in range(50)]
+    analyzed = list(analyze_records(records, num_workers=num_workers, chunk_size=7, max_pending=2))
+    assert [doc[0] for doc in analyzed] == [str(i) for i in range(50)]
+    for (wikipedia_id, text, words, tokens), record in zip(analyzed, records):
+        assert text == sanitize_text(" ".join(record["text"]))
+        assert words == word_tokens(text)
+        assert tokens == index_tokens(text)
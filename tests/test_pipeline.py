@@ -0,0 +1,149 @@
+import importlib
+import json
+import sys
+import time
+import types
+
+import pytest
+
+
+def slow(seconds, value):
+    time.sleep(seconds)
+    return value
+
+
+@pytest.fixture
+def main_module(monkeypatch, tmp_path):
+    """
+    Imports main with the LLM agents and retrievers replaced by fast stubs.
+    """
+    stubs = {
+        "Agents.togetherAIAgent": {"generate_article_from_query": lambda query: "article"},
+        "Agents.wikiAgent": {"get_wiki_data": lambda keywords: ["wiki " + keywords]},
+        "Agents.rankerAgent": {"rankerAgent": lambda answers: ("agent1", answers["agent1"])},
+        "Query_Modification.QueryModification": {
+            "query_Modifier": lambda query: query + " modified",
+            "getKeywords": lambda query: "keywords",
+        },
+        "Retrieval.tf_idf": {"tf_idf_pipeline_batch": lambda queries, k=100: [["1", "2"] for _ in queries]},
+        "Retrieval.bm25": {"bm25_pipeline_batch": lambda queries, k=100: [["2", "3"] for _ in queries]},
+        "Retrieval.vision": {"vision_pipeline_batch": lambda queries, k=100: [["3"] for _ in queries]},
+        "Retrieval.openSource": {"open_source_pipeline_batch": lambda queries, k=100: [["2", "1"] for _ in queries]},
+        "Baseline.boolean": {"boolean_pipeline": lambda query, top_n=100: ["1"]},
+        "AnswerGeneration.getAnswer": {
+            "generate_answer_withContext": lambda query, context: f"answer({query}|{context})",
+            "generate_answer_zeroShot": lambda query: "zero shot",
+        },
+    }
+    for name, attributes in stubs.items():
+        module = types.ModuleType(name)
+        module.__dict__.update(attributes)
+        monkeypatch.setitem(sys.modules, name, module)
+    monkeypatch.delitem(sys.modules, "main", raising=False)
+    main = importlib.import_module("main")
+
+    documents_path = tmp_path / "documents.json"
+    documents_path.write_text(json.dumps([{"wikipedia_id": doc, "text": ["text of", doc]} for doc in "123"]))
+    monkeypatch.setattr(main, "DOCUMENTS_PATH", str(documents_path))
+    yield main
+    sys.modules.pop("main", None)
+
+
+def test_process_query_fuses_rankings_and_answers(main_module):
+    pipeline = main_module.QAPipeline({"cache": None})
+    result = pipeline.process_query("Who is Harry Potter?")
+    assert result["modified_query"] == "Who is Harry Potter? modified"
+    assert result["dropped_stages"] == []
+    assert result["retrieval_results"]["tf_idf_bm25_open_RRF_Ranking"] == ["2", "1", "3"]
+    assert result["answer_candidates"]["agent1"] == "answer(Who is Harry Potter?|wiki keywords)"
+    assert result["best_answer"] == result["answer_candidates"]["agent1"]
+
+
+def test_queued_tasks_do_not_use_up_their_deadline(main_module, monkeypatch):
+    monkeypatch.setattr(main_module, "query_Modifier", lambda query: slow(0.1, query + " modified"))
+    pipeline = main_module.QAPipeline({"cache": None, "max_workers": 2, "stage_deadlines": {"query_modification": 0.3}})
+    results = pipeline.process_queries([f"query {i}" for i in range(12)])
+    assert all("modified_query" not in result["dropped_stages"] for result in results)
+    assert all(result["modified_query"] is not None for result in results)
+
+
+def test_late_tasks_are_dropped(main_module, monkeypatch):
+    monkeypatch.setattr(main_module, "query_Modifier", lambda query: slow(0.5, query + " modified"))
+    pipeline = main_module.QAPipeline({"cache": None, "stage_deadlines": {"query_modification": 0.1}})
+    result = pipeline.process_query("query")
+    assert result["modified_query"] is None
+    assert "modified_query" in result["dropped_stages"]
+    assert "tf_idf_bm25_open_RRF_Ranking_modified" not in result["retrieval_results"]
+    assert result["best_answer"] is not None
+
+
+def test_batch_retrieval_does_not_wait_for_llm_calls(main_module, monkeypatch):
+    monkeypatch.setattr(main_module, "query_Modifier", lambda query: slow(0.02, query + " modified"))
+    monkeypatch.setattr(main_module, "generate_article_from_query", lambda query: slow(0.02, "article"))
+    # A batch retrieval task takes longer than the per-query deadline, but not per query
+    monkeypatch.setattr(main_module, "tf_idf_pipeline_batch", lambda queries, k=100: slow(0.005 * len(queries), [["1", "2"] for _ in queries]))
+    pipeline = main_module.QAPipeline({"cache": None, "max_workers": 4, "stage_deadlines": {"retrieval": 0.05}})
+    results = pipeline.process_queries([f"query {i}" for i in range(30)])
+    for result in results:
+        assert result["dropped_stages"] == []
+        assert result["retrieval_results"]["tf_idf_bm25_open_RRF_Ranking"] == ["2", "1", "3"]
+        assert "tf_idf_bm25_open_RRF_Ranking" in result["answer_candidates"]
+
+
+def test_partial_cache_hits_skip_cached_stages(main_module, monkeypatch):
+    calls = []
+    monkeypatch.setattr(main_module, "query_Modifier", lambda query: calls.append(query) or query + " modified")
+    pipeline = main_module.QAPipeline({"cache": {"max_entries": 100}})
+    first = pipeline.process_query("Who is Harry Potter?")
+    assert calls == ["Who is Harry Potter?"]
+
+    # Entries expire and are evicted independently of each other
+    for stage in ("result", "modified_query", "answer_candidates"):
+        del pipeline.cache._entries[pipeline.cache.key(stage, "who is harry potter?")]
+    monkeypatch.setattr(main_module, "tf_idf_pipeline_batch", lambda queries, k=100: pytest.fail("rankings were cached"))
+    monkeypatch.setattr(main_module, "query_Modifier", lambda query: 1 / 0)
+    second = pipeline.process_query("who is harry potter?")
+    assert second["modified_query"] == first["modified_query"]
+    assert second["retrieval_results"] == first["retrieval_results"]
+    assert set(second["answer_candidates"]) == set(first["answer_candidates"])
+    assert pipeline.cache.get_stats()["rankings"]["hits"] == 1
+
+
+def test_full_cache_hit_and_batch_repeats(main_module, monkeypatch):
+    calls = []
+    monkeypatch.setattr(main_module, "query_Modifier", lambda query: calls.append(query) or query + " modified")
+    pipeline = main_module.QAPipeline({"cache": {}})
+    results = pipeline.process_queries(["Who is Harry?", "who is  harry?", "Other"])
+    assert len(calls) == 2
+    assert results[1]["original_query"] == "who is  harry?"
+    assert results[1]["best_answer"] == results[0]["best_answer"]
+    again = pipeline.process_query("WHO IS HARRY?")
+    assert len(calls) == 2
+    assert again["best_answer"] == results[0]["best_answer"]
+
+
+def test_changed_index_files_invalidate_the_cache(main_module, monkeypatch):
+    calls = []
+    monkeypatch.setattr(main_module, "query_Modifier", lambda query: calls.append(query) or query + " modified")
+    pipeline = main_module.QAPipeline({"cache": {}})
+    pipeline.process_query("Who is Harry?")
+    pipeline.process_query("Who is Harry?")
+    assert len(calls) == 1
+    with open(main_module.DOCUMENTS_PATH, "a") as f:
+        f.write("\n")
+    pipeline.process_query("Who is Harry?")
+    assert len(calls) == 2
+
+
+def test_tasks_that_never_start_are_cancelled(main_module):
+    executor = main_module.ThreadPoolExecutor(1)
+    release = main_module.threading.Event()
+    blocking = main_module.StageTask(executor, 5, release.wait, ())
+    queued = main_module.StageTask(executor, 0.1, lambda: "late", ())
+    start = time.monotonic()
+    assert not queued.wait()
+    assert time.monotonic() - start < 1
+    assert queued.future.cancelled()
+    release.set()
+    assert blocking.wait()
+    executor.shutdown()
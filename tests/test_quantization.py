@@ -0,0 +1,67 @@
+import numpy as np
+import pytest
+
+from Retrieval.embedding_store import embedding_rankings, normalize_embeddings
+from Retrieval.quantization import QuantizedEmbeddingStore, evaluate_quantization
+
+SETTINGS = [{"mode": "float16"}, {"mode": "int8"}, {"mode": "pq", "num_subspaces": 8, "num_iterations": 5}]
+
+
+@pytest.fixture
+def embeddings():
+    rng = np.random.default_rng(0)
+    topics = rng.normal(size=(20, 32))
+    return topics[rng.integers(0, 20, size=1000)] + 0.5 * rng.normal(size=(1000, 32))
+
+
+@pytest.fixture
+def query_embeddings():
+    return np.random.default_rng(1).normal(size=(10, 32))
+
+
+@pytest.mark.parametrize("setting, tolerance", list(zip(SETTINGS, [1e-3, 0.02, 0.2])))
+def test_scores_approximate_cosine_similarity(embeddings, query_embeddings, setting, tolerance):
+    store = QuantizedEmbeddingStore.build(embeddings, **setting)
+    exact = normalize_embeddings(embeddings)
+    for query_embedding in normalize_embeddings(query_embeddings):
+        np.testing.assert_allclose(store.scores(query_embedding * 3), exact @ query_embedding, atol=tolerance)
+
+
+@pytest.mark.parametrize("setting", SETTINGS)
+def test_rescoring_every_document_is_exact_search(embeddings, query_embeddings, setting):
+    store = QuantizedEmbeddingStore.build(embeddings, **setting)
+    exact = normalize_embeddings(embeddings)
+    for query_embedding in query_embeddings:
+        rankings, scores = store.search(query_embedding, k=10, rescore=len(exact), exact_embeddings=exact)
+        expected_rankings, expected_scores = embedding_rankings(query_embedding, exact, 10)
+        np.testing.assert_array_equal(rankings, expected_rankings)
+        np.testing.assert_allclose(scores, expected_scores, rtol=1e-6)
+
+
+@pytest.mark.parametrize("setting", SETTINGS)
+def test_save_and_load_round_trip(embeddings, query_embeddings, setting, tmp_path):
+    store = QuantizedEmbeddingStore.build(embeddings, **setting)
+    store_path = str(tmp_path / "store.npz")
+    store.save(store_path)
+    loaded = QuantizedEmbeddingStore.load(store_path)
+    assert loaded.mode == setting["mode"]
+    assert loaded.memory_bytes() == store.memory_bytes()
+    for query_embedding in query_embeddings:
+        np.testing.assert_array_equal(loaded.scores(query_embedding), store.scores(query_embedding))
+
+
+def test_smaller_codes_save_memory_and_rescoring_restores_recall(embeddings, query_embeddings):
+    results = evaluate_quantization(embeddings, query_embeddings, SETTINGS, k=10)
+    # The PQ codebooks weigh as much as the codes of a corpus this small
+    float16, int8, pq = (result["memory_saved"] for result in results)
+    assert float16 == pytest.approx(0.5) and int8 > 0.74 and pq > 0.5
+    assert results[0]["recall@10"] >= 0.95
+    rescored = evaluate_quantization(embeddings, query_embeddings, SETTINGS[2:], k=10, rescore=200)
+    assert rescored[0]["recall@10"] >= max(results[2]["recall@10"], 0.9)
+
+
+def test_invalid_settings_are_rejected(embeddings):
+    with pytest.raises(ValueError):
+        QuantizedEmbeddingStore.build(embeddings, mode="pq", num_subspaces=5)
+    with pytest.raises(ValueError):
+        QuantizedEmbeddingStore.build(embeddings, mode="binary")
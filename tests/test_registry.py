@@ -0,0 +1,122 @@
+import os
+
+import pytest
+
+from Retrieval.registry import RetrieverRegistry
+
+
+def write(path, text):
+    path.write_text(text)
+    # Make every rewrite visible in the modification time, whatever the file system's resolution
+    stat = os.stat(path)
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9 * (1 + len(text))))
+
+
+def read(path):
+    with open(path) as f:
+        return f.read()
+
+
+@pytest.fixture
+def files(tmp_path):
+    ids, index = tmp_path / "ids.txt", tmp_path / "index.txt"
+    write(ids, "ids v1")
+    write(index, "index v1")
+    return ids, index
+
+
+def test_artifacts_are_shared_and_reloaded_on_change(files):
+    ids, index = files
+    calls = []
+
+    def loader(path):
+        calls.append(os.path.basename(path))
+        return read(path)
+
+    registry = RetrieverRegistry()
+    registry.register("a", ids=(str(ids), loader), index=(str(index), loader))
+    registry.register("b", ids=(str(ids), loader))
+    assert registry.get("a") == {"ids": "ids v1", "index": "index v1"}
+    assert registry.get("b") == {"ids": "ids v1"}
+    assert sorted(calls) == ["ids.txt", "index.txt"]
+
+    write(index, "index v2")
+    assert registry.get("a") == {"ids": "ids v1", "index": "index v2"}
+    assert sorted(calls) == ["ids.txt", "index.txt", "index.txt"]
+
+
+def test_artifacts_changing_while_loading_are_not_mixed(files):
+    ids, index = files
+    registry = RetrieverRegistry()
+
+    def rebuilding_loader(path):
+        value = read(path)
+        if value == "ids v2":
+            # A rebuild writes the matching index only after ids has been read
+            write(index, "index v2")
+        return value
+
+    registry.register("a", ids=(str(ids), rebuilding_loader), index=(str(index), read))
+    assert registry.get("a") == {"ids": "ids v1", "index": "index v1"}
+    write(ids, "ids v2")
+    # The files changed during the reload, so the old consistent pair is kept
+    assert registry.get("a") == {"ids": "ids v1", "index": "index v1"}
+    assert registry.get("a") == {"ids": "ids v2", "index": "index v2"}
+
+
+def test_failed_reload_keeps_previous_artifacts(files):
+    ids, index = files
+    registry = RetrieverRegistry()
+
+    def loader(path):
+        if read(path) == "broken":
+            raise ValueError("corrupt file")
+        return read(path)
+
+    registry.register("a", ids=(str(ids), loader), index=(str(index), loader))
+    registry.get("a")
+    write(ids, "ids v2")
+    write(index, "broken")
+    assert registry.get("a") == {"ids": "ids v1", "index": "index v1"}
+    os.remove(index)
+    assert registry.get("a") == {"ids": "ids v1", "index": "index v1"}
+
+
+def test_is_warm_follows_path_overrides(files, tmp_path):
+    ids, index = files
+    other_index = tmp_path / "other_index.txt"
+    write(other_index, "other")
+    registry = RetrieverRegistry()
+    registry.register("a", ids=(str(ids), read), index=(str(tmp_path / "missing.txt"), read))
+    assert not registry.is_warm(["a"])
+    assert registry.get("a", index=str(other_index))["index"] == "other"
+    assert registry.is_warm(["a"])
+    write(other_index, "changed")
+    assert not registry.is_warm(["a"])
+    assert not registry.is_warm(["unknown"])
+
+
+def test_load_reloads_single_files(files):
+    ids, _ = files
+    registry = RetrieverRegistry()
+    assert registry.load(str(ids), read) == "ids v1"
+    write(ids, "ids v2")
+    assert registry.load(str(ids), read) == "ids v2"
+
+
+def test_warm_up_runs_the_builder_of_lazily_built_artifacts(files, tmp_path):
+    ids, _ = files
+    built = tmp_path / "built.txt"
+    registry = RetrieverRegistry()
+    registry.register("lazy", index=(str(built), read), ids=(str(ids), read))
+
+    def build():
+        if not built.exists():
+            write(built, "built index")
+        return registry.get("lazy")
+
+    registry.register_builder("lazy", build)
+    assert not registry.is_warm(["lazy"])
+    assert registry.warm_up(["lazy"]) == ["lazy"]
+    assert registry.is_warm(["lazy"])
+    assert registry.get("lazy")["index"] == "built index"
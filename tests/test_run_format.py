@@ -0,0 +1,111 @@
+import glob
+import json
+import os
+
+import numpy as np
+import pytest
+
+from Ranking.RRF.RRF_implementation import load_and_merge_json_files
+from Ranking.run_format import BinaryRun, convert_json_run, convert_runs, load_run, load_runs, parse_json_run, write_run
+
+RUN = [{"q1": [12, 7, 99]}, {"q2": []}, {"q3": [5]}]
+STR_RUN = [{"5xvggq": ["31", "2147483647", "0"]}, {"1abc": ["-4"]}]
+RANKS = [{"query": "q1", "rank": 3}, {"query": "q2", "rank": 1}]
+
+
+def write_json(path, data):
+    with open(path, "w") as f:
+        json.dump(data, f)
+    return str(path)
+
+
+def touch(path, seconds):
+    stat = os.stat(path)
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + int(seconds * 1e9)))
+
+
+@pytest.mark.parametrize("json_data", [RUN, STR_RUN, RANKS, []])
+def test_binary_run_round_trip(json_data, tmp_path):
+    rankings, kind = parse_json_run(json_data)
+    run_path = str(tmp_path / "run.run")
+    write_run(run_path, rankings, kind=kind)
+    run = BinaryRun(run_path)
+    assert dict(run) == rankings and list(run) == list(rankings)
+    assert run.to_json() == json_data
+    assert run.scores is None
+    # The arrays start on 64-byte boundaries of the mapped file
+    assert run.offsets.ctypes.data % 64 == run.doc_ids.ctypes.data % 64 == 0
+    for query_id in rankings:
+        assert run.ranking(query_id).dtype == np.int32
+
+
+def test_scores_are_stored_as_float32_with_nan_for_missing(tmp_path):
+    run_path = str(tmp_path / "run.run")
+    write_run(run_path, {"q1": [1, 2, 3], "q2": [4]}, scores={"q1": [0.5, 0.25]})
+    run = BinaryRun(run_path)
+    np.testing.assert_array_equal(run.query_scores("q1"), np.array([0.5, 0.25, np.nan], dtype=np.float32))
+    assert np.isnan(run.query_scores("q2")).all()
+
+
+@pytest.mark.parametrize("rankings", [
+    {"q": ["007"]},
+    {"q": ["abc"]},
+    {"q": [1, "2"]},
+    {"q": [2 ** 31]},
+])
+def test_ids_that_cannot_be_stored_are_rejected(rankings, tmp_path):
+    with pytest.raises(ValueError):
+        write_run(str(tmp_path / "run.run"), rankings)
+    assert not os.path.exists(tmp_path / "run.run")
+
+
+def test_other_files_are_rejected(tmp_path):
+    path = write_json(tmp_path / "run.run", RUN)
+    with pytest.raises(ValueError):
+        BinaryRun(path)
+    with pytest.raises(ValueError):
+        parse_json_run({"q1": [1]})
+
+
+def test_load_run_serves_up_to_date_binary_copies(tmp_path):
+    json_path = write_json(tmp_path / "run.json", RUN)
+    run_path = convert_json_run(json_path)
+    assert run_path == str(tmp_path / "run.run")
+    assert isinstance(load_run(json_path), BinaryRun)
+    assert load_run(json_path) is load_run(run_path)
+    # A JSON file edited after its conversion is read directly
+    write_json(json_path, [{"q1": [1]}])
+    touch(json_path, 10)
+    assert load_run(json_path) == {"q1": [1]}
+
+
+def test_bulk_conversion_and_parallel_loading(tmp_path):
+    paths = [write_json(tmp_path / f"run_{i}.json", [{"q": [i, i + 1]}]) for i in range(5)]
+    pattern = str(tmp_path / "*.json")
+    assert sorted(convert_runs([pattern], num_workers=2)) == sorted(path[:-5] + ".run" for path in paths)
+    assert convert_runs([pattern], num_workers=2) == []
+    broken = write_json(tmp_path / "broken.json", {"not": "a run"})
+    runs = load_runs(paths + [broken], num_workers=3, skip_errors=True)
+    assert [dict(run) for run in runs[:-1]] == [{"q": [i, i + 1]} for i in range(5)]
+    assert runs[-1] is None
+    with pytest.raises(ValueError):
+        load_runs([broken])
+
+
+def test_rrf_input_is_unchanged_by_the_binary_copies(tmp_path):
+    write_json(tmp_path / "a.json", [{"q1": ["1", "2"]}, {"q2": ["3"]}])
+    write_json(tmp_path / "b.json", [{"q1": ["2", "4"]}])
+    expected = load_and_merge_json_files(str(tmp_path))
+    convert_runs([str(tmp_path / "*.json")], num_workers=1)
+    assert load_and_merge_json_files(str(tmp_path)) == expected
+
+
+def test_repository_runs_round_trip(tmp_path):
+    json_paths = sorted(glob.glob("Rankings/*/*.json"))[:3] + sorted(glob.glob("Results/Final_ranking_json/*.json"))[:1]
+    if not json_paths:
+        pytest.skip("No run files in this checkout.")
+    for i, json_path in enumerate(json_paths):
+        with open(json_path, "r") as f:
+            json_data = json.load(f)
+        run = BinaryRun(convert_json_run(json_path, str(tmp_path / f"{i}.run")))
+        assert run.to_json() == json_data
@@ -0,0 +1,132 @@
+import numpy as np
+import pytest
+
+from Retrieval.analyzer import index_tokens
+from Retrieval.bm25_index import BM25Index
+from Retrieval.embedding_store import embedding_rankings, normalize_embeddings
+from Retrieval.segments import SegmentedEmbeddings, SegmentedIndex
+from Retrieval.tf_idf import build_tf_idf_index, get_vocab_index, tf_idf_rankings
+
+
+@pytest.fixture
+def doc_ids(corpus):
+    return [f"d{i}" for i in range(len(corpus))]
+
+
+@pytest.fixture
+def segmented(corpus, doc_ids):
+    # A main segment and uneven delta segments, as documents keep arriving
+    index = SegmentedIndex()
+    for start, end in ((0, 120), (120, 121), (121, 150), (150, 200)):
+        index.add_documents(doc_ids[start:end], corpus[start:end])
+    return index
+
+
+def all_scores(result, doc_ids):
+    ids, scores = result
+    positions = {doc_id: i for i, doc_id in enumerate(doc_ids)}
+    full = np.zeros(len(doc_ids))
+    full[[positions[doc_id] for doc_id in ids]] = scores
+    return full
+
+
+def test_bm25_equals_an_index_built_from_scratch(corpus, doc_ids, segmented, queries):
+    assert len(segmented) == len(corpus) and len(segmented.segments) == 4
+    index = BM25Index.build([index_tokens(text) for text in corpus])
+    for query in queries:
+        scores = all_scores(segmented.search_bm25(query, k=len(corpus)), doc_ids)
+        np.testing.assert_allclose(scores, index.get_scores(index_tokens(query)), rtol=1e-12)
+
+
+def test_tf_idf_equals_an_index_built_from_scratch(corpus, doc_ids, segmented, queries, tf_idf_model):
+    documents_tokenized, idf_dict, vocab = tf_idf_model
+    document_matrix, doc_norms = build_tf_idf_index(documents_tokenized, idf_dict, vocab)
+    vocab_index = get_vocab_index(vocab)
+    for query in queries:
+        scores = all_scores(segmented.search_tf_idf(query, k=len(corpus)), doc_ids)
+        rankings, expected_scores = tf_idf_rankings(query, idf_dict, vocab_index, document_matrix, doc_norms, len(corpus))
+        expected = np.zeros(len(corpus))
+        expected[rankings] = expected_scores
+        np.testing.assert_allclose(scores, expected, atol=1e-6)
+
+
+def test_new_documents_change_the_global_statistics(corpus, doc_ids):
+    index = SegmentedIndex()
+    index.add_documents(doc_ids[:100], corpus[:100])
+    before = all_scores(index.search_bm25("harry potter", k=100), doc_ids[:100])
+    index.add_documents(["new"], ["harry potter " * 20])
+    ids, scores = index.search_bm25("harry potter", k=101)
+    assert ids[0] == "new"
+    # idf and avgdl changed for the documents already indexed as well
+    after = all_scores((ids[1:], scores[1:]), doc_ids[:100])
+    assert not np.allclose(after, before)
+
+
+def test_bm25_norms_are_only_recomputed_when_avgdl_changes(corpus, doc_ids):
+    index = SegmentedIndex()
+    index.add_documents(doc_ids[:100], corpus[:100])
+    ids = index.doc_ids
+    index.search_bm25("harry potter")
+    norms = index.segments[0].cache["bm25_norms"][1]
+    # The same documents again leave avgdl unchanged
+    index.add_documents([f"copy {doc_id}" for doc_id in doc_ids[:100]], corpus[:100])
+    index.search_bm25("harry potter")
+    assert index.segments[0].cache["bm25_norms"][1] is norms
+    assert index.doc_ids is ids and len(ids) == 200
+    index.add_documents(["short"], ["harry"])
+    index.search_bm25("harry potter")
+    assert index.segments[0].cache["bm25_norms"][1] is not norms
+
+
+@pytest.mark.parametrize("main_ratio", [0.1, 10.0])
+def test_merging_keeps_the_results(corpus, doc_ids, segmented, queries, main_ratio):
+    expected = [(segmented.search_bm25(query, 20), segmented.search_tf_idf(query, 20)) for query in queries]
+    assert not segmented.merge_segments(max_segments=4)
+    assert segmented.merge_segments(max_segments=2, main_ratio=main_ratio)
+    # Deltas larger than main_ratio of the main segment are folded into it
+    assert len(segmented.segments) == (1 if main_ratio < 1 else 2)
+    for query, (bm25, tf_idf) in zip(queries, expected):
+        assert segmented.search_bm25(query, 20) == bm25
+        ids, scores = segmented.search_tf_idf(query, 20)
+        assert ids == tf_idf[0]
+        np.testing.assert_allclose(scores, tf_idf[1], atol=1e-6)
+
+
+def test_from_postings_continues_an_existing_index(corpus, doc_ids, queries):
+    main = BM25Index.build([index_tokens(text) for text in corpus[:150]])
+    index = SegmentedIndex.from_postings(doc_ids[:150], main.terms, main.term_offsets, main.doc_nums, main.term_freqs, main.doc_lengths)
+    index.add_documents(doc_ids[150:], corpus[150:])
+    expected = BM25Index.build([index_tokens(text) for text in corpus])
+    for query in queries:
+        scores = all_scores(index.search_bm25(query, k=len(corpus)), doc_ids)
+        np.testing.assert_allclose(scores, expected.get_scores(index_tokens(query)), rtol=1e-12)
+
+
+def test_background_merge(segmented):
+    segmented.start_background_merge(interval=0.01, max_segments=1)
+    try:
+        for _ in range(200):
+            if len(segmented.segments) == 1:
+                break
+            segmented.stop_event.wait(0.01)
+    finally:
+        segmented.stop_background_merge()
+    assert len(segmented.segments) == 1 and segmented.merger is None
+
+
+def test_segmented_embeddings_equal_one_store():
+    rng = np.random.default_rng(0)
+    embeddings = rng.normal(size=(300, 16))
+    doc_ids = [f"d{i}" for i in range(300)]
+    index = SegmentedEmbeddings.from_store(normalize_embeddings(embeddings[:200]), doc_ids[:200])
+    for start in range(200, 300, 20):
+        index.add_embeddings(doc_ids[start:start + 20], embeddings[start:start + 20])
+    store = normalize_embeddings(embeddings)
+    for query_embedding in rng.normal(size=(10, 16)):
+        rankings, scores = embedding_rankings(query_embedding, store, 10)
+        assert index.search(query_embedding, 10) == ([doc_ids[i] for i in rankings], scores)
+    assert index.merge_segments(max_segments=2)
+    assert len(index.segments) == 2 and len(index) == 300
+    for query_embedding in rng.normal(size=(10, 16)):
+        rankings, scores = embedding_rankings(query_embedding, store, 10)
+        assert index.search(query_embedding, 10) == ([doc_ids[i] for i in rankings], scores)
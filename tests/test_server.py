@@ -0,0 +1,151 @@
+import asyncio
+import json
+import socket
+import struct
+import threading
+
+import pytest
+
+from Serving.server import MicroBatcher, Overloaded, QAServer
+
+
+class StubPipeline:
+    def __init__(self, release=None):
+        self.batches = []
+        self.release = release
+
+    def process_queries(self, queries):
+        if self.release is not None:
+            self.release.wait(5)
+        self.batches.append(list(queries))
+        if "bad" in queries:
+            raise RuntimeError("bad query")
+        return [{"best_answer": query.upper()} for query in queries]
+
+
+def test_micro_batches_and_load_shedding():
+    async def run():
+        pipeline = StubPipeline()
+        batcher = MicroBatcher(pipeline.process_queries, max_batch_size=4, max_wait=0.05, max_queue=10, max_concurrent_batches=1)
+        task = asyncio.create_task(batcher.run())
+        results = await asyncio.gather(*[batcher.submit(f"q{i}") for i in range(14)], return_exceptions=True)
+        task.cancel()
+        return pipeline, batcher, results
+
+    pipeline, batcher, results = asyncio.run(run())
+    answered = [result for result in results if not isinstance(result, Overloaded)]
+    assert answered == [{"best_answer": f"Q{i}"} for i in range(10)]
+    assert sum(isinstance(result, Overloaded) for result in results) == 4
+    assert max(len(batch) for batch in pipeline.batches) == 4
+    assert batcher.get_stats()["shed"] == 4
+
+
+def test_failing_query_does_not_fail_its_batch():
+    async def run():
+        pipeline = StubPipeline()
+        batcher = MicroBatcher(pipeline.process_queries, max_batch_size=8, max_wait=0.05)
+        task = asyncio.create_task(batcher.run())
+        results = await asyncio.gather(*[batcher.submit(query) for query in ("a", "bad", "b")], return_exceptions=True)
+        task.cancel()
+        return results
+
+    a, bad, b = asyncio.run(run())
+    assert a == {"best_answer": "A"} and b == {"best_answer": "B"}
+    assert isinstance(bad, RuntimeError)
+
+
+async def request(port, method, path, body=None):
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    data = json.dumps(body).encode() if body is not None else b""
+    writer.write(f"{method} {path} HTTP/1.1\r\nHost: test\r\nContent-Length: {len(data)}\r\n\r\n".encode() + data)
+    await writer.drain()
+    response = await reader.read()
+    writer.close()
+    head, _, payload = response.partition(b"\r\n\r\n")
+    return int(head.split()[1]), json.loads(payload)
+
+
+async def start(qa_server):
+    qa_server.batcher = MicroBatcher(qa_server.pipeline.process_queries, *qa_server.batcher_config)
+    batcher_task = asyncio.create_task(qa_server.batcher.run())
+    server = await asyncio.start_server(qa_server.handle_connection, "127.0.0.1", 0)
+    return server, batcher_task, server.sockets[0].getsockname()[1]
+
+
+def test_http_routes():
+    async def run():
+        qa_server = QAServer(StubPipeline(), max_wait=0.01, retrievers=[])
+        qa_server.warming = False
+        server, batcher_task, port = await start(qa_server)
+        responses = [
+            await request(port, "POST", "/query", {"query": "who"}),
+            await request(port, "POST", "/query", {"text": "who"}),
+            await request(port, "GET", "/query"),
+            await request(port, "GET", "/health"),
+            await request(port, "GET", "/ready"),
+            await request(port, "GET", "/missing"),
+        ]
+        batcher_task.cancel()
+        server.close()
+        return responses
+
+    query, bad_request, wrong_method, health, ready, missing = asyncio.run(run())
+    assert query == (200, {"best_answer": "WHO"})
+    assert bad_request[0] == 400 and wrong_method[0] == 405 and missing[0] == 404
+    assert health[0] == 200 and ready[0] == 200
+
+
+def test_abandoned_requests_are_not_processed():
+    async def run():
+        release = threading.Event()
+        pipeline = StubPipeline(release)
+        qa_server = QAServer(pipeline, max_batch_size=1, max_wait=0.01, max_concurrent_batches=1, retrievers=[])
+        server, batcher_task, port = await start(qa_server)
+        first = asyncio.create_task(request(port, "POST", "/query", {"query": "first"}))
+        await asyncio.sleep(0.1)
+        # Queued behind the first batch; the client gives up before it is processed
+        reader, writer = await asyncio.open_connection("127.0.0.1", port)
+        body = json.dumps({"query": "abandoned"}).encode()
+        writer.write(f"POST /query HTTP/1.1\r\nContent-Length: {len(body)}\r\n\r\n".encode() + body)
+        await writer.drain()
+        await asyncio.sleep(0.1)
+        # Closing with a reset, as a client that gives up does; a plain close is only seen once written to
+        writer.get_extra_info("socket").setsockopt(socket.SOL_SOCKET, socket.SO_LINGER, struct.pack("ii", 1, 0))
+        writer.close()
+        await asyncio.sleep(0.1)
+        release.set()
+        response = await first
+        last = await request(port, "POST", "/query", {"query": "last"})
+        batcher_task.cancel()
+        server.close()
+        return pipeline, response, last
+
+    pipeline, response, last = asyncio.run(run())
+    assert response == (200, {"best_answer": "FIRST"})
+    assert last == (200, {"best_answer": "LAST"})
+    assert pipeline.batches == [["first"], ["last"]]
+
+
+def test_half_closed_clients_get_their_answer():
+    async def run():
+        release = threading.Event()
+        pipeline = StubPipeline(release)
+        qa_server = QAServer(pipeline, max_wait=0.01, retrievers=[])
+        server, batcher_task, port = await start(qa_server)
+        reader, writer = await asyncio.open_connection("127.0.0.1", port)
+        body = json.dumps({"query": "half"}).encode()
+        writer.write(f"POST /query HTTP/1.1\r\nContent-Length: {len(body)}\r\n\r\n".encode() + body)
+        # The client is done sending and shuts down its side before the answer is ready
+        writer.write_eof()
+        await asyncio.sleep(0.1)
+        release.set()
+        response = await reader.read()
+        writer.close()
+        batcher_task.cancel()
+        server.close()
+        return pipeline, response
+
+    pipeline, response = asyncio.run(run())
+    assert response.startswith(b"HTTP/1.1 200 OK")
+    assert json.loads(response.partition(b"\r\n\r\n")[2]) == {"best_answer": "HALF"}
+    assert pipeline.batches == [["half"]]
@@ -0,0 +1,88 @@
+import numpy as np
+import pytest
+
+from Ranking.RRF.fusion import fuse_lists
+from Ranking.RRF.streaming import deepening_iterator, streaming_rrf
+
+
+def random_lists(num_systems, seed, num_docs=80, max_depth=60):
+    rng = np.random.default_rng(seed)
+    return [[f"doc{d}" for d in rng.choice(num_docs, int(rng.integers(0, max_depth)), replace=False)] for _ in range(num_systems)]
+
+
+def correlated_lists(num_systems, seed, num_docs=1000):
+    # Systems that broadly agree, as real retrievers do, so the top settles early
+    rng = np.random.default_rng(seed)
+    relevance = rng.random(num_docs)
+    return [list(np.argsort(-(relevance + 0.05 * rng.random(num_docs)))) for _ in range(num_systems)]
+
+
+class Counting:
+    """
+    Ranked iterator that records how many documents were pulled from it.
+    """
+
+    def __init__(self, ranked):
+        self.ranked = ranked
+        self.pulled = 0
+
+    def __iter__(self):
+        for doc in self.ranked:
+            self.pulled += 1
+            yield doc
+
+
+@pytest.mark.parametrize("seed", range(20))
+@pytest.mark.parametrize("top_n", [1, 5, 20])
+def test_equals_rrf_on_the_complete_lists(seed, top_n):
+    lists = random_lists(1 + seed % 5, seed)
+    assert streaming_rrf(lists, top_n=top_n) == fuse_lists([lists], top_n=top_n)[0]
+    weights = np.random.default_rng(seed).random(len(lists)) + 0.5
+    assert streaming_rrf(lists, top_n=top_n, weights=weights, check_every=3) == fuse_lists([lists], weights=weights, top_n=top_n)[0]
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_stops_early_when_the_top_is_settled(seed):
+    lists = correlated_lists(3, seed)
+    expected = fuse_lists([lists], top_n=10)[0]
+    iterators = [Counting(ranked) for ranked in lists]
+    assert streaming_rrf(iterators, top_n=10) == expected
+    assert max(iterator.pulled for iterator in iterators) < len(lists[0]) / 2
+
+    iterators = [Counting(ranked) for ranked in lists]
+    assert set(streaming_rrf(iterators, top_n=10, exact_order=False)) == set(expected)
+
+
+def test_max_depth_fuses_the_prefixes():
+    lists = random_lists(3, 0, max_depth=80)
+    assert streaming_rrf(lists, top_n=15, max_depth=10) == fuse_lists([[ranked[:10] for ranked in lists]], top_n=15)[0]
+
+
+def test_deepening_iterator_sorts_lazily():
+    calls = []
+    scores = np.random.default_rng(0).integers(0, 20, size=300).astype(np.float64)
+    ids = [f"doc{i}" for i in range(len(scores))]
+
+    def get_scores():
+        calls.append(1)
+        return scores
+
+    iterator = deepening_iterator(get_scores, ids, initial_k=10, growth=2, max_k=100)
+    assert calls == []
+    # Equal scores (there are many) are ranked by document number, like a stable sort
+    expected = [ids[i] for i in np.argsort(-scores, kind="stable")]
+    assert [next(iterator) for _ in range(10)] == expected[:10]
+    assert list(iterator) == expected[10:100]
+    assert calls == [1]
+    assert list(deepening_iterator(scores[:35], initial_k=10, max_k=100)) == list(np.argsort(-scores[:35], kind="stable"))
+    assert list(deepening_iterator(np.zeros(0))) == []
+
+
+def test_streaming_over_deepening_retrievers():
+    rng = np.random.default_rng(0)
+    relevance = rng.random(1000)
+    scores = [relevance + 0.05 * rng.random(1000) for _ in range(3)]
+    lists = [list(np.argsort(-system_scores, kind="stable")) for system_scores in scores]
+    iterators = [Counting(deepening_iterator(system_scores, initial_k=10, max_k=1000)) for system_scores in scores]
+    assert streaming_rrf(iterators, top_n=5) == fuse_lists([lists], top_n=5)[0]
+    assert max(iterator.pulled for iterator in iterators) < 1000
@@ -0,0 +1,37 @@
+import fitz
+import numpy as np
+from fpdf import FPDF
+from PIL import Image
+
+from Retrieval.analyzer import sanitize_text
+from Retrieval.text_render import text_to_page_images
+
+
+def page_images_through_files(text, tmp_path, zoom=2.0):
+    # What create_pdf and pdf_to_image in Retrieval/vision.py do, through temporary files
+    pdf = FPDF()
+    pdf.add_page()
+    pdf.set_font("Arial", size=10)
+    pdf.multi_cell(0, 5, txt=sanitize_text(text))
+    pdf_path = str(tmp_path / "document.pdf")
+    pdf.output(pdf_path)
+    images = []
+    with fitz.open(pdf_path) as pdf_document:
+        for page_num, page in enumerate(pdf_document):
+            image_path = str(tmp_path / f"page_{page_num}.png")
+            page.get_pixmap(matrix=fitz.Matrix(zoom, zoom)).save(image_path)
+            with Image.open(image_path) as image:
+                images.append(image.convert("RGB"))
+    return images
+
+
+def test_pages_are_pixel_identical_to_the_saved_images(corpus, tmp_path):
+    long_text = " ".join(corpus[:60])
+    for text in (corpus[0], "Café – “quoted” text", long_text):
+        images = text_to_page_images(text)
+        expected = page_images_through_files(text, tmp_path)
+        assert len(images) == len(expected)
+        for image, expected_image in zip(images, expected):
+            assert image.mode == "RGB"
+            np.testing.assert_array_equal(np.asarray(image), np.asarray(expected_image))
+    assert len(text_to_page_images(long_text)) > 1
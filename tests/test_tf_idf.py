@@ -0,0 +1,65 @@
+from collections import Counter
+
+import numpy as np
+import pytest
+
+from Retrieval.analyzer import index_tokens
+from Retrieval.tf_idf import (
+    build_tf_idf_index,
+    convert_document_matrix,
+    get_tf_idf_query,
+    get_tf_idf_vector,
+    get_vocab_index,
+    load_tf_idf_index,
+    save_tf_idf_index,
+    tf_idf_rankings,
+)
+from Retrieval.utils import top_k_indices
+
+
+def dense_scores(query, documents_tokenized, idf_dict, vocab):
+    """
+    Cosine scores of the original dense implementation (train_tf_idf + tf_idf_rankings).
+    """
+    document_matrix = np.array([
+        [count / len(tokens) * idf_dict[token] for token, count in ((token, Counter(tokens)[token]) for token in vocab)]
+        for tokens in documents_tokenized
+    ])
+    query_vector = np.array(get_tf_idf_vector(get_tf_idf_query(query, idf_dict), vocab))
+    query_norm = np.linalg.norm(query_vector)
+    if query_norm == 0:
+        return np.zeros(len(documents_tokenized)), document_matrix
+    return document_matrix @ query_vector / (np.linalg.norm(document_matrix, axis=1) * query_norm), document_matrix
+
+
+def test_sparse_index_matches_dense_cosine(tf_idf_model, queries):
+    documents_tokenized, idf_dict, vocab = tf_idf_model
+    document_matrix, doc_norms = build_tf_idf_index(documents_tokenized, idf_dict, vocab)
+    vocab_index = get_vocab_index(vocab)
+    for query in queries:
+        expected, _ = dense_scores(query, documents_tokenized, idf_dict, vocab)
+        rankings, scores = tf_idf_rankings(query, idf_dict, vocab_index, document_matrix, doc_norms, 20)
+        np.testing.assert_allclose(scores, np.sort(expected)[::-1][:20], rtol=1e-5, atol=1e-6)
+        np.testing.assert_allclose(expected[rankings], scores, rtol=1e-5, atol=1e-6)
+
+
+def test_dense_matrix_conversion_and_round_trip(tf_idf_model, tmp_path):
+    documents_tokenized, idf_dict, vocab = tf_idf_model
+    _, dense_matrix = dense_scores("", documents_tokenized, idf_dict, vocab)
+    document_matrix, doc_norms = convert_document_matrix(dense_matrix)
+    built_matrix, built_norms = build_tf_idf_index(documents_tokenized, idf_dict, vocab)
+    np.testing.assert_allclose(document_matrix.toarray(), built_matrix.toarray(), rtol=1e-6)
+    np.testing.assert_allclose(doc_norms, built_norms, rtol=1e-6)
+
+    index_path = str(tmp_path / "tf_idf_index.npz")
+    save_tf_idf_index(document_matrix, doc_norms, index_path)
+    loaded_matrix, loaded_norms = load_tf_idf_index(index_path)
+    assert (loaded_matrix != document_matrix).nnz == 0
+    np.testing.assert_array_equal(loaded_norms, doc_norms)
+
+
+def test_top_k_indices_breaks_ties_by_index():
+    scores = np.array([0.5, 0.9, 0.5, 0.1, 0.9, 0.5])
+    assert top_k_indices(scores, 4).tolist() == [1, 4, 0, 2]
+    assert top_k_indices(scores, 10).tolist() == [1, 4, 0, 2, 5, 3]
+    assert top_k_indices(scores, 0).tolist() == []
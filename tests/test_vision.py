@@ -0,0 +1,95 @@
+import contextlib
+import importlib
+import sys
+import types
+
+import numpy as np
+import pytest
+
+import Retrieval
+from Retrieval.text_render import text_to_page_images
+
+
+class FakeHiddenState:
+    def __init__(self, values):
+        self.values = values
+
+    def mean(self, dim):
+        return FakeHiddenState(self.values.mean(axis=dim))
+
+    def numpy(self):
+        return self.values
+
+
+class FakeProcessor:
+    """
+    Stands in for ViTImageProcessor: every page becomes a fixed-size grayscale thumbnail.
+    """
+
+    def __call__(self, images, return_tensors):
+        return {"pixel_values": np.stack([np.asarray(image.convert("L").resize((8, 8)), dtype=np.float64).ravel() / 255 for image in images])}
+
+
+class FakeModel:
+    """
+    Stands in for ViTModel: four "patches" of 16 values per page, and a record of every batch.
+    """
+
+    config = types.SimpleNamespace(hidden_size=16)
+
+    def __init__(self):
+        self.batch_sizes = []
+
+    def __call__(self, pixel_values):
+        self.batch_sizes.append(len(pixel_values))
+        patches = pixel_values.reshape(len(pixel_values), 4, 16)
+        return types.SimpleNamespace(last_hidden_state=FakeHiddenState(np.tanh(patches * np.arange(1, 5)[None, :, None])))
+
+
+@pytest.fixture
+def vision(monkeypatch):
+    """
+    Retrieval.vision imported with torch and the ViT model and processor replaced by stubs.
+    """
+    torch = types.ModuleType("torch")
+    torch.inference_mode = contextlib.nullcontext
+    transformers = types.ModuleType("transformers")
+    model = FakeModel()
+    transformers.ViTModel = types.SimpleNamespace(from_pretrained=lambda name: model)
+    transformers.ViTImageProcessor = types.SimpleNamespace(from_pretrained=lambda name: FakeProcessor())
+    transformers.ViTFeatureExtractor = transformers.ViTImageProcessor
+    monkeypatch.setitem(sys.modules, "torch", torch)
+    monkeypatch.setitem(sys.modules, "transformers", transformers)
+    monkeypatch.delitem(sys.modules, "Retrieval.vision", raising=False)
+    # Importing sets Retrieval.vision on the package too; both are undone afterwards
+    monkeypatch.setattr(Retrieval, "vision", None, raising=False)
+    yield importlib.import_module("Retrieval.vision")
+    sys.modules.pop("Retrieval.vision", None)
+
+
+def test_batched_encoding_equals_single_page_encoding(vision):
+    # One- and multi-page texts, so batches span text boundaries, and an empty text
+    texts = ["short text", "word " * 3000, "", "another page of text " * 50, "harry " * 1500]
+    pages = [text_to_page_images(text) for text in texts]
+    num_pages = sum(len(text_pages) for text_pages in pages)
+    assert num_pages % 3 != 0
+
+    vision.model.batch_sizes.clear()
+    embeddings = vision.texts_to_vision_embeddings(texts, batch_size=3, show_progress=False)
+    # Full batches, then the partial last one
+    assert vision.model.batch_sizes == [3] * (num_pages // 3) + [num_pages % 3]
+    assert embeddings.shape == (len(texts), 1, 16) and embeddings.dtype == np.float32
+
+    for text, text_pages, embedding in zip(texts, pages, embeddings):
+        per_page = np.concatenate([vision.single_image_embedding(page) for page in text_pages])
+        np.testing.assert_allclose(embedding[0], per_page.mean(axis=0), rtol=1e-6)
+        np.testing.assert_allclose(embedding, vision.single_unit_embedding(text), rtol=1e-6)
+
+
+def test_encode_page_images_splits_into_batches(vision):
+    images = text_to_page_images("word " * 3000) + text_to_page_images("short")
+    vision.model.batch_sizes.clear()
+    batched = vision.encode_page_images(images, batch_size=3)
+    assert vision.model.batch_sizes == [3, 1]
+    np.testing.assert_array_equal(batched, np.concatenate([vision.encode_page_images([image]) for image in images]))
+    assert vision.encode_page_images([]).shape == (0, 16)
@@ -0,0 +1,134 @@
+import contextlib
+import json
+import os
+import sys
+import types
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pytest
+
+import Retrieval
+import Retrieval.vision_index_job as vision_index_job
+from Retrieval.embedding_store import normalize_embeddings
+from Retrieval.utils import iter_documents
+from Retrieval.vision_index_job import assemble_vision_store, index_documents, load_manifest
+
+
+def write_ranges(output_dir, embeddings, range_size, completed, num_documents):
+    os.makedirs(output_dir, exist_ok=True)
+    for start in completed:
+        np.save(os.path.join(output_dir, f"range_{start:08d}.npy"), embeddings[start:start + range_size])
+    with open(os.path.join(output_dir, "manifest.json"), "w") as f:
+        json.dump({"range_size": range_size, "completed": completed, "num_documents": num_documents}, f)
+
+
+class FakeHiddenState:
+    def __init__(self, values):
+        self.values = values
+
+    def mean(self, dim):
+        return FakeHiddenState(self.values.mean(axis=dim))
+
+    def numpy(self):
+        return self.values
+
+
+@pytest.fixture
+def rendered(monkeypatch):
+    """
+    Runs index_documents with ViT and page rendering replaced by stubs: a document of
+    n characters has n // 5 + 1 pages whose pixel values are n and the page number,
+    and the stub model returns those as the page vector. Returns the rendered texts.
+    """
+    texts = []
+
+    def render(text):
+        texts.append(text)
+        return np.array([[len(text), page] for page in range(len(text) // 5 + 1)], dtype=np.float64)
+
+    model = lambda pixel_values: types.SimpleNamespace(last_hidden_state=FakeHiddenState(pixel_values[:, None, :]))
+    model.config = types.SimpleNamespace(hidden_size=2)
+    vision = types.ModuleType("Retrieval.vision")
+    vision.model = model
+    vision.set_inference_threads = lambda num_threads: None
+    torch = types.ModuleType("torch")
+    torch.inference_mode = contextlib.nullcontext
+    torch.from_numpy = lambda array: array
+    monkeypatch.setitem(sys.modules, "Retrieval.vision", vision)
+    monkeypatch.setattr(Retrieval, "vision", vision, raising=False)
+    monkeypatch.setitem(sys.modules, "torch", torch)
+    monkeypatch.setattr(vision_index_job, "ProcessPoolExecutor", ThreadPoolExecutor)
+    monkeypatch.setattr(vision_index_job, "_init_render_worker", lambda processor_name: None)
+    monkeypatch.setattr(vision_index_job, "_render_document", render)
+    return texts
+
+
+def expected_embeddings(texts):
+    return np.array([[len(text), (len(text) // 5) / 2] for text in texts], dtype=np.float32)
+
+
+def test_resumed_jobs_only_index_unfinished_ranges(rendered, tmp_path):
+    texts = [f"document {'x' * i}" for i in range(10)]
+    output_dir, store_path = str(tmp_path / "ranges"), str(tmp_path / "store.npy")
+    manifest = index_documents(iter(texts), output_dir, range_size=4, batch_size=3)
+    assert sorted(manifest["completed"]) == [0, 4, 8]
+    assert manifest["ranges"]["8"]["length"] == 2
+    assemble_vision_store(output_dir, store_path)
+    np.testing.assert_allclose(np.load(store_path), normalize_embeddings(expected_embeddings(texts)), rtol=1e-6)
+
+    # A crash after the first range: only the other two are rendered again
+    manifest["completed"], manifest["num_documents"] = [0], None
+    with open(os.path.join(output_dir, "manifest.json"), "w") as f:
+        json.dump(manifest, f)
+    rendered.clear()
+    index_documents(iter(texts), output_dir, range_size=4, batch_size=3)
+    assert rendered == texts[4:]
+    assemble_vision_store(output_dir, store_path)
+    np.testing.assert_allclose(np.load(store_path), normalize_embeddings(expected_embeddings(texts)), rtol=1e-6)
+
+
+def test_resume_refuses_other_documents(rendered, tmp_path):
+    texts = [f"document {'x' * i}" for i in range(10)]
+    output_dir = str(tmp_path / "ranges")
+    index_documents(iter(texts), output_dir, range_size=4)
+    rendered.clear()
+    # A grown corpus must not treat the partial last range as done
+    with pytest.raises(ValueError):
+        index_documents(iter(texts + ["new document"]), output_dir, range_size=4)
+    with pytest.raises(ValueError):
+        index_documents(iter(["changed"] + texts[1:]), output_dir, range_size=4)
+    with pytest.raises(ValueError):
+        index_documents(iter(texts[:6]), output_dir, range_size=4)
+    assert rendered == []
+    # Unchanged documents resume without any work
+    assert index_documents(iter(texts), output_dir, range_size=4)["num_documents"] == 10
+    assert rendered == []
+
+
+def test_ranges_are_assembled_in_document_order(tmp_path):
+    embeddings = np.random.default_rng(0).normal(size=(10, 8)).astype(np.float32)
+    output_dir, store_path = str(tmp_path / "ranges"), str(tmp_path / "store.npy")
+    # Ranges finish in any order; the last one is shorter
+    write_ranges(output_dir, embeddings, 4, [8, 0, 4], 10)
+    assert assemble_vision_store(output_dir, store_path) == store_path
+    np.testing.assert_array_equal(np.load(store_path), normalize_embeddings(embeddings))
+
+
+def test_unfinished_jobs_are_not_assembled(tmp_path):
+    embeddings = np.zeros((10, 8), dtype=np.float32)
+    output_dir = str(tmp_path / "ranges")
+    write_ranges(output_dir, embeddings, 4, [0, 4], None)
+    with pytest.raises(ValueError):
+        assemble_vision_store(output_dir, str(tmp_path / "store.npy"))
+    write_ranges(output_dir, embeddings, 4, [0, 8], 10)
+    with pytest.raises(ValueError):
+        assemble_vision_store(output_dir, str(tmp_path / "store.npy"))
+    assert load_manifest(str(tmp_path / "missing")) is None
+
+
+def test_documents_are_read_in_filename_order(tmp_path):
+    for name, text in (("b.txt", "second"), ("a.txt", "first"), ("c.txt", "third")):
+        (tmp_path / name).write_text(text)
+    (tmp_path / "subdirectory").mkdir()
+    assert list(iter_documents(str(tmp_path))) == ["first", "second", "third"]